@@ -4,6 +4,7 @@
 # In[11]:
 
 
+import numpy as np
 import pandas as pd
 
 def dew_severity_level(temp, lw):
@@ -32,6 +33,23 @@ def dew_severity_level(temp, lw):
         else: return 4
     return 0
 
+# Vectorized lookup table: (temperature band, leaf-wetness upper bounds per level).
+# np.digitize(..., right=True) gives the number of bounds strictly below lw,
+# i.e. the same level as the if/elif chain above.
+DEW_SEVERITY_TABLE = [
+    ((13, 17), [6, 15, 20]),
+    ((18, 20), [3, 8, 15, 22]),
+    ((21, 25), [2, 5, 12, 20]),
+    ((26, 29), [3, 8, 15, 22]),
+]
+
+def dew_severity_level_vec(temp, lw):
+    temp = np.asarray(temp, dtype=float)
+    lw = np.asarray(lw, dtype=float)
+    conditions = [(temp >= lo) & (temp <= hi) for (lo, hi), _ in DEW_SEVERITY_TABLE]
+    choices = [np.digitize(lw, bounds, right=True) for _, bounds in DEW_SEVERITY_TABLE]
+    return np.select(conditions, choices, default=0)
+
 # Map severity level to percentage
 severity_to_percent = {0: "0%", 1: "25%", 2: "50%", 3: "75%", 4: "100%"}
 
@@ -49,17 +67,17 @@ def run_dew_model(filepath, sheet='Sheet1'):
         'LeafWetness': 'sum'
     }).reset_index().rename(columns={'datetime': 'Day', 'temperature': 'AvgTemp', 'LeafWetness': 'LeafWetnessHours'})
 
-    daily_df['DewSeverityLevel'] = daily_df.apply(lambda row: dew_severity_level(row['AvgTemp'], row['LeafWetnessHours']), axis=1)
+    daily_df['DewSeverityLevel'] = dew_severity_level_vec(daily_df['AvgTemp'], daily_df['LeafWetnessHours'])
     daily_df['DewSeverityPercent'] = daily_df['DewSeverityLevel'].map(severity_to_percent)
 
     print(daily_df[['Day', 'AvgTemp', 'LeafWetnessHours', 'DewSeverityPercent']])
     return daily_df
 
 # Call the function
-run_dew_model('D:/model/test1.xlsx')
-results_df = run_dew_model('D:/model/test1.xlsx')
-results_df.to_excel("D:/model/resultats_alternariose.xlsx", index=False)
-print("Résultats exportés avec succès.")
+if __name__ == "__main__":
+    results_df = run_dew_model('D:/model/test1.xlsx')
+    results_df.to_excel("D:/model/resultats_alternariose.xlsx", index=False)
+    print("Résultats exportés avec succès.")
 
 
 # In[ ]:
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Reclassement hors ligne d'archives de photos (après un réentraînement) :
+# - parcours récursif du dossier, décodage des images dans un pool de processus ;
+# - lots de taille fixe envoyés au modèle (le dernier est complété par des zéros) ;
+# - résultats écrits au fur et à mesure en CSV ou Parquet : chemin, top-k classes et confiances,
+#   version du modèle ;
+# - reprise : les fichiers déjà classés par la même version du modèle sont ignorés.
+#
+#   python batch_classify.py <IMAGES_DIR> resultats.csv [--backend tflite --model ...] [--top-k 3]
+#   python batch_classify.py <IMAGES_DIR> resultats.parquet   -> dossier de fragments part-*.parquet
+
+import os
+import sys
+import csv
+import glob
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from class_names import class_names
+from inference import load_backend, resolve_backend, model_version
+from preprocessing import decode_image_fast
+
+EXTENSIONS = (".jpg", ".jpeg", ".jfif", ".png", ".webp", ".avif", ".bmp")
+BATCH_SIZE = 32
+TOP_K = 3
+PARQUET_ROWS = 4096       # lignes par fragment Parquet
+REPORT_SECONDS = 10       # intervalle d'affichage du débit
+
+# -----------------------------------
+# 1. Fichiers à classer
+# -----------------------------------
+
+def list_images(root):
+    """Chemins relatifs (séparateur '/') de toutes les images sous `root`, triés."""
+    chemins = []
+    for racine, _, noms in os.walk(root):
+        for nom in noms:
+            if nom.lower().endswith(EXTENSIONS):
+                chemins.append(os.path.relpath(os.path.join(racine, nom), root).replace(os.sep, "/"))
+    return sorted(chemins)
+
+def _colonnes(top_k):
+    colonnes = ["path"]
+    for i in range(1, top_k + 1):
+        colonnes += [f"class_{i}", f"confidence_{i}"]
+    return colonnes + ["model_version"]
+
+# -----------------------------------
+# 2. Écriture incrémentale
+# -----------------------------------
+
+class CsvWriter:
+    """Ajout en fin de fichier, vidé après chaque lot : un arrêt brutal perd au plus le lot en cours."""
+
+    def __init__(self, path, colonnes):
+        self.path = path
+        self.colonnes = colonnes
+
+    def done(self, version):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline="", encoding="utf-8") as f:
+            return {l["path"] for l in csv.DictReader(f) if l.get("model_version") == version}
+
+    def __enter__(self):
+        nouveau = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._f = open(self.path, "a", newline="", encoding="utf-8")
+        self._ecrivain = csv.writer(self._f)
+        if nouveau:
+            self._ecrivain.writerow(self.colonnes)
+        return self
+
+    def write(self, lignes):
+        self._ecrivain.writerows(lignes)
+        self._f.flush()
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+class ParquetWriter:
+    """Dossier de fragments part-NNNNN.parquet (lisible d'un bloc par pandas.read_parquet)."""
+
+    def __init__(self, path, colonnes, rows_per_part=PARQUET_ROWS):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("❌ pyarrow est nécessaire pour la sortie Parquet (pip install pyarrow)")
+        self.path = path
+        self.colonnes = colonnes
+        self.rows_per_part = rows_per_part
+
+    def _fragments(self):
+        return sorted(glob.glob(os.path.join(self.path, "part-*.parquet")))
+
+    def done(self, version):
+        import pyarrow.parquet as pq
+
+        deja = set()
+        for fragment in self._fragments():
+            table = pq.read_table(fragment, columns=["path", "model_version"]).to_pydict()
+            deja.update(p for p, v in zip(table["path"], table["model_version"]) if v == version)
+        return deja
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._numero = len(self._fragments())
+        self._tampon = []
+        return self
+
+    def write(self, lignes):
+        self._tampon.extend(lignes)
+        if len(self._tampon) >= self.rows_per_part:
+            self._vider()
+
+    def _vider(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._tampon:
+            return
+        table = pa.table({c: [l[i] for l in self._tampon] for i, c in enumerate(self.colonnes)})
+        # Écriture dans un fichier temporaire puis renommage : pas de fragment à moitié écrit
+        chemin = os.path.join(self.path, f"part-{self._numero:05d}.parquet")
+        pq.write_table(table, chemin + ".tmp")
+        os.replace(chemin + ".tmp", chemin)
+        self._numero += 1
+        self._tampon = []
+
+    def __exit__(self, *exc):
+        self._vider()
+
+def open_writer(path, top_k=TOP_K):
+    if path.endswith(".parquet"):
+        return ParquetWriter(path, _colonnes(top_k))
+    return CsvWriter(path, _colonnes(top_k))
+
+# -----------------------------------
+# 3. Classement
+# -----------------------------------
+
+def _decoder(args):
+    """Exécuté dans un processus du pool : (chemin relatif, uint8 (224, 224, 3) ou message d'erreur)."""
+    racine, chemin = args
+    try:
+        with open(os.path.join(racine, chemin), "rb") as f:
+            return chemin, decode_image_fast(f.read())
+    except Exception as e:
+        return chemin, str(e)
+
+def _decodes(racine, chemins, workers, en_vol):
+    """Images décodées dans l'ordre, avec au plus `en_vol` décodages en attente (mémoire bornée)."""
+    # spawn : les processus ne reprennent pas l'état TensorFlow du parent (comme sous Windows)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        attente = deque()
+        for chemin in chemins:
+            attente.append(pool.submit(_decoder, (racine, chemin)))
+            if len(attente) >= en_vol:
+                yield attente.popleft().result()
+        while attente:
+            yield attente.popleft().result()
+
+def classify_directory(root, output, backend=None, model_path=None, batch_size=BATCH_SIZE,
+                       top_k=TOP_K, workers=None, num_threads=None):
+    """Classe toutes les images de `root` pas encore dans `output` ; renvoie un résumé."""
+    debut = time.perf_counter()
+    _, model_path = resolve_backend(backend, model_path)
+    version = model_version(model_path)
+    ecrivain = open_writer(output, top_k)
+
+    chemins = list_images(root)
+    deja = ecrivain.done(version)
+    a_faire = [c for c in chemins if c not in deja]
+    print(f"📂 {len(chemins)} images, {len(chemins) - len(a_faire)} déjà classées (version {version}), "
+          f"{len(a_faire)} à classer")
+    if not a_faire:
+        return {"images": 0, "skipped": len(deja), "errors": 0, "seconds": time.perf_counter() - debut}
+
+    modele = load_backend(backend, model_path, num_threads, batch_sizes=(batch_size,))
+    workers = workers or os.cpu_count()
+    lot = np.zeros((batch_size, 224, 224, 3), dtype=np.float32)
+    noms = []
+    classees = erreurs = 0
+    t_debut = time.perf_counter()
+    t_affiche = t_debut
+
+    def _classer(ecr):
+        # Lot toujours plein (graphe tracé pour cette taille) : le dernier, incomplet, est complété
+        # par des zéros et les lignes en trop sont ignorées
+        lot[len(noms):] = 0.0
+        probs = np.asarray(modele.predict(lot))[:len(noms)]
+        meilleurs = np.argsort(-probs, axis=1)[:, :top_k]
+        lignes = []
+        for nom, p, indices in zip(noms, probs, meilleurs):
+            ligne = [nom]
+            for i in indices:
+                ligne += [class_names[i] if i < len(class_names) else str(i), round(float(p[i]), 6)]
+            lignes.append(ligne + [version])
+        ecr.write(lignes)
+
+    with ecrivain as ecr:
+        for chemin, image in _decodes(root, a_faire, workers, 4 * batch_size):
+            if isinstance(image, str):
+                erreurs += 1
+                print(f"⚠️ Image ignorée {chemin} : {image}")
+                continue
+            np.divide(image, np.float32(255.0), out=lot[len(noms)])
+            noms.append(chemin)
+            if len(noms) == batch_size:
+                _classer(ecr)
+                classees += len(noms)
+                noms = []
+
+            maintenant = time.perf_counter()
+            if maintenant - t_affiche >= REPORT_SECONDS:
+                t_affiche = maintenant
+                debit = classees / (maintenant - t_debut)
+                print(f"⏱️ {classees}/{len(a_faire)} images, {debit:.1f} images/s")
+        if noms:
+            _classer(ecr)
+            classees += len(noms)
+
+    secondes = time.perf_counter() - debut
+    return {
+        "images": classees,
+        "skipped": len(deja),
+        "errors": erreurs,
+        "seconds": secondes,
+        "images_per_sec": classees / (time.perf_counter() - t_debut),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classement hors ligne d'un dossier d'images")
+    parser.add_argument("images")
+    parser.add_argument("output", help="fichier .csv, ou dossier .parquet")
+    parser.add_argument("--backend", choices=["keras", "tflite", "onnx"])
+    parser.add_argument("--model")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--workers", type=int, help="processus de décodage (défaut : nombre de cœurs)")
+    parser.add_argument("--threads", type=int, help="threads de l'inférence")
+    args = parser.parse_args()
+
+    resume = classify_directory(args.images, args.output, args.backend, args.model, args.batch_size,
+                                args.top_k, args.workers, args.threads)
+    if "images_per_sec" in resume:
+        print(f"✅ {resume['images']} images classées en {resume['seconds']:.1f} s "
+              f"({resume['images_per_sec']:.1f} images/s), {resume['errors']} erreurs -> {args.output}")
+    else:
+        print("✅ Rien à faire")
+    sys.exit(1 if resume["errors"] else 0)
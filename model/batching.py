@@ -0,0 +1,139 @@
+import threading
+import logging
+import queue
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Demande:
+    """Une requête en attente : ses images et l'événement qui signale son résultat."""
+    __slots__ = ("images", "taille", "evenement", "resultat", "erreur")
+
+    def __init__(self, images):
+        self.images = images
+        self.taille = images.shape[0]
+        self.evenement = threading.Event()
+        self.resultat = None
+        self.erreur = None
+
+
+class MicroBatcher:
+    """Regroupe les requêtes concurrentes en un seul appel au modèle.
+
+    Un thread worker vide la file : il attend au plus `max_wait_ms` après la
+    première requête pour compléter le lot (jusqu'à `max_batch_size` images),
+    exécute `predict_fn` une seule fois, puis rend à chaque appelant ses lignes.
+    `on_batch(nb_images, secondes)`, si fourni, est appelé après chaque lot réussi ;
+    une exception qu'il lève est journalisée sans arrêter le worker.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, on_batch=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size doit être >= 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.on_batch = on_batch
+        self._file = queue.Queue()
+        self._verrou = threading.Lock()
+        self._worker = None
+
+        # Statistiques (protégées par _verrou)
+        self._nb_lots = 0
+        self._nb_images = 0
+        self._taille_lot_max = 0
+        self._tailles_lots = {}
+        self._temps_modele = 0.0
+
+    # === Démarrage du worker ===
+    def start(self):
+        with self._verrou:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._boucle, name="micro-batcher", daemon=True)
+                self._worker.start()
+        return self
+
+    # === Côté appelant ===
+    def submit(self, images, timeout=None):
+        """Soumet un tableau (N, H, W, C) et renvoie les N lignes de prédiction."""
+        # Worker absent ou mort (exception inattendue) : relancé, sinon la demande attendrait pour rien
+        if self._worker is None or not self._worker.is_alive():
+            self.start()
+        demande = _Demande(images)
+        self._file.put(demande)
+        if not demande.evenement.wait(timeout):
+            raise TimeoutError("Délai dépassé en attendant le résultat du modèle")
+        if demande.erreur is not None:
+            raise demande.erreur
+        return demande.resultat
+
+    # === Côté worker ===
+    def _collecter_lot(self):
+        premiere = self._file.get()
+        lot = [premiere]
+        nb = premiere.taille
+        echeance = time.monotonic() + self.max_wait
+        while nb < self.max_batch_size:
+            restant = echeance - time.monotonic()
+            if restant <= 0:
+                break
+            try:
+                demande = self._file.get(timeout=restant)
+            except queue.Empty:
+                break
+            lot.append(demande)
+            nb += demande.taille
+        return lot, nb
+
+    def _boucle(self):
+        while True:
+            lot, nb = self._collecter_lot()
+            debut = time.perf_counter()
+            try:
+                if len(lot) == 1:
+                    entree = lot[0].images
+                else:
+                    entree = np.concatenate([d.images for d in lot], axis=0)
+                preds = np.asarray(self.predict_fn(entree))
+            except Exception as e:
+                for demande in lot:
+                    demande.erreur = e
+                    demande.evenement.set()
+                continue
+            duree = time.perf_counter() - debut
+
+            # Redistribution : chaque appelant ne reçoit que ses propres lignes
+            decalage = 0
+            for demande in lot:
+                demande.resultat = preds[decalage:decalage + demande.taille]
+                decalage += demande.taille
+                demande.evenement.set()
+
+            with self._verrou:
+                self._nb_lots += 1
+                self._nb_images += nb
+                self._taille_lot_max = max(self._taille_lot_max, nb)
+                self._tailles_lots[nb] = self._tailles_lots.get(nb, 0) + 1
+                self._temps_modele += duree
+            if self.on_batch is not None:
+                try:
+                    self.on_batch(nb, duree)
+                except Exception:
+                    logger.exception("Erreur dans on_batch (lot de %d images)", nb)
+
+    # === Métriques ===
+    def stats(self):
+        with self._verrou:
+            return {
+                "queue_depth": self._file.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._nb_lots,
+                "images": self._nb_images,
+                "avg_batch_size": (self._nb_images / self._nb_lots) if self._nb_lots else 0.0,
+                "largest_batch": self._taille_lot_max,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._tailles_lots.items())},
+                "model_seconds": self._temps_modele,
+            }
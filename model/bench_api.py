@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Banc de charge de /predict, entièrement en local.
+#
+#   python bench_api.py --start flask --tiny-model --rates 5 10 20 --duration 20 --output bench.json
+#   python bench_api.py --url http://127.0.0.1:5050 --server-pid 1234 --rates 10
+#
+# --start lance le serveur (flask = main.py, async = main_async.py via uvicorn, serve = serve.py)
+# --tiny-model remplace le .h5 entraîné par un petit modèle aléatoire (même entrée 224x224x3, 39 classes)
+# Les résultats (p50/p95/p99, débit, taux d'erreur, RSS du serveur) sont écrits en JSON
+# pour comparer les commits entre eux.
+
+import os
+import io
+import sys
+import json
+import glob
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from tensor_format import MEDIA_TYPE, encode_tensor
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(MODEL_DIR, "images")
+
+FORMATS_PIL = {"jpg": "JPEG", "jfif": "JPEG", "webp": "WEBP", "avif": "AVIF"}
+CONTENT_TYPES = {"jpg": "image/jpeg", "jfif": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+
+# -----------------------------------
+# 1. Jeu d'images de test
+# -----------------------------------
+
+def build_payloads(image_dir, sizes, formats):
+    """Réencode les images d'exemple à chaque taille (plus grand côté, px) et dans chaque format."""
+    sources = []
+    for chemin in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        try:
+            sources.append((os.path.basename(chemin), Image.open(chemin).convert("RGB")))
+        except Exception:
+            continue
+
+    payloads = []
+    for fmt in formats:
+        if fmt == "sft":
+            # Format tenseur compact (tensor_format.py) : déjà en 224x224, une seule taille
+            for nom, img in sources:
+                pixels = np.asarray(img.resize((224, 224), Image.BICUBIC), dtype=np.uint8)
+                payloads.append({
+                    "name": f"{os.path.splitext(nom)[0]}.sft",
+                    "format": fmt,
+                    "size": 224,
+                    "content_type": MEDIA_TYPE,
+                    "data": encode_tensor(pixels),
+                })
+            continue
+        for taille in sizes:
+            for nom, img in sources:
+                echelle = taille / max(img.size)
+                redim = img.resize((max(1, round(img.width * echelle)), max(1, round(img.height * echelle))))
+                buf = io.BytesIO()
+                try:
+                    redim.save(buf, format=FORMATS_PIL[fmt], quality=90)
+                except (KeyError, OSError) as e:
+                    print(f"⚠️ Format {fmt} indisponible ({e}), ignoré")
+                    break
+                payloads.append({
+                    "name": f"{os.path.splitext(nom)[0]}_{taille}.{fmt}",
+                    "format": fmt,
+                    "size": taille,
+                    "content_type": CONTENT_TYPES[fmt],
+                    "data": buf.getvalue(),
+                })
+    return payloads
+
+def encode_multipart(payload):
+    boundary = "----smartfarm%016x" % random.getrandbits(64)
+    corps = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{payload["name"]}"\r\n'
+        f"Content-Type: {payload['content_type']}\r\n\r\n"
+    ).encode() + payload["data"] + f"\r\n--{boundary}--\r\n".encode()
+    return corps, f"multipart/form-data; boundary={boundary}"
+
+# -----------------------------------
+# 2. Serveur local (optionnel) et modèle aléatoire
+# -----------------------------------
+
+def build_tiny_model(dossier, num_classes=39):
+    import tensorflow as tf
+
+    inputs = tf.keras.Input(shape=(224, 224, 3))
+    x = tf.keras.layers.Conv2D(8, 3, strides=4, activation="relu")(inputs)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(num_classes, activation="softmax")(x)
+    chemin = os.path.join(dossier, "tiny_model.h5")
+    tf.keras.Model(inputs, outputs, name="tiny_random").save(chemin)
+    return chemin
+
+def _port_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(mode, port, env_extra, workers):
+    env = dict(os.environ, **env_extra)
+    if mode == "flask":
+        code = f"from main import app; app.run(host='127.0.0.1', port={port}, threaded=True)"
+        cmd = [sys.executable, "-c", code]
+    elif mode == "async":
+        cmd = [sys.executable, "-m", "uvicorn", "main_async:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    elif mode == "serve":
+        cmd = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    else:
+        raise ValueError(f"Mode de serveur inconnu : {mode}")
+    return subprocess.Popen(cmd, cwd=MODEL_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_ready(url, timeout=180):
+    cible = urlparse(url)
+    echeance = time.monotonic() + timeout
+    while time.monotonic() < echeance:
+        try:
+            conn = http.client.HTTPConnection(cible.hostname, cible.port, timeout=2)
+            conn.request("GET", "/readyz")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+def rss_bytes(pid):
+    """RSS du serveur et de ses processus enfants (workers), via /proc (Linux)."""
+    total = 0
+    a_visiter = [pid]
+    while a_visiter:
+        p = a_visiter.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for ligne in f:
+                    if ligne.startswith("VmRSS:"):
+                        total += int(ligne.split()[1]) * 1024
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                a_visiter.extend(int(c) for c in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total or None
+
+# -----------------------------------
+# 3. Génération de charge à débit fixe (boucle ouverte)
+# -----------------------------------
+
+def _envoyer(url, payload, timeout):
+    cible = urlparse(url)
+    corps, content_type = encode_multipart(payload)
+    debut = time.perf_counter()
+    try:
+        conn = http.client.HTTPConnection(cible.hostname, cible.port, timeout=timeout)
+        conn.request("POST", "/predict", body=corps, headers={"Content-Type": content_type})
+        reponse = conn.getresponse()
+        reponse.read()
+        statut = reponse.status
+        conn.close()
+    except OSError as e:
+        statut = type(e).__name__
+    return time.perf_counter() - debut, statut, payload["format"]
+
+def run_rate(url, payloads, rate, duration, concurrency, timeout):
+    """Envoie `rate` requêtes/s pendant `duration` s, selon un calendrier fixe (pas d'attente des réponses)."""
+    nb = max(1, int(rate * duration))
+    futures = []
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(nb):
+            attente = debut + i / rate - time.perf_counter()
+            if attente > 0:
+                time.sleep(attente)
+            futures.append(pool.submit(_envoyer, url, payloads[i % len(payloads)], timeout))
+        resultats = [f.result() for f in futures]
+    duree = time.perf_counter() - debut
+
+    latences = np.array([r[0] for r in resultats if r[1] == 200])
+    erreurs = sum(r[1] != 200 for r in resultats)
+    par_format = {}
+    for lat, statut, fmt in resultats:
+        if statut == 200:
+            par_format.setdefault(fmt, []).append(lat)
+
+    def pct(valeurs, q):
+        return float(np.percentile(valeurs, q) * 1000) if len(valeurs) else None
+
+    return {
+        "target_rps": rate,
+        "requests": nb,
+        "duration_s": duree,
+        "throughput_rps": len(latences) / duree,
+        "error_rate": erreurs / nb,
+        "errors": sorted({str(r[1]) for r in resultats if r[1] != 200}),
+        "latency_ms": {"p50": pct(latences, 50), "p95": pct(latences, 95), "p99": pct(latences, 99),
+                       "mean": float(latences.mean() * 1000) if len(latences) else None},
+        "latency_p50_ms_by_format": {fmt: pct(v, 50) for fmt, v in sorted(par_format.items())},
+    }
+
+def _commit_courant():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=MODEL_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# -----------------------------------
+# 4. Exécution
+# -----------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de charge local de /predict")
+    parser.add_argument("--url", help="serveur déjà lancé (sinon --start)")
+    parser.add_argument("--server-pid", type=int, help="PID du serveur déjà lancé, pour mesurer son RSS")
+    parser.add_argument("--start", choices=["flask", "async", "serve"], help="lance le serveur localement")
+    parser.add_argument("--workers", type=int, default=2, help="workers pour --start serve")
+    parser.add_argument("--tiny-model", action="store_true", help="petit modèle aléatoire au lieu du .h5 entraîné")
+    parser.add_argument("--keep-cache", action="store_true", help="laisse le cache de prédictions actif")
+    parser.add_argument("--rates", type=float, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[640, 1600, 4000])
+    parser.add_argument("--formats", nargs="+", default=["jpg", "jfif", "webp", "avif"], choices=list(FORMATS_PIL) + ["sft"])
+    parser.add_argument("--images", default=IMAGES_DIR)
+    parser.add_argument("--output", default="bench_api.json")
+    args = parser.parse_args()
+
+    if not args.url and not args.start:
+        parser.error("indiquer --url ou --start")
+
+    payloads = build_payloads(args.images, args.sizes, args.formats)
+    random.Random(0).shuffle(payloads)  # mélange reproductible des formats et tailles
+    print(f"🖼️ {len(payloads)} images de test ({', '.join(args.formats)} ; {', '.join(map(str, args.sizes))} px)")
+
+    serveur = None
+    dossier_tmp = None
+    url = args.url
+    pid = args.server_pid
+    try:
+        if args.start:
+            env = {}
+            if not args.keep_cache:
+                env["SMARTFARM_CACHE_SIZE"] = "0"  # chaque envoi doit passer par le modèle
+            if args.tiny_model:
+                dossier_tmp = tempfile.mkdtemp(prefix="smartfarm_bench_")
+                env["SMARTFARM_BACKEND"] = "keras"
+                env["SMARTFARM_MODEL_PATH"] = build_tiny_model(dossier_tmp)
+            port = _port_libre()
+            url = f"http://127.0.0.1:{port}"
+            serveur = start_server(args.start, port, env, args.workers)
+            pid = serveur.pid
+            print(f"⏳ Démarrage du serveur {args.start} sur {url}...")
+            if not wait_ready(url):
+                raise RuntimeError("❌ Le serveur n'a pas répondu sur GET /")
+
+        resultats = []
+        for rate in args.rates:
+            r = run_rate(url, payloads, rate, args.duration, args.concurrency, args.timeout)
+            r["server_rss_bytes"] = rss_bytes(pid) if pid else None
+            resultats.append(r)
+            lat = r["latency_ms"]
+            rss = f"{r['server_rss_bytes']/1024/1024:.0f} MB" if r["server_rss_bytes"] else "n/a"
+            print(f"📈 {rate:>6.1f} req/s -> débit {r['throughput_rps']:.1f} req/s, "
+                  f"p50 {lat['p50'] or 0:.1f} ms, p95 {lat['p95'] or 0:.1f} ms, p99 {lat['p99'] or 0:.1f} ms, "
+                  f"erreurs {r['error_rate']*100:.1f}%, RSS {rss}")
+
+        rapport = {
+            "commit": _commit_courant(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "server": args.start or url,
+            "tiny_model": args.tiny_model,
+            "cache": args.keep_cache or not args.start,
+            "sizes": args.sizes,
+            "formats": args.formats,
+            "images": len(payloads),
+            "duration_s": args.duration,
+            "runs": resultats,
+        }
+        with open(args.output, "w") as f:
+            json.dump(rapport, f, indent=2)
+        print(f"✅ Résultats écrits dans {args.output}")
+    finally:
+        if serveur is not None:
+            serveur.terminate()
+            try:
+                serveur.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                serveur.kill()
+        if dossier_tmp:
+            shutil.rmtree(dossier_tmp, ignore_errors=True)
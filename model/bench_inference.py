@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Micro-benchmark : coût par appel de model.predict() vs appel direct vs CompiledModel (tf.function)
+#   python bench_inference.py                                   -> modèle Keras par défaut
+#   python bench_inference.py --model autre.h5 --batch-sizes 1 4 16 --repeat 50
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from inference import DEFAULT_MODEL_PATHS, CompiledModel
+
+def mesurer(fonction, x, repetitions):
+    fonction(x)  # échauffement (traçage éventuel)
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction(x)
+        durees.append(time.perf_counter() - debut)
+    return float(np.median(durees))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATHS["keras"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    from tensorflow.keras.models import load_model
+
+    model = load_model(args.model, compile=False)
+    debut = time.perf_counter()
+    compile_ = CompiledModel(model, args.batch_sizes)
+    print(f"🔧 Traçage des lots {args.batch_sizes} : {time.perf_counter() - debut:.2f} s")
+
+    variantes = [
+        ("model.predict", lambda x: model.predict(x, verbose=0)),
+        ("model(x)", lambda x: model(x, training=False).numpy()),
+        ("CompiledModel", compile_.predict),
+    ]
+    print(f"\n{'lot':>5}" + "".join(f"{nom + ' ms':>18}" for nom, _ in variantes) + f"{'gain':>8}{'écart max':>12}")
+    for taille in args.batch_sizes:
+        x = np.random.default_rng(0).random((taille,) + tuple(model.input_shape[1:]), dtype=np.float32)
+        temps = [mesurer(fonction, x, args.repeat) for _, fonction in variantes]
+        ecart = float(np.max(np.abs(model.predict(x, verbose=0) - compile_.predict(x))))
+        print(f"{taille:>5}" + "".join(f"{t*1000:>18.2f}" for t in temps) + f"{temps[0]/temps[-1]:>7.1f}x{ecart:>12.2e}")
+
+    print("\nℹ️ Médiane par appel ; le gain compare model.predict à CompiledModel (surcoût fixe par appel surtout visible en lot de 1).")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Micro-benchmark : preprocess_image_from_bytes (actuel) vs preprocess_image_fast
+#   python bench_preprocessing.py                 -> images de model/images/
+#   python bench_preprocessing.py --synthetic 12  -> ajoute des JPEG 12 MP générés à partir des exemples
+
+import os
+import io
+import sys
+import glob
+import time
+import argparse
+import tracemalloc
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from preprocessing import preprocess_image_from_bytes, preprocess_image_fast
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+
+def charger_images(image_dir, synthetic_mp=0):
+    images = []
+    for chemin in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        with open(chemin, "rb") as f:
+            data = f.read()
+        try:
+            Image.open(io.BytesIO(data)).verify()
+        except Exception:
+            continue
+        images.append((os.path.basename(chemin), data))
+
+    if synthetic_mp:
+        # Photos « téléphone » : un exemple agrandi à ~N MP et réencodé en JPEG qualité 90
+        largeur = int((synthetic_mp * 1e6 * 4 / 3) ** 0.5)
+        hauteur = int(largeur * 3 / 4)
+        for nom, data in images[:3]:
+            img = Image.open(io.BytesIO(data)).convert("RGB").resize((largeur, hauteur))
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=90)
+            images.append((f"{nom} ({synthetic_mp} MP)", buf.getvalue()))
+    return images
+
+def mesurer(fonction, data, repetitions):
+    fonction(data)  # échauffement
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        fonction(data)
+    latence = (time.perf_counter() - debut) / repetitions
+
+    tracemalloc.start()
+    fonction(data)
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latence, pic
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", default=IMAGES_DIR)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--synthetic", type=float, default=0, help="taille (MP) des JPEG synthétiques à ajouter")
+    args = parser.parse_args()
+
+    images = charger_images(args.images, args.synthetic)
+    print(f"{'image':<34}{'taille':>12}{'actuel ms':>11}{'rapide ms':>11}{'gain':>7}{'pic actuel':>12}{'pic rapide':>12}{'écart moy':>11}")
+    total_actuel = total_rapide = 0.0
+    for nom, data in images:
+        taille = "x".join(map(str, Image.open(io.BytesIO(data)).size))
+        t_actuel, m_actuel = mesurer(preprocess_image_from_bytes, data, args.repeat)
+        t_rapide, m_rapide = mesurer(preprocess_image_fast, data, args.repeat)
+        ecart = float(np.mean(np.abs(preprocess_image_from_bytes(data) - preprocess_image_fast(data))))
+        total_actuel += t_actuel
+        total_rapide += t_rapide
+        print(f"{nom[:33]:<34}{taille:>12}{t_actuel*1000:>11.2f}{t_rapide*1000:>11.2f}{t_actuel/t_rapide:>6.1f}x"
+              f"{m_actuel/1024:>10.0f}KB{m_rapide/1024:>10.0f}KB{ecart:>11.4f}")
+
+    print(f"\n⏱️ Total : actuel {total_actuel*1000:.1f} ms, rapide {total_rapide*1000:.1f} ms "
+          f"({total_actuel/total_rapide:.1f}x)")
+    print("ℹ️ Le pic mémoire est celui suivi par tracemalloc (tableaux NumPy) ; les tampons internes de PIL n'y figurent pas.")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Mode cascade de /predict :
+#   1. filtre très peu coûteux (vignette 64x64, indice de végétation) : une image sans feuille
+#      ni fruit est rejetée avant tout passage dans un réseau ;
+#   2. si la culture est connue (?crop=tomato), l'image part vers le modèle spécialiste de cette
+#      culture (voir model_registry.py) au lieu du classifieur 39 classes ;
+#   3. sinon, ou si le spécialiste n'est pas assez confiant : classifieur principal.
+#
+#   python cascade.py [dossier_images] [--crop tomato]   -> part des images filtrées et temps gagné
+
+import io
+import os
+import sys
+import time
+import threading
+import numpy as np
+from PIL import Image
+
+from tensor_format import is_tensor, decode_tensor
+
+# === Configuration (variables d'environnement) ===
+# SMARTFARM_CASCADE                  : 1 = cascade par défaut sur /predict (sinon ?cascade=1)
+# SMARTFARM_GATE_MIN_PLANT_FRACTION  : part minimale de pixels « végétaux » pour passer le filtre
+# SMARTFARM_CROP_SPECIALISTS         : culture -> modèle spécialiste, "tomato=mited,potato=mildiw"
+CASCADE_ENABLED = os.environ.get("SMARTFARM_CASCADE", "0") == "1"
+GATE_SIZE = 64
+GATE_MIN_PLANT_FRACTION = float(os.environ.get("SMARTFARM_GATE_MIN_PLANT_FRACTION", 0.05))
+GATE_REJECT_CLASS = "Background_without_leaves"
+
+# Le modèle "tomato-disease-detection-model.h5" de test_model_ia.py est le spécialiste tomate
+CROP_SPECIALISTS = dict(
+    paire.strip().split("=", 1)
+    for paire in os.environ.get("SMARTFARM_CROP_SPECIALISTS", "tomato=mited").split(",")
+    if "=" in paire
+)
+
+CASCADE_STAGES = ("gate", "specialist", "main")
+
+# -----------------------------------
+# 1. Filtre feuille / fond
+# -----------------------------------
+
+def plant_fraction(image_bytes, size=GATE_SIZE, tensor=False):
+    """Part des pixels d'une vignette `size` x `size` qui ressemblent à de la végétation ou à un fruit.
+
+    - feuillage : indice d'excès de vert 2G - R - B élevé ;
+    - fruit mûr (tomate, fraise) : rouge saturé, nettement au-dessus du vert et du bleu.
+    Le décodage JPEG se fait directement à taille réduite (Image.draft) ; un envoi au format
+    tenseur (tensor_format.py, ou `tensor` vrai) est réduit depuis ses pixels 224x224.
+    """
+    if tensor or is_tensor(image_bytes):
+        img = Image.fromarray(decode_tensor(image_bytes))
+    else:
+        img = Image.open(io.BytesIO(image_bytes))
+        img.draft('RGB', (size, size))
+    img = img.convert('RGB').resize((size, size), Image.BILINEAR)
+    pixels = np.asarray(img, dtype=np.int16)
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    feuillage = (2 * g - r - b) > 20
+    fruit = (r - b > 60) & (r * 10 > g * 18)
+    return float(np.mean(feuillage | fruit))
+
+def is_plant_image(image_bytes, min_fraction=GATE_MIN_PLANT_FRACTION, tensor=False):
+    fraction = plant_fraction(image_bytes, tensor=tensor)
+    return fraction >= min_fraction, fraction
+
+def specialist_decides(result):
+    """Vrai si le résultat du spécialiste suffit ; sinon ('unknown', 'negative') repli sur le modèle principal."""
+    return result is not None and result["result"] not in ("unknown", "negative")
+
+# -----------------------------------
+# 2. Statistiques de la cascade
+# -----------------------------------
+
+class CascadeStats:
+    """Sorties de la cascade par étage et latence moyenne de bout en bout de chacune."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._nb = dict.fromkeys(CASCADE_STAGES, 0)
+        self._temps = dict.fromkeys(CASCADE_STAGES, 0.0)
+
+    def record(self, stage, seconds):
+        with self._verrou:
+            self._nb[stage] += 1
+            self._temps[stage] += seconds
+
+    def stats(self):
+        with self._verrou:
+            nb = dict(self._nb)
+            temps = dict(self._temps)
+        total = sum(nb.values())
+        moyennes = {s: (temps[s] / nb[s]) if nb[s] else None for s in CASCADE_STAGES}
+        courts_circuits = nb["gate"] + nb["specialist"]
+
+        # Temps gagné estimé : chaque sortie anticipée aurait coûté une requête complète
+        # (latence moyenne des requêtes qui vont jusqu'au classifieur principal)
+        gagne = None
+        if moyennes["main"] is not None:
+            gagne = sum(nb[s] * moyennes["main"] - temps[s] for s in ("gate", "specialist"))
+        return {
+            "requests": total,
+            "exits": nb,
+            "short_circuit_fraction": (courts_circuits / total) if total else 0.0,
+            "mean_latency_seconds": moyennes,
+            "estimated_saved_seconds": gagne,
+        }
+
+# -----------------------------------
+# 3. Évaluation hors ligne sur un dossier d'images
+# -----------------------------------
+
+def evaluate(image_dir, crop=None, registry=None, backend=None):
+    """Compare, image par image, la cascade au classifieur principal seul."""
+    from inference import load_backend, interpret_prediction, _lister_images
+    from preprocessing import preprocess_image_fast
+
+    backend = backend or load_backend()
+    specialiste = CROP_SPECIALISTS.get(crop)
+    if registry is None or specialiste not in registry:
+        specialiste = None
+
+    stats = CascadeStats()
+    temps_complet = 0.0
+    for chemin in _lister_images(image_dir):
+        with open(chemin, "rb") as f:
+            data = f.read()
+        try:
+            # Référence : classifieur principal pour toutes les images
+            debut = time.perf_counter()
+            interpret_prediction(backend.predict(preprocess_image_fast(data))[0])
+            temps_complet += time.perf_counter() - debut
+
+            debut = time.perf_counter()
+            plante, _ = is_plant_image(data)
+            if not plante:
+                stats.record("gate", time.perf_counter() - debut)
+                continue
+            x = preprocess_image_fast(data)
+            if specialiste is not None and specialist_decides(registry.predict(specialiste, x)[0]):
+                stats.record("specialist", time.perf_counter() - debut)
+                continue
+            interpret_prediction(backend.predict(x)[0])
+            stats.record("main", time.perf_counter() - debut)
+        except Exception as e:
+            print(f"⚠️ Image ignorée {os.path.basename(chemin)} : {e}")
+
+    resume = stats.stats()
+    temps_cascade = sum(
+        (resume["mean_latency_seconds"][s] or 0.0) * resume["exits"][s] for s in CASCADE_STAGES)
+    resume["full_model_seconds"] = temps_complet
+    resume["cascade_seconds"] = temps_cascade
+    return resume
+
+if __name__ == "__main__":
+    import argparse
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from inference import IMAGES_DIR
+    from model_registry import default_registry
+
+    parser = argparse.ArgumentParser(description="Évaluation du mode cascade sur un dossier d'images")
+    parser.add_argument("images", nargs="?", default=IMAGES_DIR)
+    parser.add_argument("--crop", help="culture des images (routage vers le spécialiste)")
+    args = parser.parse_args()
+
+    resume = evaluate(args.images, args.crop, default_registry())
+    print(f"📷 Images : {resume['requests']} | sorties : {resume['exits']}")
+    print(f"⏩ Court-circuitées : {resume['short_circuit_fraction']*100:.1f}%")
+    print(f"⏱️ Classifieur seul : {resume['full_model_seconds']*1000:.0f} ms, cascade : {resume['cascade_seconds']*1000:.0f} ms "
+          f"(gagné : {(resume['full_model_seconds'] - resume['cascade_seconds'])*1000:.0f} ms)")
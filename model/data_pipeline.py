@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Pipeline d'entrée tf.data pour l'entraînement (remplace ImageDataGenerator dans test.py) :
+# - mêmes fichiers et même découpage que flow_from_directory(validation_split=0.2) ;
+# - décodage JPEG/PNG en parallèle, augmentation vectorisée par lot (même paramètres que test.py) ;
+# - cache() / prefetch(), et export facultatif en fragments TFRecord.
+#
+#   python data_pipeline.py bench <DATA_DIR> [--batches 50]        -> images/s : tf.data vs ImageDataGenerator
+#   python data_pipeline.py export-tfrecords <DATA_DIR> <OUT_DIR> [--shards 16]
+
+import os
+import sys
+import math
+import time
+import argparse
+import tensorflow as tf
+
+from dataset_cache import list_dataset_files
+
+IMG_HEIGHT, IMG_WIDTH = 224, 224
+BATCH_SIZE = 32
+VALIDATION_SPLIT = 0.2
+
+# Augmentation de test.py (ImageDataGenerator) : shear_range est en degrés
+AUGMENTATION = {
+    "rotation_range": 20,
+    "shear_range": 0.2,
+    "zoom_range": 0.2,
+    "width_shift_range": 0.1,
+    "height_shift_range": 0.1,
+    "horizontal_flip": True,
+}
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+# -----------------------------------
+# 1. Liste des fichiers et découpage entraînement / validation
+# -----------------------------------
+
+def list_dataset(data_dir, validation_split=VALIDATION_SPLIT):
+    """Fichiers, étiquettes et classes, découpés comme flow_from_directory (voir list_dataset_files).
+
+    Renvoie ((chemins, étiquettes) d'entraînement, (chemins, étiquettes) de validation, class_names).
+    """
+    train, val, class_names = list_dataset_files(data_dir, validation_split)
+
+    def _separer(lignes):
+        return [os.path.join(data_dir, f) for f, _ in lignes], [e for _, e in lignes]
+
+    return _separer(train), _separer(val), class_names
+
+# -----------------------------------
+# 2. Décodage et augmentation
+# -----------------------------------
+
+def decode_image(image_bytes, image_size=(IMG_HEIGHT, IMG_WIDTH)):
+    """Octets JPEG/PNG/BMP -> uint8 (H, W, 3) redimensionné (plus proche voisin, comme load_img)."""
+    img = tf.io.decode_image(image_bytes, channels=3, expand_animations=False)
+    img = tf.image.resize(img, image_size, method="nearest")
+    return tf.cast(img, tf.uint8)
+
+def _matrices_affines(taille_lot, hauteur, largeur, params, seed=None):
+    """Une transformation aléatoire par image, au format ImageProjectiveTransform (sortie -> entrée)."""
+    def uniforme(amplitude, centre=0.0):
+        return tf.random.uniform([taille_lot], centre - amplitude, centre + amplitude, seed=seed)
+
+    theta = uniforme(params["rotation_range"] * math.pi / 180)
+    cisaillement = uniforme(params["shear_range"] * math.pi / 180)
+    zx = uniforme(params["zoom_range"], 1.0)
+    zy = uniforme(params["zoom_range"], 1.0)
+    tx = uniforme(params["width_shift_range"]) * largeur
+    ty = uniforme(params["height_shift_range"]) * hauteur
+
+    # M = rotation @ cisaillement @ zoom, appliquée autour du centre de l'image
+    cos, sin = tf.cos(theta), tf.sin(theta)
+    a0 = cos * zx
+    a1 = (-cos * tf.sin(cisaillement) - sin * tf.cos(cisaillement)) * zy
+    b0 = sin * zx
+    b1 = (-sin * tf.sin(cisaillement) + cos * tf.cos(cisaillement)) * zy
+    cx, cy = (largeur - 1) / 2.0, (hauteur - 1) / 2.0
+    a2 = cx - a0 * cx - a1 * cy + tx
+    b2 = cy - b0 * cx - b1 * cy + ty
+    zeros = tf.zeros_like(a0)
+    return tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+
+def augment_batch(images, params=AUGMENTATION, seed=None):
+    """Augmentation d'un lot float (B, H, W, 3) en un seul appel : affine + miroir horizontal."""
+    forme = tf.shape(images)
+    taille_lot, hauteur, largeur = forme[0], forme[1], forme[2]
+    matrices = _matrices_affines(taille_lot, tf.cast(hauteur, tf.float32), tf.cast(largeur, tf.float32), params, seed)
+    images = tf.raw_ops.ImageProjectiveTransformV3(
+        images=images, transforms=matrices, output_shape=forme[1:3], fill_value=0.0,
+        interpolation="BILINEAR", fill_mode="NEAREST",
+    )
+    if params.get("horizontal_flip"):
+        miroir = tf.random.uniform([taille_lot], seed=seed) < 0.5
+        images = tf.where(miroir[:, None, None, None], tf.reverse(images, axis=[2]), images)
+    return images
+
+# -----------------------------------
+# 3. Datasets
+# -----------------------------------
+
+def _dataset_fichiers(chemins, etiquettes):
+    ds = tf.data.Dataset.from_tensor_slices((chemins, etiquettes))
+    return ds.map(lambda c, e: (tf.io.read_file(c), e), num_parallel_calls=AUTOTUNE)
+
+def _finaliser(ds, num_classes, batch_size, image_size, cache, shuffle, augment, taille, seed):
+    ds = ds.map(lambda data, e: (decode_image(data, image_size), e), num_parallel_calls=AUTOTUNE)
+    if cache is not None:
+        ds = ds.cache(cache)  # "" = en mémoire, sinon préfixe de fichiers de cache
+    if shuffle:
+        ds = ds.shuffle(min(taille, 10_000), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+
+    def _preparer(images, etiquettes):
+        images = tf.cast(images, tf.float32) / 255.0
+        if augment:
+            images = augment_batch(images, seed=seed)
+        return images, tf.one_hot(etiquettes, num_classes)
+
+    return ds.map(_preparer, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+
+def make_datasets(data_dir, batch_size=BATCH_SIZE, image_size=(IMG_HEIGHT, IMG_WIDTH),
+                  validation_split=VALIDATION_SPLIT, cache=None, tfrecord_dir=None, seed=None):
+    """(train_ds, val_ds, class_names) prêts pour model.fit (images /255, étiquettes one-hot).
+
+    `cache` : None = pas de cache, "" = images décodées gardées en mémoire, chemin = cache disque.
+    `tfrecord_dir` : lit les fragments écrits par export_tfrecords au lieu des fichiers image.
+    Seul l'entraînement est augmenté (ImageDataGenerator augmentait aussi la validation).
+    """
+    (train_chemins, train_etiq), (val_chemins, val_etiq), class_names = list_dataset(data_dir, validation_split)
+    n = len(class_names)
+
+    if tfrecord_dir:
+        train = read_tfrecords(os.path.join(tfrecord_dir, "train-*.tfrecord"))
+        val = read_tfrecords(os.path.join(tfrecord_dir, "val-*.tfrecord"))
+    else:
+        train = _dataset_fichiers(train_chemins, train_etiq)
+        val = _dataset_fichiers(val_chemins, val_etiq)
+
+    cache_val = cache if not cache else cache + "_val"
+    cache_train = cache if not cache else cache + "_train"
+    train_ds = _finaliser(train, n, batch_size, image_size, cache_train, True, True, len(train_chemins), seed)
+    val_ds = _finaliser(val, n, batch_size, image_size, cache_val, False, False, len(val_chemins), seed)
+    return train_ds, val_ds, class_names
+
+# -----------------------------------
+# 4. Fragments TFRecord (octets d'origine + étiquette)
+# -----------------------------------
+
+def export_tfrecords(data_dir, out_dir, num_shards=16, validation_split=VALIDATION_SPLIT):
+    os.makedirs(out_dir, exist_ok=True)
+    train, val, class_names = list_dataset(data_dir, validation_split)
+    for prefixe, (chemins, etiquettes) in (("train", train), ("val", val)):
+        nb = max(1, min(num_shards, len(chemins)))
+        ecrivains = [tf.io.TFRecordWriter(os.path.join(out_dir, f"{prefixe}-{i:05d}-of-{nb:05d}.tfrecord"))
+                     for i in range(nb)]
+        for i, (chemin, etiquette) in enumerate(zip(chemins, etiquettes)):
+            with open(chemin, "rb") as f:
+                exemple = tf.train.Example(features=tf.train.Features(feature={
+                    "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[f.read()])),
+                    "label": tf.train.Feature(int64_list=tf.train.Int64List(value=[etiquette])),
+                }))
+            ecrivains[i % nb].write(exemple.SerializeToString())
+        for e in ecrivains:
+            e.close()
+        print(f"✅ {prefixe} : {len(chemins)} images en {nb} fragments dans {out_dir}")
+    return class_names
+
+_SCHEMA = {
+    "image": tf.io.FixedLenFeature([], tf.string),
+    "label": tf.io.FixedLenFeature([], tf.int64),
+}
+
+def read_tfrecords(pattern):
+    """Dataset (octets, étiquette) lu en parallèle sur tous les fragments correspondant à `pattern`."""
+    fichiers = tf.data.Dataset.list_files(pattern, shuffle=False)
+    ds = fichiers.interleave(tf.data.TFRecordDataset, num_parallel_calls=AUTOTUNE, deterministic=False)
+
+    def _lire(exemple):
+        e = tf.io.parse_single_example(exemple, _SCHEMA)
+        return e["image"], tf.cast(e["label"], tf.int32)
+
+    return ds.map(_lire, num_parallel_calls=AUTOTUNE)
+
+# -----------------------------------
+# 5. Benchmark du pipeline d'entrée seul
+# -----------------------------------
+
+def _debit(iterable, nb_lots):
+    images = 0
+    iterateur = iter(iterable)
+    next(iterateur)  # démarrage (threads, premier lot)
+    debut = time.perf_counter()
+    for _ in range(nb_lots):
+        x, _ = next(iterateur)
+        images += int(x.shape[0])
+    return images / (time.perf_counter() - debut)
+
+def benchmark(data_dir, nb_lots=50, batch_size=BATCH_SIZE, tfrecord_dir=None):
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    datagen = ImageDataGenerator(rescale=1./255, validation_split=VALIDATION_SPLIT, **AUGMENTATION)
+    generateur = datagen.flow_from_directory(
+        data_dir, target_size=(IMG_HEIGHT, IMG_WIDTH), batch_size=batch_size,
+        class_mode="categorical", subset="training", shuffle=True)
+    train_ds, _, _ = make_datasets(data_dir, batch_size, tfrecord_dir=tfrecord_dir)
+
+    resultats = {
+        "ImageDataGenerator": _debit(generateur, nb_lots),
+        "tf.data": _debit(train_ds.repeat(), nb_lots),
+    }
+    if tfrecord_dir is None:
+        # Deuxième passage avec les images décodées en cache mémoire (époques suivantes)
+        cache_ds, _, _ = make_datasets(data_dir, batch_size, cache="")
+        for _ in cache_ds:  # première époque : remplit le cache
+            pass
+        resultats["tf.data + cache"] = _debit(cache_ds.repeat(), nb_lots)
+    return resultats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline tf.data d'entraînement")
+    sous = parser.add_subparsers(dest="commande", required=True)
+
+    p = sous.add_parser("bench")
+    p.add_argument("data_dir")
+    p.add_argument("--batches", type=int, default=50)
+    p.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    p.add_argument("--tfrecords", help="dossier de fragments TFRecord à lire à la place des images")
+
+    p = sous.add_parser("export-tfrecords")
+    p.add_argument("data_dir")
+    p.add_argument("out_dir")
+    p.add_argument("--shards", type=int, default=16)
+
+    args = parser.parse_args()
+    if args.commande == "export-tfrecords":
+        export_tfrecords(args.data_dir, args.out_dir, args.shards)
+        sys.exit(0)
+
+    resultats = benchmark(args.data_dir, args.batches, args.batch_size, args.tfrecords)
+    reference = resultats["ImageDataGenerator"]
+    for nom, debit in resultats.items():
+        print(f"{nom:<20}{debit:>10.1f} images/s{debit / reference:>8.1f}x")
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Cache disque du jeu de données prétraité : toutes les images redimensionnées en 224x224 dans un seul
+# tableau uint8 (N, 224, 224, 3) lu en memmap, plus les étiquettes et l'index des classes.
+#
+#   cache/images.npy   uint8 (N, H, W, 3) : d'abord les lignes d'entraînement, puis celles de validation
+#   cache/labels.npy   int32 (N,)
+#   cache/index.json   class_names, n_train, et pour chaque ligne : fichier, étiquette, empreinte
+#
+# Reconstruction incrémentale : seuls les fichiers nouveaux ou modifiés (date + taille, ou contenu
+# avec --key hash) sont décodés, les autres lignes sont recopiées depuis l'ancien cache.
+#
+#   python dataset_cache.py build <DATA_DIR> <CACHE_DIR> [--key mtime|hash]
+
+import os
+import io
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+IMG_HEIGHT, IMG_WIDTH = 224, 224
+VALIDATION_SPLIT = 0.2
+
+# Extensions lues par flow_from_directory
+EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".tif", ".tiff")
+
+INDEX_VERSION = 1
+
+# -----------------------------------
+# 1. Construction
+# -----------------------------------
+
+def list_dataset_files(data_dir, validation_split=VALIDATION_SPLIT):
+    """(chemin relatif, étiquette) d'entraînement et de validation, découpés comme flow_from_directory.
+
+    Classes = sous-dossiers triés ; dans chaque classe, les fichiers triés dont l'indice est
+    < int(validation_split * n) forment la validation, les autres l'entraînement.
+    """
+    class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    train, val = [], []
+    for indice, classe in enumerate(class_names):
+        fichiers = []
+        for racine, _, noms in os.walk(os.path.join(data_dir, classe)):
+            fichiers.extend(os.path.relpath(os.path.join(racine, n), data_dir)
+                            for n in sorted(noms) if n.lower().endswith(EXTENSIONS))
+        coupure = int(validation_split * len(fichiers))
+        val.extend((f, indice) for f in fichiers[:coupure])
+        train.extend((f, indice) for f in fichiers[coupure:])
+    return train, val, class_names
+
+def _empreinte(chemin, key):
+    if key == "hash":
+        h = hashlib.sha256()
+        with open(chemin, "rb") as f:
+            for bloc in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloc)
+        return h.hexdigest()
+    st = os.stat(chemin)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _decoder(chemin, image_size, out):
+    # Plus proche voisin, comme load_img / flow_from_directory
+    with open(chemin, "rb") as f:
+        img = Image.open(io.BytesIO(f.read()))
+    img.draft("RGB", (image_size[1], image_size[0]))
+    img = img.convert("RGB").resize((image_size[1], image_size[0]), Image.NEAREST)
+    out[...] = np.asarray(img, dtype=np.uint8)
+
+def _ecrire_index(chemin_index, image_size, key, class_names, n_train, lignes, empreintes):
+    with open(chemin_index, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "image_size": list(image_size),
+            "key": key,
+            "class_names": class_names,
+            "n_train": n_train,
+            "files": [{"path": fichier, "label": e, "stamp": s} for (fichier, e), s in zip(lignes, empreintes)],
+        }, f)
+
+def _decoder_lignes(data_dir, lignes, indices, image_size, images, workers):
+    # Décodage PIL en parallèle (le GIL est libéré pendant le décodage)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        list(pool.map(lambda i: _decoder(os.path.join(data_dir, lignes[i][0]), image_size, images[i]), indices))
+    images.flush()
+
+def build_dataset_cache(data_dir, cache_dir, image_size=(IMG_HEIGHT, IMG_WIDTH),
+                        validation_split=VALIDATION_SPLIT, key="mtime", workers=None):
+    """Crée ou met à jour le cache ; renvoie {'rows', 'decoded', 'reused', 'rewritten', 'seconds'}.
+
+    Rien n'est écrit si aucun fichier n'a changé ; si seuls des fichiers existants ont changé
+    (mêmes chemins, mêmes étiquettes), leurs lignes sont redécodées sur place. Un ajout, une
+    suppression ou un changement de classe décale les lignes : le tableau est alors réécrit.
+    """
+    debut = time.perf_counter()
+    os.makedirs(cache_dir, exist_ok=True)
+    train, val, class_names = list_dataset_files(data_dir, validation_split)
+    lignes = train + val
+    empreintes = [_empreinte(os.path.join(data_dir, f), key) for f, _ in lignes]
+
+    def _resume(decodees, reecrit):
+        return {"rows": len(lignes), "decoded": decodees, "reused": len(lignes) - decodees,
+                "rewritten": reecrit, "seconds": time.perf_counter() - debut}
+
+    # Ancien cache réutilisable s'il a la même taille d'image et le même type d'empreinte
+    ancien, anciennes_images, index = {}, None, None
+    chemin_index = os.path.join(cache_dir, "index.json")
+    chemin_images = os.path.join(cache_dir, "images.npy")
+    if os.path.exists(chemin_index):
+        with open(chemin_index, encoding="utf-8") as f:
+            index = json.load(f)
+        if (index.get("version") == INDEX_VERSION and index["image_size"] == list(image_size)
+                and index["key"] == key):
+            anciennes_images = np.load(chemin_images, mmap_mode="r")
+            if anciennes_images.shape[0] == len(index["files"]):
+                ancien = {e["path"]: (i, e["stamp"]) for i, e in enumerate(index["files"])}
+            else:
+                anciennes_images = index = None  # index et images incohérents : tout est redécodé
+        else:
+            index = None
+
+    meme_disposition = (index is not None and index["class_names"] == class_names
+                        and index["n_train"] == len(train)
+                        and [(e["path"], e["label"]) for e in index["files"]] == [tuple(l) for l in lignes])
+    if meme_disposition:
+        a_decoder = [i for i, (e, s) in enumerate(zip(index["files"], empreintes)) if e["stamp"] != s]
+        if not a_decoder:
+            return _resume(0, False)
+        # Lignes modifiées redécodées dans le tableau existant, puis index renommé : un arrêt brutal
+        # avant le renommage laisse les anciennes empreintes, et ces lignes seront redécodées
+        del anciennes_images
+        images = np.load(chemin_images, mmap_mode="r+")
+        _decoder_lignes(data_dir, lignes, a_decoder, image_size, images, workers)
+        del images
+        _ecrire_index(chemin_index + ".tmp", image_size, key, class_names, len(train), lignes, empreintes)
+        os.replace(chemin_index + ".tmp", chemin_index)
+        return _resume(len(a_decoder), False)
+
+    chemin_tmp = os.path.join(cache_dir, "images.tmp.npy")
+    images = np.lib.format.open_memmap(chemin_tmp, mode="w+", dtype=np.uint8,
+                                       shape=(len(lignes),) + tuple(image_size) + (3,))
+    a_decoder = []
+    for i, ((fichier, _), empreinte) in enumerate(zip(lignes, empreintes)):
+        precedent = ancien.get(fichier)
+        if precedent is not None and precedent[1] == empreinte:
+            images[i] = anciennes_images[precedent[0]]
+        else:
+            a_decoder.append(i)
+    _decoder_lignes(data_dir, lignes, a_decoder, image_size, images, workers)
+    del images, anciennes_images
+
+    # Étiquettes et index écrits à côté, puis index.json supprimé avant de remplacer les tableaux et
+    # renommé en dernier : un arrêt brutal entre deux étapes laisse un cache sans index (reconstruit
+    # entièrement), jamais un ancien index décrivant de nouvelles images
+    np.save(os.path.join(cache_dir, "labels.tmp.npy"), np.array([e for _, e in lignes], dtype=np.int32))
+    _ecrire_index(chemin_index + ".tmp", image_size, key, class_names, len(train), lignes, empreintes)
+    if os.path.exists(chemin_index):
+        os.remove(chemin_index)
+    os.replace(chemin_tmp, chemin_images)
+    os.replace(os.path.join(cache_dir, "labels.tmp.npy"), os.path.join(cache_dir, "labels.npy"))
+    os.replace(chemin_index + ".tmp", chemin_index)
+    return _resume(len(a_decoder), True)
+
+# -----------------------------------
+# 2. Lecture (tranches sans copie)
+# -----------------------------------
+
+class DatasetCache:
+    """Cache ouvert en lecture seule ; `train` et `val` sont des vues du memmap, sans copie."""
+
+    def __init__(self, cache_dir):
+        with open(os.path.join(cache_dir, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        self.cache_dir = cache_dir
+        self.class_names = index["class_names"]
+        self.n_train = index["n_train"]
+        self.files = [e["path"] for e in index["files"]]
+        self.stamps = [e["stamp"] for e in index["files"]]
+        self.images = np.load(os.path.join(cache_dir, "images.npy"), mmap_mode="r")
+        self.labels = np.load(os.path.join(cache_dir, "labels.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return self.images.shape[0]
+
+    @property
+    def train(self):
+        return self.images[:self.n_train], self.labels[:self.n_train]
+
+    @property
+    def val(self):
+        return self.images[self.n_train:], self.labels[self.n_train:]
+
+    def batches(self, subset="val", batch_size=64):
+        """Lots (images float32 /255, étiquettes) dans l'ordre du cache ; seule la conversion copie."""
+        images, labels = getattr(self, subset)
+        for debut in range(0, images.shape[0], batch_size):
+            yield images[debut:debut + batch_size].astype(np.float32) / 255.0, labels[debut:debut + batch_size]
+
+def open_dataset_cache(cache_dir):
+    return DatasetCache(cache_dir)
+
+# -----------------------------------
+# 3. Datasets tf.data pour l'entraînement
+# -----------------------------------
+
+def cache_to_datasets(cache, batch_size=32, augment=True, seed=None):
+    """(train_ds, val_ds) lus dans le memmap : lots d'indices triés -> une tranche par lot."""
+    import tensorflow as tf
+    from data_pipeline import augment_batch
+
+    n = len(cache.class_names)
+    forme = (None,) + tuple(cache.images.shape[1:])
+
+    def _dataset(debut, fin, melanger, augmenter):
+        ds = tf.data.Dataset.range(debut, fin)
+        if melanger:
+            ds = ds.shuffle(fin - debut, seed=seed, reshuffle_each_iteration=True)
+        ds = ds.batch(batch_size)
+
+        def _lire(indices):
+            indices = np.sort(indices)  # lecture du memmap dans l'ordre du fichier
+            return cache.images[indices], cache.labels[indices]
+
+        def _preparer(indices):
+            images, labels = tf.numpy_function(_lire, [indices], [tf.uint8, tf.int32])
+            images = tf.ensure_shape(images, forme)
+            labels = tf.ensure_shape(labels, (None,))
+            images = tf.cast(images, tf.float32) / 255.0
+            if augmenter:
+                images = augment_batch(images, seed=seed)
+            return images, tf.one_hot(labels, n)
+
+        return ds.map(_preparer, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+    return (_dataset(0, cache.n_train, True, augment),
+            _dataset(cache.n_train, len(cache), False, False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache memmap du jeu de données prétraité")
+    sous = parser.add_subparsers(dest="commande", required=True)
+    p = sous.add_parser("build")
+    p.add_argument("data_dir")
+    p.add_argument("cache_dir")
+    p.add_argument("--key", choices=["mtime", "hash"], default="mtime")
+    p.add_argument("--validation-split", type=float, default=VALIDATION_SPLIT)
+    args = parser.parse_args()
+
+    resume = build_dataset_cache(args.data_dir, args.cache_dir, validation_split=args.validation_split, key=args.key)
+    taille = os.path.getsize(os.path.join(args.cache_dir, "images.npy"))
+    print(f"✅ Cache {args.cache_dir} : {resume['rows']} images ({resume['decoded']} décodées, "
+          f"{resume['reused']} reprises) en {resume['seconds']:.1f} s, {taille/1024/1024:.0f} MB")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Cache des caractéristiques « bottleneck » pour l'étape 1 de test.py : la base MobileNetV2 est
+# gelée, ses sorties GlobalAveragePooling2D ne changent donc pas d'une époque à l'autre. On les
+# calcule une seule fois (K variantes augmentées par image d'entraînement) et on entraîne la tête
+# Dense(256) / Dropout / softmax directement sur ces vecteurs.
+#
+#   cache/train_features.npy   float16 (K, N_train, D) : variante 0 = image d'origine, 1..K-1 = augmentées
+#   cache/train_labels.npy     int32 (N_train,)
+#   cache/val_features.npy     float16 (N_val, D), images non augmentées
+#   cache/val_labels.npy       int32 (N_val,)
+#   cache/index.json           class_names, variantes, taille d'image, extracteur, empreinte des fichiers
+#
+#   python feature_cache.py build <DATA_DIR> <CACHE_DIR> [--variants 5] [--dataset-cache DIR]
+#   python feature_cache.py sweep <CACHE_DIR> [--lr 1e-3 3e-4] [--units 256] [--dropout 0.5] [--epochs 10]
+
+import os
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import numpy as np
+import tensorflow as tf
+
+from data_pipeline import list_dataset, decode_image, augment_batch
+
+IMG_HEIGHT, IMG_WIDTH = 224, 224
+VALIDATION_SPLIT = 0.2
+VARIANTS = 5
+HEAD_LAYERS = 3  # Dense(256), Dropout, Dense(softmax) dans build_model de test.py
+
+INDEX_VERSION = 2
+
+# -----------------------------------
+# 1. Extracteur et tête
+# -----------------------------------
+
+def split_head(model, head_layers=HEAD_LAYERS):
+    """Sépare le modèle de test.py en (extracteur -> vecteur GAP, tête sur ce vecteur).
+
+    La tête réutilise les couches du modèle complet : l'entraîner met à jour `model` directement.
+    """
+    extracteur = tf.keras.Model(model.inputs, model.layers[-head_layers - 1].output, name="bottleneck_extractor")
+    entree = tf.keras.Input(shape=extracteur.output.shape[1:])
+    x = entree
+    for couche in model.layers[-head_layers:]:
+        x = couche(x)
+    return extracteur, tf.keras.Model(entree, x, name="bottleneck_head")
+
+def build_head(num_classes, feature_dim, units=256, dropout=0.5):
+    """Tête seule (même architecture que test.py), pour les balayages d'hyperparamètres."""
+    entree = tf.keras.Input(shape=(feature_dim,))
+    x = tf.keras.layers.Dense(units, activation='relu')(entree)
+    x = tf.keras.layers.Dropout(dropout)(x)
+    sortie = tf.keras.layers.Dense(num_classes, activation='softmax', dtype='float32')(x)
+    return tf.keras.Model(entree, sortie, name="bottleneck_head")
+
+def default_extractor(image_size=(IMG_HEIGHT, IMG_WIDTH)):
+    """MobileNetV2 ImageNet gelé + GlobalAveragePooling2D, comme la base de test.py."""
+    base = tf.keras.applications.MobileNetV2(input_shape=image_size + (3,), include_top=False, weights='imagenet')
+    entree = tf.keras.Input(shape=image_size + (3,))
+    sortie = tf.keras.layers.GlobalAveragePooling2D()(base(entree, training=False))
+    return tf.keras.Model(entree, sortie, name="bottleneck_extractor")
+
+# -----------------------------------
+# 2. Construction du cache
+# -----------------------------------
+
+def _empreinte_fichiers(lignes):
+    # Chemins, étiquettes et empreintes (date + taille) : une image remplacée sous le même nom invalide le cache
+    h = hashlib.sha256()
+    for ligne in lignes:
+        h.update("\0".join(map(str, ligne)).encode("utf-8") + b"\n")
+    return h.hexdigest()
+
+def _lots_images(data_dir, dataset_cache, image_size, validation_split, batch_size):
+    """Lots uint8 non mélangés ni augmentés :
+    (générateur train, générateur val, étiquettes train, étiquettes val, class_names, empreinte des fichiers)."""
+    if dataset_cache is not None:
+        (train_images, train_labels), (val_images, val_labels) = dataset_cache.train, dataset_cache.val
+
+        def _tranches(images):
+            return lambda: (images[i:i + batch_size] for i in range(0, images.shape[0], batch_size))
+
+        # Empreintes déjà calculées par dataset_cache.py (index.json)
+        empreinte = _empreinte_fichiers(zip(dataset_cache.files, np.asarray(dataset_cache.labels), dataset_cache.stamps))
+        return (_tranches(train_images), _tranches(val_images), np.asarray(train_labels),
+                np.asarray(val_labels), dataset_cache.class_names, empreinte)
+
+    (train_chemins, train_etiq), (val_chemins, val_etiq), class_names = list_dataset(data_dir, validation_split)
+
+    def _fichiers(chemins):
+        ds = tf.data.Dataset.from_tensor_slices(chemins)
+        ds = ds.map(lambda c: decode_image(tf.io.read_file(c), image_size), num_parallel_calls=tf.data.AUTOTUNE)
+        return lambda: ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+    def _stat(chemin):
+        st = os.stat(chemin)
+        return st.st_mtime_ns, st.st_size
+
+    empreinte = _empreinte_fichiers((os.path.relpath(c, data_dir), e) + _stat(c)
+                                    for c, e in zip(train_chemins + val_chemins, train_etiq + val_etiq))
+    return (_fichiers(train_chemins), _fichiers(val_chemins), np.array(train_etiq, dtype=np.int32),
+            np.array(val_etiq, dtype=np.int32), class_names, empreinte)
+
+def _signature(extracteur, image_size, variants, class_names, n_train, n_val, files):
+    return {
+        "version": INDEX_VERSION,
+        "extractor": extracteur.name,
+        "feature_dim": int(extracteur.output.shape[-1]),
+        "image_size": list(image_size),
+        "variants": variants,
+        "class_names": class_names,
+        "n_train": n_train,
+        "n_val": n_val,
+        "files": files,
+    }
+
+def build_feature_cache(cache_dir, extracteur=None, data_dir=None, dataset_cache=None,
+                        image_size=(IMG_HEIGHT, IMG_WIDTH), validation_split=VALIDATION_SPLIT,
+                        variants=VARIANTS, batch_size=64, seed=None, rebuild=False):
+    """Calcule les caractéristiques une fois ; renvoie {'rows', 'variants', 'reused', 'seconds'}.
+
+    Images lues dans `dataset_cache` (dataset_cache.py) si fourni, sinon décodées depuis `data_dir`.
+    Chaque lot est décodé une seule fois puis passé `variants` fois dans l'extracteur
+    (la première fois sans augmentation). Le cache est réutilisé tel quel si rien n'a changé,
+    fichiers compris (chemins, étiquettes, date + taille ou empreinte du cache d'images).
+    """
+    debut = time.perf_counter()
+    extracteur = extracteur or default_extractor(image_size)
+    lots_train, lots_val, train_labels, val_labels, class_names, empreinte = _lots_images(
+        data_dir, dataset_cache, image_size, validation_split, batch_size)
+    signature = _signature(extracteur, image_size, variants, class_names, len(train_labels), len(val_labels),
+                           empreinte)
+
+    chemin_index = os.path.join(cache_dir, "index.json")
+    if not rebuild and os.path.exists(chemin_index):
+        with open(chemin_index, encoding="utf-8") as f:
+            if json.load(f) == signature:
+                return {"rows": len(train_labels) + len(val_labels), "variants": variants,
+                        "reused": True, "seconds": time.perf_counter() - debut}
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if os.path.exists(chemin_index):
+        os.remove(chemin_index)  # cache incomplet tant que l'index n'est pas réécrit
+    dim = signature["feature_dim"]
+
+    # Augmentation + extraction dans un seul graphe
+    @tf.function(reduce_retracing=True)
+    def _caracteristiques(images, augmenter):
+        x = tf.cast(images, tf.float32) / 255.0
+        if augmenter:
+            x = augment_batch(x, seed=seed)
+        return tf.cast(extracteur(x, training=False), tf.float16)
+
+    train = np.lib.format.open_memmap(os.path.join(cache_dir, "train_features.npy"), mode="w+",
+                                      dtype=np.float16, shape=(variants, len(train_labels), dim))
+    i = 0
+    for lot in lots_train():
+        for k in range(variants):
+            train[k, i:i + len(lot)] = _caracteristiques(lot, k > 0).numpy()
+        i += len(lot)
+    train.flush()
+
+    val = np.lib.format.open_memmap(os.path.join(cache_dir, "val_features.npy"), mode="w+",
+                                    dtype=np.float16, shape=(len(val_labels), dim))
+    i = 0
+    for lot in lots_val():
+        val[i:i + len(lot)] = _caracteristiques(lot, False).numpy()
+        i += len(lot)
+    val.flush()
+    del train, val
+
+    np.save(os.path.join(cache_dir, "train_labels.npy"), train_labels.astype(np.int32))
+    np.save(os.path.join(cache_dir, "val_labels.npy"), val_labels.astype(np.int32))
+    with open(chemin_index, "w", encoding="utf-8") as f:
+        json.dump(signature, f)
+
+    return {"rows": len(train_labels) + len(val_labels), "variants": variants,
+            "reused": False, "seconds": time.perf_counter() - debut}
+
+# -----------------------------------
+# 3. Lecture et entraînement de la tête
+# -----------------------------------
+
+class FeatureCache:
+    """Cache ouvert en lecture seule (memmap)."""
+
+    def __init__(self, cache_dir):
+        with open(os.path.join(cache_dir, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        self.cache_dir = cache_dir
+        self.class_names = index["class_names"]
+        self.variants = index["variants"]
+        self.feature_dim = index["feature_dim"]
+        self.train_features = np.load(os.path.join(cache_dir, "train_features.npy"), mmap_mode="r")
+        self.train_labels = np.load(os.path.join(cache_dir, "train_labels.npy"))
+        self.val_features = np.load(os.path.join(cache_dir, "val_features.npy"), mmap_mode="r")
+        self.val_labels = np.load(os.path.join(cache_dir, "val_labels.npy"))
+
+def open_feature_cache(cache_dir):
+    return FeatureCache(cache_dir)
+
+def feature_datasets(cache, batch_size=256, seed=None):
+    """(train_ds, val_ds) de vecteurs float32 et étiquettes one-hot.
+
+    À chaque époque, chaque image d'entraînement apparaît une fois, sous une de ses variantes tirée au hasard.
+    """
+    n = len(cache.class_names)
+    generateur = np.random.default_rng(seed)
+
+    def _lire(indices):
+        indices = np.sort(indices)
+        variantes = generateur.integers(0, cache.variants, size=len(indices))
+        return cache.train_features[variantes, indices].astype(np.float32), cache.train_labels[indices]
+
+    def _preparer(indices):
+        x, y = tf.numpy_function(_lire, [indices], [tf.float32, tf.int32])
+        x = tf.ensure_shape(x, (None, cache.feature_dim))
+        y = tf.ensure_shape(y, (None,))
+        return x, tf.one_hot(y, n)
+
+    taille = cache.train_features.shape[1]
+    train_ds = (tf.data.Dataset.range(taille)
+                .shuffle(taille, seed=seed, reshuffle_each_iteration=True)
+                .batch(batch_size)
+                .map(_preparer, num_parallel_calls=tf.data.AUTOTUNE)
+                .prefetch(tf.data.AUTOTUNE))
+    val_ds = tf.data.Dataset.from_tensor_slices(
+        (np.asarray(cache.val_features, dtype=np.float32), tf.one_hot(cache.val_labels, n))).batch(batch_size)
+    return train_ds, val_ds
+
+def train_head(head, cache, epochs=10, batch_size=256, learning_rate=1e-3, callbacks=(), seed=None, verbose=1,
+               checkpoint=None):
+    """Compile et entraîne la tête sur les caractéristiques en cache ; renvoie l'historique Keras.
+
+    `checkpoint` : ResumableCheckpoint (training.py) ; l'entraînement reprend à sa dernière époque.
+    """
+    head.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+                 loss='categorical_crossentropy', metrics=['accuracy'])
+    train_ds, val_ds = feature_datasets(cache, batch_size, seed)
+    callbacks = list(callbacks)
+    initial_epoch = 0
+    if checkpoint is not None:
+        initial_epoch = checkpoint.restore(head)
+        callbacks.append(checkpoint)  # en dernier (voir ResumableCheckpoint)
+    return head.fit(train_ds, validation_data=val_ds, epochs=epochs, initial_epoch=initial_epoch,
+                    callbacks=callbacks, verbose=verbose)
+
+def sweep(cache, learning_rates=(1e-3,), units=(256,), dropouts=(0.5,), epochs=10, batch_size=256):
+    """Entraîne une tête par combinaison ; renvoie [(lr, units, dropout, meilleure val_accuracy, secondes)]."""
+    resultats = []
+    for lr, u, d in itertools.product(learning_rates, units, dropouts):
+        debut = time.perf_counter()
+        head = build_head(len(cache.class_names), cache.feature_dim, u, d)
+        history = train_head(head, cache, epochs, batch_size, lr, verbose=0)
+        resultats.append((lr, u, d, max(history.history["val_accuracy"]), time.perf_counter() - debut))
+    return resultats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache des caractéristiques MobileNetV2 pour l'entraînement de la tête")
+    sous = parser.add_subparsers(dest="commande", required=True)
+
+    p = sous.add_parser("build")
+    p.add_argument("data_dir")
+    p.add_argument("cache_dir")
+    p.add_argument("--variants", type=int, default=VARIANTS)
+    p.add_argument("--dataset-cache", help="cache memmap (dataset_cache.py) à lire à la place des images")
+    p.add_argument("--rebuild", action="store_true")
+
+    p = sous.add_parser("sweep")
+    p.add_argument("cache_dir")
+    p.add_argument("--lr", type=float, nargs="+", default=[1e-3])
+    p.add_argument("--units", type=int, nargs="+", default=[256])
+    p.add_argument("--dropout", type=float, nargs="+", default=[0.5])
+    p.add_argument("--epochs", type=int, default=10)
+    p.add_argument("--batch-size", type=int, default=256)
+
+    args = parser.parse_args()
+    if args.commande == "build":
+        source = None
+        if args.dataset_cache:
+            from dataset_cache import open_dataset_cache
+            source = open_dataset_cache(args.dataset_cache)
+        resume = build_feature_cache(args.cache_dir, data_dir=args.data_dir, dataset_cache=source,
+                                     variants=args.variants, rebuild=args.rebuild)
+        etat = "réutilisé" if resume["reused"] else "calculé"
+        print(f"✅ Cache {args.cache_dir} {etat} : {resume['rows']} images x {resume['variants']} variantes "
+              f"en {resume['seconds']:.1f} s")
+    else:
+        cache = open_feature_cache(args.cache_dir)
+        print(f"{'lr':>8}{'units':>7}{'dropout':>9}{'val_acc':>9}{'temps':>9}")
+        for lr, u, d, acc, secondes in sweep(cache, args.lr, args.units, args.dropout, args.epochs, args.batch_size):
+            print(f"{lr:>8g}{u:>7}{d:>9.2f}{acc:>9.3f}{secondes:>8.1f}s")
@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import glob
+import hashlib
+import argparse
+import threading
+import numpy as np
+
+from class_names import class_names
+
+# === Configuration (variables d'environnement) ===
+# SMARTFARM_BACKEND     : keras (défaut) | tflite | onnx
+# SMARTFARM_MODEL_PATH  : chemin du modèle (par défaut selon le backend, voir DEFAULT_MODEL_PATHS)
+# SMARTFARM_NUM_THREADS : threads intra-op de l'interpréteur (0 = valeur par défaut du runtime)
+DEFAULT_MODEL_PATHS = {
+    "keras": "models/plant_disease_model_mobilenet.h5",
+    "tflite": "models/plant_disease_model_mobilenet.tflite",
+    "onnx": "models/plant_disease_model_mobilenet.onnx",
+}
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+
+# Contenu des fichiers modèles lus à l'avance, et backends déjà construits (serve.py : construits une
+# seule fois par le processus maître avant le fork ; les workers héritent des poids en copie-sur-écriture)
+_PRELOADED = {}
+_PRELOADED_BACKENDS = {}
+
+def preload_model(model_path):
+    with open(model_path, "rb") as f:
+        _PRELOADED[os.path.abspath(model_path)] = f.read()
+
+def _preloaded(model_path):
+    return _PRELOADED.get(os.path.abspath(model_path))
+
+def model_version(model_path):
+    """Empreinte du fichier modèle : un modèle réentraîné change de version (et invalide les caches)."""
+    contenu = _preloaded(model_path)
+    if contenu is not None:
+        return hashlib.sha256(contenu).hexdigest()[:16]
+    h = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()[:16]
+
+# -----------------------------------
+# 1. Backends d'inférence
+# -----------------------------------
+# Chaque backend expose predict(x) : tableau float (N, 224, 224, 3) -> probabilités (N, nb_classes),
+# ainsi que `path` et `version` (empreinte du fichier chargé)
+
+class CompiledModel:
+    """Passe avant compilée une seule fois, réutilisée à chaque requête.
+
+    model.predict() reconstruit à chaque appel son adaptateur de données et ses callbacks ;
+    ici, un graphe tf.function (model(x, training=False)) est tracé à l'avance pour chaque
+    taille de `batch_sizes` (forme fixe), plus un graphe à taille de lot variable pour les autres.
+    """
+
+    def __init__(self, model, batch_sizes=(1,)):
+        import tensorflow as tf
+
+        self.model = model
+        self._tf = tf
+        forme = tuple(model.input_shape[1:])
+        fonction = tf.function(lambda x: model(x, training=False))
+        self._fonctions = {
+            n: fonction.get_concrete_function(tf.TensorSpec((n,) + forme, tf.float32))
+            for n in sorted(set(batch_sizes))
+        }
+        self._generique = fonction.get_concrete_function(tf.TensorSpec((None,) + forme, tf.float32))
+
+    def predict(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        fonction = self._fonctions.get(x.shape[0], self._generique)
+        return fonction(self._tf.constant(x)).numpy()
+
+    __call__ = predict
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, model_path, num_threads=0, batch_sizes=(1,)):
+        import tensorflow as tf
+        if num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        from tensorflow.keras.models import load_model
+
+        self.path = model_path
+        self.version = model_version(model_path)
+        self.model = load_model(model_path, compile=False)
+        self.compiled = CompiledModel(self.model, batch_sizes)
+
+    def predict(self, x):
+        return self.compiled.predict(x)
+
+
+def _tflite_interpreter_class():
+    # Runtime léger d'abord (sans TensorFlow complet), TensorFlow en dernier recours
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteBackend:
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=0):
+        Interpreter = _tflite_interpreter_class()
+        self.path = model_path
+        self.version = model_version(model_path)
+        contenu = _preloaded(model_path)
+        if contenu is not None:
+            # Les poids constants sont lus directement dans le tampon partagé
+            self.interpreter = Interpreter(model_content=contenu, num_threads=num_threads or None)
+        else:
+            self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self._entree = self.interpreter.get_input_details()[0]
+        self._sortie = self.interpreter.get_output_details()[0]
+        self._taille_lot = None
+        # L'interpréteur TFLite n'est pas thread-safe
+        self._verrou = threading.Lock()
+
+    def _redimensionner(self, taille_lot):
+        if taille_lot != self._taille_lot:
+            forme = list(self._entree["shape"])
+            forme[0] = taille_lot
+            self.interpreter.resize_tensor_input(self._entree["index"], forme)
+            self.interpreter.allocate_tensors()
+            self._entree = self.interpreter.get_input_details()[0]
+            self._sortie = self.interpreter.get_output_details()[0]
+            self._taille_lot = taille_lot
+
+    def predict(self, x):
+        with self._verrou:
+            self._redimensionner(x.shape[0])
+            dtype = self._entree["dtype"]
+            if dtype in (np.int8, np.uint8):
+                echelle, zero = self._entree["quantization"]
+                info = np.iinfo(dtype)
+                x = np.clip(np.round(x / echelle + zero), info.min, info.max).astype(dtype)
+            else:
+                x = x.astype(dtype, copy=False)
+            self.interpreter.set_tensor(self._entree["index"], x)
+            self.interpreter.invoke()
+            y = self.interpreter.get_tensor(self._sortie["index"])
+            if self._sortie["dtype"] in (np.int8, np.uint8):
+                echelle, zero = self._sortie["quantization"]
+                y = (y.astype(np.float32) - zero) * echelle
+            return y
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=0):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("❌ onnxruntime est nécessaire pour le backend onnx (pip install onnxruntime)")
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.path = model_path
+        self.version = model_version(model_path)
+        source = _preloaded(model_path) or model_path
+        self.session = ort.InferenceSession(source, sess_options=options, providers=["CPUExecutionProvider"])
+        self._nom_entree = self.session.get_inputs()[0].name
+
+    def predict(self, x):
+        return self.session.run(None, {self._nom_entree: x.astype(np.float32, copy=False)})[0]
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+}
+
+def resolve_backend(backend=None, model_path=None):
+    """(nom du backend, chemin du modèle) d'après les arguments, sinon les variables SMARTFARM_*."""
+    backend = (backend or os.environ.get("SMARTFARM_BACKEND", "keras")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"❌ Backend inconnu : {backend} (choix : {', '.join(BACKENDS)})")
+    return backend, model_path or os.environ.get("SMARTFARM_MODEL_PATH") or DEFAULT_MODEL_PATHS[backend]
+
+def preload_backend(backend=None, model_path=None, num_threads=None):
+    """Construit le backend dans le processus courant pour que les processus forkés en héritent.
+
+    Réservé aux backends tflite et onnx : le runtime TensorFlow (backend keras) se bloque dans
+    un processus forké après avoir été initialisé dans le parent.
+    """
+    backend, model_path = resolve_backend(backend, model_path)
+    if backend == "keras":
+        raise ValueError("❌ Le backend keras ne peut pas être construit avant un fork")
+    if backend == "tflite":
+        preload_model(model_path)  # tampon dans lequel l'interpréteur lit les poids
+    modele = load_backend(backend, model_path, num_threads)
+    _PRELOADED_BACKENDS.clear()
+    _PRELOADED_BACKENDS[(backend, os.path.abspath(model_path))] = modele
+    return modele
+
+def load_backend(backend=None, model_path=None, num_threads=None, batch_sizes=None):
+    """Charge le backend choisi (argument, sinon variables d'environnement SMARTFARM_*).
+
+    `batch_sizes` : tailles de lot dont le graphe est tracé au chargement (backend keras).
+    Un backend construit par preload_backend est réutilisé tel quel.
+    """
+    backend, model_path = resolve_backend(backend, model_path)
+    deja = _PRELOADED_BACKENDS.get((backend, os.path.abspath(model_path)))
+    if deja is not None:
+        return deja
+    if num_threads is None:
+        num_threads = int(os.environ.get("SMARTFARM_NUM_THREADS", 0))
+    if backend == "keras" and batch_sizes:
+        return KerasBackend(model_path, num_threads=num_threads, batch_sizes=batch_sizes)
+    return BACKENDS[backend](model_path, num_threads=num_threads)
+
+# Seuil en dessous duquel la prédiction est renvoyée comme 'unknown'
+SEUIL_CONFIANCE = 0.7
+
+def interpret_prediction(probs, labels=class_names):
+    """Applique le seuil de confiance à une ligne de probabilités -> {result, confidence}."""
+    predicted_index = int(np.argmax(probs))
+    confidence = float(probs[predicted_index])
+    if confidence < SEUIL_CONFIANCE:
+        return {'result': 'unknown', 'confidence': confidence}
+    return {'result': labels[predicted_index], 'confidence': confidence}
+
+# -----------------------------------
+# 2. Export du modèle Keras entraîné
+# -----------------------------------
+
+def _images_representatives(image_dir=IMAGES_DIR, limite=100):
+    from preprocessing import preprocess_image_from_bytes
+
+    for chemin in _lister_images(image_dir)[:limite]:
+        try:
+            with open(chemin, "rb") as f:
+                yield [preprocess_image_from_bytes(f.read()).astype(np.float32)]
+        except Exception:
+            continue
+
+def export_tflite(keras_path, tflite_path, quantize=None, image_dir=IMAGES_DIR):
+    """Convertit le .h5 en .tflite ; quantize = None | 'float16' | 'int8'."""
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    model = load_model(keras_path, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        # Poids et activations int8, calibrés sur les images d'exemple ; entrée/sortie restent en float32
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: _images_representatives(image_dir)
+    elif quantize is not None:
+        raise ValueError(f"❌ Quantification inconnue : {quantize}")
+
+    with open(tflite_path, "wb") as f:
+        f.write(converter.convert())
+    return tflite_path
+
+def export_onnx(keras_path, onnx_path, opset=13):
+    try:
+        import tf2onnx
+    except ImportError:
+        raise ImportError("❌ tf2onnx est nécessaire pour l'export ONNX (pip install tf2onnx)")
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    model = load_model(keras_path, compile=False)
+    forme = (None,) + tuple(model.input_shape[1:])
+    fonction = tf.function(lambda x: model(x, training=False))
+    signature = [tf.TensorSpec(forme, tf.float32, name="input")]
+    tf2onnx.convert.from_function(fonction, input_signature=signature, opset=opset, output_path=onnx_path)
+    return onnx_path
+
+# -----------------------------------
+# 3. Contrôle de parité top-1 avec le modèle Keras
+# -----------------------------------
+
+def _lister_images(image_dir):
+    extensions = (".jpg", ".jpeg", ".jfif", ".png", ".webp", ".avif")
+    return sorted(p for p in glob.glob(os.path.join(image_dir, "*")) if p.lower().endswith(extensions))
+
+def parity_check(reference, candidate, image_dir=IMAGES_DIR):
+    """Compare le top-1 de deux backends sur les images du dossier ; renvoie un résumé."""
+    from preprocessing import preprocess_image_from_bytes
+
+    lignes = []
+    for chemin in _lister_images(image_dir):
+        try:
+            with open(chemin, "rb") as f:
+                x = preprocess_image_from_bytes(f.read())
+        except Exception as e:
+            print(f"⚠️ Image ignorée {os.path.basename(chemin)} : {e}")
+            continue
+        p_ref = np.asarray(reference.predict(x))[0]
+        p_cand = np.asarray(candidate.predict(x))[0]
+        lignes.append({
+            "image": os.path.basename(chemin),
+            "top1_reference": int(np.argmax(p_ref)),
+            "top1_candidate": int(np.argmax(p_cand)),
+            "max_abs_diff": float(np.max(np.abs(p_ref - p_cand))),
+        })
+
+    accords = sum(l["top1_reference"] == l["top1_candidate"] for l in lignes)
+    return {
+        "images": len(lignes),
+        "top1_agreement": accords / len(lignes) if lignes else 0.0,
+        "max_abs_diff": max((l["max_abs_diff"] for l in lignes), default=0.0),
+        "details": lignes,
+    }
+
+# -----------------------------------
+# 4. Ligne de commande
+# -----------------------------------
+# python inference.py export-tflite models/plant_disease_model_mobilenet.h5 models/plant_disease_model_mobilenet.tflite --quantize float16
+# python inference.py export-onnx models/plant_disease_model_mobilenet.h5 models/plant_disease_model_mobilenet.onnx
+# python inference.py parity --backend tflite --model models/plant_disease_model_mobilenet.tflite
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export et contrôle des backends d'inférence")
+    sous = parser.add_subparsers(dest="commande", required=True)
+
+    p = sous.add_parser("export-tflite")
+    p.add_argument("source")
+    p.add_argument("destination")
+    p.add_argument("--quantize", choices=["float16", "int8"])
+
+    p = sous.add_parser("export-onnx")
+    p.add_argument("source")
+    p.add_argument("destination")
+
+    p = sous.add_parser("parity")
+    p.add_argument("--backend", required=True, choices=list(BACKENDS))
+    p.add_argument("--model")
+    p.add_argument("--reference", default=DEFAULT_MODEL_PATHS["keras"])
+    p.add_argument("--images", default=IMAGES_DIR)
+    p.add_argument("--threads", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.commande == "export-tflite":
+        export_tflite(args.source, args.destination, quantize=args.quantize)
+        print(f"✅ Modèle TFLite exporté : {args.destination} ({os.path.getsize(args.destination)/1024/1024:.2f} MB)")
+    elif args.commande == "export-onnx":
+        export_onnx(args.source, args.destination)
+        print(f"✅ Modèle ONNX exporté : {args.destination} ({os.path.getsize(args.destination)/1024/1024:.2f} MB)")
+    else:
+        reference = KerasBackend(args.reference)
+        candidat = load_backend(args.backend, args.model, args.threads)
+        resume = parity_check(reference, candidat, args.images)
+        for ligne in resume["details"]:
+            signe = "✅" if ligne["top1_reference"] == ligne["top1_candidate"] else "❌"
+            print(f"{signe} {ligne['image']}: keras={ligne['top1_reference']} {candidat.name}={ligne['top1_candidate']} (écart max {ligne['max_abs_diff']:.4f})")
+        print(f"\n🎯 Accord top-1 : {resume['top1_agreement']*100:.1f}% sur {resume['images']} images")
+        sys.exit(0 if resume["top1_agreement"] == 1.0 else 1)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from risk_engine import all_aggregates, evaluate_models
+
+DEFAULT_CHUNKSIZE = 50_000
+
+# -----------------------------------
+# 1. Lecture par morceaux (CSV, Parquet, Excel)
+# -----------------------------------
+
+def _iter_excel(filepath, sheet, chunksize):
+    import openpyxl
+
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        rows = ws.iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else '' for c in next(rows)]
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunksize:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        wb.close()
+
+def _iter_parquet(filepath, chunksize):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("❌ pyarrow est nécessaire pour lire les fichiers Parquet (pip install pyarrow)")
+
+    for batch in pq.ParquetFile(filepath).iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+def iter_chunks(filepath, chunksize=DEFAULT_CHUNKSIZE, sheet=0):
+    """Itère sur le fichier capteur par blocs de `chunksize` lignes (DataFrames)."""
+    ext = os.path.splitext(str(filepath))[1].lower()
+    if ext in ('.csv', '.txt'):
+        chunks = pd.read_csv(filepath, chunksize=chunksize)
+    elif ext in ('.parquet', '.pq'):
+        chunks = _iter_parquet(filepath, chunksize)
+    elif ext in ('.xlsx', '.xlsm'):
+        chunks = _iter_excel(filepath, sheet, chunksize)
+    else:
+        raise ValueError(f"❌ Format de fichier non supporté : {ext}")
+
+    for chunk in chunks:
+        chunk.columns = [str(col).strip() for col in chunk.columns]
+        yield chunk
+
+# -----------------------------------
+# 2. Agrégation journalière incrémentale
+# -----------------------------------
+
+class DailyAggregator:
+    """Maintient les sommes/comptes/minima du jour en cours et rend les jours terminés.
+
+    Les lignes doivent arriver triées par date : un jour est considéré terminé
+    dès qu'une ligne d'un jour suivant apparaît. Seul le jour ouvert est gardé
+    en mémoire, quelle que soit la longueur de l'historique.
+    """
+
+    def __init__(self, aggregates=None):
+        # Par défaut : l'union des agrégats de tous les modèles du registre (risk_engine)
+        self.aggregates = dict(aggregates or all_aggregates())
+        self._ouvert = None       # partiels du jour en cours (DataFrame d'une ligne)
+        self._dernier_emis = None
+
+    def partials(self, chunk):
+        """Partiels par jour d'un bloc de lignes (colonne__sum, __count, __min), index = jour."""
+        colonnes = [c for c in self.aggregates if c in chunk.columns]
+        jours = pd.to_datetime(chunk['datetime']).dt.floor('D')
+        valeurs = chunk[colonnes].apply(pd.to_numeric, errors='coerce')
+        groupes = valeurs.groupby(jours.values)
+
+        parts = {}
+        sommes = groupes.sum()
+        comptes = groupes.count()
+        minima = groupes.min()
+        for col in colonnes:
+            op = self.aggregates[col]
+            if op == 'min':
+                parts[f'{col}__min'] = minima[col]
+            else:
+                parts[f'{col}__sum'] = sommes[col]
+                if op == 'mean':
+                    parts[f'{col}__count'] = comptes[col]
+        partiels = pd.DataFrame(parts)
+        partiels.index.name = 'Date'
+        return partiels
+
+    @staticmethod
+    def _fusionner(a, b):
+        tout = pd.concat([a, b])
+        regles = {c: ('min' if c.endswith('__min') else 'sum') for c in tout.columns}
+        return tout.groupby(level=0).agg(regles)
+
+    def finalize(self, partiels):
+        """Partiels par jour (voir partials) -> agrégats journaliers, colonne Date."""
+        jours = pd.DataFrame(index=partiels.index)
+        for col, op in self.aggregates.items():
+            if op == 'min' and f'{col}__min' in partiels:
+                jours[col] = partiels[f'{col}__min']
+            elif op == 'sum' and f'{col}__sum' in partiels:
+                jours[col] = partiels[f'{col}__sum']
+            elif op == 'mean' and f'{col}__sum' in partiels:
+                comptes = partiels[f'{col}__count'].replace(0, np.nan)
+                jours[col] = partiels[f'{col}__sum'] / comptes
+        jours.index = jours.index.date
+        jours.index.name = 'Date'
+        return jours.reset_index()
+
+    def update(self, chunk):
+        """Ajoute un bloc de lignes ; renvoie le DataFrame des jours terminés (éventuellement vide)."""
+        partiels = self.partials(chunk)
+        if partiels.empty:
+            return pd.DataFrame()
+        if self._dernier_emis is not None and partiels.index.min() <= self._dernier_emis:
+            raise ValueError("❌ Données non triées : un jour déjà clôturé réapparaît")
+        if self._ouvert is not None:
+            partiels = self._fusionner(self._ouvert, partiels)
+
+        dernier_jour = partiels.index.max()
+        termines = partiels[partiels.index < dernier_jour]
+        self._ouvert = partiels[partiels.index == dernier_jour]
+        if termines.empty:
+            return pd.DataFrame()
+        self._dernier_emis = termines.index.max()
+        return self.finalize(termines)
+
+    def flush(self):
+        """Clôture le jour en cours (fin de fichier)."""
+        if self._ouvert is None:
+            return pd.DataFrame()
+        termines, self._ouvert = self._ouvert, None
+        self._dernier_emis = termines.index.max()
+        return self.finalize(termines)
+
+def stream_daily_aggregates(filepath, chunksize=DEFAULT_CHUNKSIZE, sheet=0, aggregates=None):
+    """Générateur de DataFrames de jours terminés, au fil de la lecture du fichier."""
+    agregateur = DailyAggregator(aggregates)
+    for chunk in iter_chunks(filepath, chunksize=chunksize, sheet=sheet):
+        jours = agregateur.update(chunk)
+        if not jours.empty:
+            yield jours
+    jours = agregateur.flush()
+    if not jours.empty:
+        yield jours
+
+# -----------------------------------
+# 3. Classification des jours terminés
+# -----------------------------------
+
+def stream_daily_risk(filepath, chunksize=DEFAULT_CHUNKSIZE, sheet=0):
+    """Comme stream_daily_aggregates, mais avec les colonnes de risque des modèles du registre."""
+    for jours in stream_daily_aggregates(filepath, chunksize=chunksize, sheet=sheet):
+        yield evaluate_models(jours)
+
+# -----------------------------------
+# 4. Exécution directe : python ingestion.py capteurs.csv [sortie.csv]
+# -----------------------------------
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage : python ingestion.py <fichier capteurs> [sortie.csv]")
+        sys.exit(1)
+
+    sortie = sys.argv[2] if len(sys.argv) > 2 else None
+    premier = True
+    for bloc in stream_daily_risk(sys.argv[1]):
+        if sortie:
+            bloc.to_csv(sortie, mode='w' if premier else 'a', header=premier, index=False)
+        else:
+            print(bloc.to_string(index=False, header=premier))
+        premier = False
+    if sortie:
+        print(f"✅ Résultats exportés dans {sortie}")
@@ -1,56 +1,433 @@
-from flask import Flask, request, jsonify
-from tensorflow.keras.models import load_model
+from flask import Flask, request, jsonify, Response
 import numpy as np
 import io
-from PIL import Image
-from class_names import class_names  # Liste des classes
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from preprocessing import preprocess_image_fast
+from batching import MicroBatcher
+from inference import interpret_prediction
+from model_loader import ModelLoader
+from model_registry import default_registry
+from cascade import CASCADE_ENABLED, CROP_SPECIALISTS, GATE_REJECT_CLASS, CascadeStats, is_plant_image, specialist_decides
+from prediction_cache import PredictionCache, cache_key
+from risk_service import RiskService, UnknownStation, parse_readings
+from tensor_format import MEDIA_TYPE, VERSION as TENSOR_VERSION, TensorFormatError, is_tensor, tensor_to_input
+import metrics
 
 app = Flask(__name__)
 
-# Chargement du modèle
-model = load_model("models/plant_disease_model_mobilenet.h5", compile=False)
-
-def preprocess_image_from_bytes(image_bytes, target_size=(224, 224)):
-    img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-    img = img.resize(target_size)
-    img_array = np.array(img) / 255.0
-    img_array = np.expand_dims(img_array, axis=0)
-    return img_array
+# Micro-batching : taille maximale d'un lot et attente maximale (ms) avant de lancer le modèle
+BATCH_MAX_SIZE = int(os.environ.get("SMARTFARM_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("SMARTFARM_BATCH_MAX_WAIT_MS", 5))
+
+# /predict/batch : nombre maximal d'images par requête et threads de décodage
+BATCH_MAX_FILES = int(os.environ.get("SMARTFARM_BATCH_MAX_FILES", 64))
+# Archives .zip : taille décompressée maximale par image et pour toute la requête (vérifiées avant lecture)
+BATCH_MAX_FILE_BYTES = int(os.environ.get("SMARTFARM_BATCH_MAX_FILE_BYTES", 20 * 1024 * 1024))
+BATCH_MAX_TOTAL_BYTES = int(os.environ.get("SMARTFARM_BATCH_MAX_TOTAL_BYTES", 256 * 1024 * 1024))
+DECODE_WORKERS = int(os.environ.get("SMARTFARM_DECODE_WORKERS", os.cpu_count() or 4))
+
+# Cache des prédictions par empreinte des octets reçus (SMARTFARM_CACHE_DB vide = pas de niveau disque)
+CACHE_MAX_ENTRIES = int(os.environ.get("SMARTFARM_CACHE_SIZE", 4096))
+CACHE_TTL_SECONDS = float(os.environ.get("SMARTFARM_CACHE_TTL", 24 * 3600))
+CACHE_DB_PATH = os.environ.get("SMARTFARM_CACHE_DB", "")
+CACHE_DB_MAX_ENTRIES = int(os.environ.get("SMARTFARM_CACHE_DB_MAX_ENTRIES", 100_000))
+
+# Tailles de lot passées à vide au démarrage (traçage / allocation faits avant la première requête)
+WARMUP_BATCH_SIZES = [int(n) for n in os.environ.get("SMARTFARM_WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE}").split(",") if n.strip()]
+RETRY_AFTER_SECONDS = int(os.environ.get("SMARTFARM_RETRY_AFTER", 2))
+
+# Chargement du modèle en arrière-plan (Keras .h5 par défaut ; TFLite ou ONNX via SMARTFARM_BACKEND,
+# voir inference.py) : GET / et /healthz répondent tout de suite, /readyz une fois le modèle préchauffé
+loader = ModelLoader(warmup_batch_sizes=WARMUP_BATCH_SIZES).start()
+
+# Les requêtes /predict concurrentes passent par une file et partagent un seul model.predict
+batcher = MicroBatcher(
+    loader.predict,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    on_batch=metrics.observe_batch,
+).start()
+
+prediction_cache = PredictionCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_DB_PATH or None,
+                                   disk_max_entries=CACHE_DB_MAX_ENTRIES)
+
+# Modèles spécialistes par maladie (voir model_registry.py), chargés à la première requête qui les
+# demande : /predict?models=mildiw,tuta ; "main" désigne le classifieur MobileNet principal
+MAIN_MODEL = "main"
+registry = default_registry()
+
+# Risques maladies d'après les mesures capteurs (voir risk_service.py) : jours des stations mémorisés
+risk_service = RiskService()
+
+# Mode cascade (voir cascade.py) : ?cascade=1, ou par défaut si SMARTFARM_CASCADE=1
+cascade_stats = CascadeStats()
+
+# Jauges lues au moment de l'export /metrics
+metrics.register_gauge("smartfarm_model_ready", "1 si le modèle est chargé et préchauffé",
+                       lambda: int(loader.ready()))
+metrics.register_gauge("smartfarm_model_load_seconds", "Durée du chargement du modèle au démarrage",
+                       lambda: loader.load_seconds or 0.0)
+metrics.register_gauge("smartfarm_model_warmup_seconds", "Durée du préchauffage du modèle",
+                       lambda: loader.warmup_seconds or 0.0)
+metrics.register_gauge("smartfarm_startup_seconds", "Démarrage -> modèle prêt",
+                       lambda: loader.startup_seconds or 0.0)
+metrics.register_gauge("smartfarm_batch_queue_depth", "Requêtes en attente dans le micro-batcher",
+                       lambda: batcher.stats()["queue_depth"])
+metrics.register_gauge("smartfarm_cache_entries", "Entrées du cache de prédictions en mémoire",
+                       lambda: prediction_cache.stats()["entries"])
+metrics.register_gauge("smartfarm_cache_hit_ratio", "Taux de succès du cache de prédictions",
+                       lambda: prediction_cache.stats()["hit_ratio"])
+metrics.register_gauge("smartfarm_models_loaded_bytes", "Mémoire estimée des modèles spécialistes chargés",
+                       lambda: registry.stats()["loaded_bytes"])
+
+# Décodage PIL en parallèle pour /predict/batch (PIL libère le GIL pendant le décodage)
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+
+class BatchTooLarge(ValueError):
+    """Trop d'images, ou archive trop volumineuse une fois décompressée (413)."""
+
+def _fichiers_du_zip(zip_bytes, deja, octets):
+    """Membres image de l'archive ; nombre et tailles annoncées contrôlés avant toute décompression
+    (zipfile ne renvoie jamais plus que la taille annoncée d'un membre)."""
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        membres = [info for info in zf.infolist()
+                   if not (info.is_dir() or info.filename.startswith('__MACOSX/')
+                           or os.path.basename(info.filename).startswith('.'))]
+        if deja + len(membres) > BATCH_MAX_FILES:
+            raise BatchTooLarge(f'Too many files ({deja + len(membres)} > {BATCH_MAX_FILES})')
+        for info in membres:
+            if info.file_size > BATCH_MAX_FILE_BYTES:
+                raise BatchTooLarge(f'{info.filename}: {info.file_size} bytes uncompressed '
+                                    f'(> {BATCH_MAX_FILE_BYTES})')
+            octets += info.file_size
+        if octets > BATCH_MAX_TOTAL_BYTES:
+            raise BatchTooLarge(f'Archive too large uncompressed ({octets} > {BATCH_MAX_TOTAL_BYTES} bytes)')
+        return [(info.filename, zf.read(info)) for info in membres]
+
+def _collect_batch_files(files):
+    """Liste (nom, octets) des images envoyées : plusieurs parts `file` et/ou des archives .zip."""
+    items = []
+    octets = 0
+    for f in files:
+        data = f.read()
+        nom = f.filename or 'file'
+        if nom.lower().endswith('.zip') or zipfile.is_zipfile(io.BytesIO(data)):
+            membres = _fichiers_du_zip(data, len(items), octets)
+        else:
+            membres = [(nom, data)]
+        items.extend(membres)
+        octets += sum(len(d) for _, d in membres)
+        if len(items) > BATCH_MAX_FILES:
+            raise BatchTooLarge(f'Too many files ({len(items)} > {BATCH_MAX_FILES})')
+    return items
+
+def _entree_modele(img_bytes, out=None, tenseur=False):
+    """Entrée du modèle : format tenseur compact (tensor_format.py) ou fichier image à décoder.
+
+    `tenseur` : corps envoyé avec le Content-Type MEDIA_TYPE, décodé comme tenseur sans deviner
+    (un en-tête invalide donne une TensorFormatError, donc un 400, pas une erreur de décodage d'image).
+    """
+    if tenseur or is_tensor(img_bytes):
+        return tensor_to_input(img_bytes, out=out, observe=metrics.observe_stage)
+    return preprocess_image_fast(img_bytes, out=out, observe=metrics.observe_stage)
+
+def _erreur_decodage(e):
+    # Tenseur mal formé : erreur du client ; image illisible : comportement historique (500)
+    if isinstance(e, TensorFormatError):
+        metrics.ERRORS.inc('bad_request')
+        return jsonify({'error': str(e)}), 400
+    metrics.ERRORS.inc('decode')
+    app.logger.warning("Image illisible : %s", e)
+    return jsonify({'error': str(e)}), 500
+
+def _pas_pret():
+    if loader.error is not None:
+        return jsonify({'error': f'Model failed to load: {loader.error}'}), 503
+    return jsonify({'error': 'Model loading, retry later'}), 503, {'Retry-After': str(RETRY_AFTER_SECONDS)}
 
 # ✅ Route d'accueil pour éviter les erreurs GET /
 @app.route('/')
 def index():
     return "✅ API de détection des maladies de plantes est active !"
 
+# Vivacité : le processus répond (même pendant le chargement du modèle)
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'alive'})
+
+# Disponibilité : modèle chargé et préchauffé (503 pendant le chargement ou en cas d'échec)
+@app.route('/readyz')
+def readyz():
+    # input_formats : le client n'envoie le format tenseur que si le serveur l'annonce
+    statut = dict(loader.status(), input_formats=['image', f'{MEDIA_TYPE};v={TENSOR_VERSION}'])
+    return jsonify(statut), (200 if loader.ready() else 503)
+
+# Profondeur de file et tailles de lots, pour régler BATCH_MAX_SIZE / BATCH_MAX_WAIT_MS en charge
+@app.route('/stats/batching')
+def batching_stats():
+    return jsonify(batcher.stats())
+
+@app.route('/stats/cache')
+def cache_stats():
+    version = loader.model.version if loader.ready() else None
+    return jsonify(dict(prediction_cache.stats(), model_version=version))
+
+@app.route('/stats/cascade')
+def cascade_stats_endpoint():
+    return jsonify(dict(cascade_stats.stats(), enabled_by_default=CASCADE_ENABLED, crop_specialists=CROP_SPECIALISTS))
+
+@app.route('/stats/models')
+def models_stats():
+    return jsonify(dict(registry.stats(), available=[MAIN_MODEL] + registry.names()))
+
+@app.route('/stats/risk')
+def risk_stats():
+    return jsonify(risk_service.stats())
+
+# Histogrammes par étape, compteurs par classe et erreurs, au format texte Prometheus
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    if 'file' not in request.files:
+    debut = time.perf_counter()
+    model = loader.model
+    if model is None:
+        return _pas_pret()
+    # Corps brut au format tenseur, ou part multipart `file` (image, ou tenseur reconnu à son en-tête)
+    tenseur = request.mimetype == MEDIA_TYPE
+    if tenseur:
+        img_bytes = request.get_data()
+    elif 'file' in request.files:
+        img_bytes = request.files['file'].read()
+    else:
+        metrics.ERRORS.inc('no_file')
         return jsonify({'error': 'No file provided'}), 400
+    metrics.observe_stage('upload_read', time.perf_counter() - debut)
 
-    file = request.files['file']
-    img_bytes = file.read()
+    if request.args.get('models'):
+        return _predict_models(img_bytes, request.args['models'], model, tenseur)
+    if request.args.get('cascade', '1' if CASCADE_ENABLED else '0') == '1':
+        return _predict_cascade(img_bytes, request.args.get('crop'), model, debut, tenseur)
+
+    # Même photo renvoyée (nouvel essai, historique, autre appareil) : pas de décodage ni d'inférence
+    key = cache_key(img_bytes, model.version)
+    cached = prediction_cache.get(key)
+    if cached is not None:
+        return jsonify(cached)
+
+    try:
+        img_preprocessed = _entree_modele(img_bytes, tenseur=tenseur)
+    except Exception as e:
+        return _erreur_decodage(e)
 
     try:
-        img_preprocessed = preprocess_image_from_bytes(img_bytes)
-        preds = model.predict(img_preprocessed)
-        predicted_index = np.argmax(preds, axis=1)[0]
-        confidence = preds[0][predicted_index]
-        predicted_class = class_names[predicted_index]
-
-        seuil_confiance = 0.7
-        if confidence < seuil_confiance:
-            return jsonify({
-                'result': 'unknown',
-                'confidence': float(confidence)
-            })
-
-        return jsonify({
-            'result': predicted_class,
-            'confidence': float(confidence)
-        })
+        t = time.perf_counter()
+        preds = batcher.submit(img_preprocessed)
+        metrics.observe_stage('inference', time.perf_counter() - t)
+        result = interpret_prediction(preds[0])
     except Exception as e:
+        metrics.ERRORS.inc('inference')
+        app.logger.exception("Erreur d'inférence")
         return jsonify({'error': str(e)}), 500
 
+    metrics.count_prediction(result)
+    prediction_cache.put(key, result)
+    t = time.perf_counter()
+    response = jsonify(result)
+    fin = time.perf_counter()
+    metrics.observe_stage('json_encode', fin - t)
+    metrics.REQUEST_SECONDS.observe(fin - debut)
+    return response
+
+def _predict_models(img_bytes, noms, model, tenseur=False):
+    """Une image envoyée à plusieurs modèles ; un modèle en erreur n'empêche pas les autres de répondre."""
+    noms = list(dict.fromkeys(n.strip() for n in noms.split(',') if n.strip()))
+    inconnus = [n for n in noms if n != MAIN_MODEL and n not in registry]
+    if inconnus:
+        metrics.ERRORS.inc('bad_request')
+        return jsonify({'error': f'Unknown model(s): {", ".join(inconnus)}',
+                        'available': [MAIN_MODEL] + registry.names()}), 400
+
+    results = {}
+    keys = {}
+    for nom in noms:
+        version = model.version if nom == MAIN_MODEL else registry.spec(nom).version
+        keys[nom] = cache_key(img_bytes, version if nom == MAIN_MODEL else f'{nom}@{version}')
+        cached = prediction_cache.get(keys[nom])
+        if cached is not None:
+            results[nom] = cached
+
+    a_calculer = [n for n in noms if n not in results]
+    if a_calculer:
+        try:
+            x = _entree_modele(img_bytes, tenseur=tenseur)
+        except Exception as e:
+            return _erreur_decodage(e)
+
+        for nom in a_calculer:
+            try:
+                if nom == MAIN_MODEL:
+                    result = interpret_prediction(batcher.submit(x)[0])
+                    metrics.count_prediction(result)
+                else:
+                    result = registry.predict(nom, x)[0]
+            except Exception as e:
+                metrics.ERRORS.inc('inference')
+                app.logger.exception("Erreur d'inférence (%s)", nom)
+                results[nom] = {'error': str(e)}
+                continue
+            prediction_cache.put(keys[nom], result)
+            results[nom] = result
+
+    return jsonify({'results': {nom: results[nom] for nom in noms}})
+
+def _predict_cascade(img_bytes, crop, model, debut, tenseur=False):
+    """Filtre feuille/fond, puis spécialiste de la culture, puis classifieur principal ; `stage` indique la sortie."""
+    try:
+        plante, fraction = is_plant_image(img_bytes, tensor=tenseur)
+    except Exception as e:
+        return _erreur_decodage(e)
+    if not plante:
+        cascade_stats.record('gate', time.perf_counter() - debut)
+        return jsonify({'result': GATE_REJECT_CLASS, 'confidence': 1.0 - fraction, 'stage': 'gate'})
+
+    key = cache_key(img_bytes, model.version)
+    cached = prediction_cache.get(key)
+    if cached is not None:
+        return jsonify(dict(cached, stage='main'))
+
+    try:
+        x = _entree_modele(img_bytes, tenseur=tenseur)
+    except Exception as e:
+        return _erreur_decodage(e)
+
+    specialiste = CROP_SPECIALISTS.get((crop or '').lower())
+    if specialiste in registry:
+        try:
+            result = registry.predict(specialiste, x)[0]
+        except Exception:
+            app.logger.exception("Erreur du spécialiste %s, repli sur le modèle principal", specialiste)
+            result = None
+        if specialist_decides(result):
+            cascade_stats.record('specialist', time.perf_counter() - debut)
+            return jsonify(dict(result, stage='specialist', model=specialiste))
+
+    try:
+        t = time.perf_counter()
+        preds = batcher.submit(x)
+        metrics.observe_stage('inference', time.perf_counter() - t)
+        result = interpret_prediction(preds[0])
+    except Exception as e:
+        metrics.ERRORS.inc('inference')
+        app.logger.exception("Erreur d'inférence")
+        return jsonify({'error': str(e)}), 500
+
+    metrics.count_prediction(result)
+    prediction_cache.put(key, result)
+    cascade_stats.record('main', time.perf_counter() - debut)
+    return jsonify(dict(result, stage='main'))
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    model = loader.model
+    if model is None:
+        return _pas_pret()
+    files = request.files.getlist('file')
+    if not files:
+        metrics.ERRORS.inc('no_file')
+        return jsonify({'error': 'No file provided'}), 400
+
+    try:
+        items = _collect_batch_files(files)
+    except zipfile.BadZipFile as e:
+        metrics.ERRORS.inc('bad_request')
+        return jsonify({'error': f'Invalid zip archive: {e}'}), 400
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    if not items:
+        return jsonify({'error': 'No file provided'}), 400
+
+    results = [{'filename': nom} for nom, _ in items]
+    keys = [cache_key(data, model.version) for _, data in items]
+    a_calculer = []
+    for i, key in enumerate(keys):
+        cached = prediction_cache.get(key)
+        if cached is not None:
+            results[i].update(cached)
+        else:
+            a_calculer.append(i)
+
+    # Décodage + prétraitement en parallèle, chaque image écrite directement dans sa ligne
+    # du lot préalloué ; une image illisible ne fait pas échouer le lot
+    lot = np.empty((len(a_calculer), 224, 224, 3), dtype=np.float32)
+
+    def _preparer(ligne):
+        try:
+            _entree_modele(items[a_calculer[ligne]][1], out=lot[ligne:ligne + 1])
+            return None
+        except Exception as e:
+            metrics.ERRORS.inc('bad_request' if isinstance(e, TensorFormatError) else 'decode')
+            return str(e)
+
+    erreurs = list(decode_pool.map(_preparer, range(len(a_calculer))))
+    lignes_valides = [ligne for ligne, err in enumerate(erreurs) if err is None]
+    valides = [a_calculer[ligne] for ligne in lignes_valides]
+    for ligne, err in enumerate(erreurs):
+        if err is not None:
+            results[a_calculer[ligne]]['error'] = err
+
+    if valides:
+        if len(lignes_valides) < len(lot):
+            lot = lot[lignes_valides]
+        try:
+            preds = batcher.submit(lot)
+        except Exception as e:
+            metrics.ERRORS.inc('inference')
+            app.logger.exception("Erreur d'inférence (lot)")
+            return jsonify({'error': str(e)}), 500
+        for ligne, i in enumerate(valides):
+            result = interpret_prediction(preds[ligne])
+            metrics.count_prediction(result)
+            prediction_cache.put(keys[i], result)
+            results[i].update(result)
+
+    errors = sum('error' in r for r in results)
+    return jsonify({'results': results, 'count': len(results), 'errors': errors})
+
+def _modeles_risque():
+    noms = request.args.get('models')
+    return [n.strip() for n in noms.split(',') if n.strip()] if noms else None
+
+@app.route('/risk', methods=['POST'])
+def risk():
+    """Mesures capteurs (JSON, CSV ou part `file`) -> risques par jour (calcul complet, rien n'est mémorisé)."""
+    try:
+        if 'file' in request.files:
+            f = request.files['file']
+            df = parse_readings(f.read(), f.content_type, f.filename)
+        else:
+            df = parse_readings(request.get_data(), request.content_type)
+        return jsonify(risk_service.assess(df, _modeles_risque()))
+    except ValueError as e:
+        metrics.ERRORS.inc('bad_request')
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/risk/<station>', methods=['GET'])
+def risk_station(station):
+    """Risques par jour d'après le fichier capteur de la station (SMARTFARM_STATIONS_DIR), jours mémorisés."""
+    try:
+        return jsonify(risk_service.assess_station(station, _modeles_risque()))
+    except UnknownStation:
+        return jsonify({'error': f'Unknown station: {station}'}), 404
+    except ValueError as e:
+        metrics.ERRORS.inc('bad_request')
+        return jsonify({'error': str(e)}), 400
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5050)
 
@@ -0,0 +1,163 @@
+# Variante asynchrone (ASGI) de main.py : même contrat pour / et /predict.
+#   uvicorn main_async:app --host 0.0.0.0 --port 5050
+#   (ou python main_async.py)
+#
+# Les envois lents (3G) sont reçus sur la boucle asyncio sans bloquer de thread ;
+# seuls le décodage et l'inférence passent par un pool de threads borné.
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from batching import MicroBatcher
+from inference import interpret_prediction
+from model_loader import ModelLoader
+from prediction_cache import PredictionCache, cache_key
+from preprocessing import preprocess_image_fast
+from tensor_format import MEDIA_TYPE, VERSION as TENSOR_VERSION, TensorFormatError, is_tensor, tensor_to_input
+
+BATCH_MAX_SIZE = int(os.environ.get("SMARTFARM_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("SMARTFARM_BATCH_MAX_WAIT_MS", 5))
+
+# Pool d'inférence : nombre de threads et nombre maximal de requêtes en attente (au-delà : 503).
+# Un thread du pool attend son lot dans le micro-batcher : il en faut au moins BATCH_MAX_SIZE
+# pour que les lots puissent se remplir.
+INFERENCE_WORKERS = int(os.environ.get("SMARTFARM_INFERENCE_WORKERS", max(os.cpu_count() or 4, BATCH_MAX_SIZE)))
+MAX_PENDING = int(os.environ.get("SMARTFARM_MAX_PENDING", 64))
+RETRY_AFTER_SECONDS = int(os.environ.get("SMARTFARM_RETRY_AFTER", 2))
+
+# Délais par requête : réception de l'envoi, puis décodage + inférence
+UPLOAD_TIMEOUT = float(os.environ.get("SMARTFARM_UPLOAD_TIMEOUT", 60))
+INFERENCE_TIMEOUT = float(os.environ.get("SMARTFARM_INFERENCE_TIMEOUT", 10))
+
+CACHE_MAX_ENTRIES = int(os.environ.get("SMARTFARM_CACHE_SIZE", 4096))
+CACHE_TTL_SECONDS = float(os.environ.get("SMARTFARM_CACHE_TTL", 24 * 3600))
+CACHE_DB_PATH = os.environ.get("SMARTFARM_CACHE_DB", "")
+CACHE_DB_MAX_ENTRIES = int(os.environ.get("SMARTFARM_CACHE_DB_MAX_ENTRIES", 100_000))
+
+WARMUP_BATCH_SIZES = [int(n) for n in os.environ.get("SMARTFARM_WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE}").split(",") if n.strip()]
+
+# Modèle chargé et préchauffé en arrière-plan (voir model_loader.py) : /healthz répond immédiatement
+loader = ModelLoader(warmup_batch_sizes=WARMUP_BATCH_SIZES).start()
+batcher = MicroBatcher(loader.predict, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS).start()
+prediction_cache = PredictionCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_DB_PATH or None,
+                                   disk_max_entries=CACHE_DB_MAX_ENTRIES)
+executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+
+# Requêtes acceptées dont le travail dans le pool n'est pas terminé (modifié uniquement sur la boucle)
+_en_attente = 0
+
+def _busy():
+    return JSONResponse(
+        {'error': 'Server busy, retry later'},
+        status_code=503,
+        headers={'Retry-After': str(RETRY_AFTER_SECONDS)},
+    )
+
+def _predire(img_bytes, tenseur=False):
+    # Content-Type MEDIA_TYPE : décodé comme tenseur sans deviner (en-tête invalide -> 400)
+    if tenseur or is_tensor(img_bytes):
+        img_preprocessed = tensor_to_input(img_bytes)
+    else:
+        img_preprocessed = preprocess_image_fast(img_bytes)
+    preds = batcher.submit(img_preprocessed)
+    return interpret_prediction(preds[0])
+
+def _pas_pret():
+    if loader.error is not None:
+        return JSONResponse({'error': f'Model failed to load: {loader.error}'}, status_code=503)
+    return JSONResponse(
+        {'error': 'Model loading, retry later'},
+        status_code=503,
+        headers={'Retry-After': str(RETRY_AFTER_SECONDS)},
+    )
+
+async def index(request):
+    return PlainTextResponse("✅ API de détection des maladies de plantes est active !")
+
+async def healthz(request):
+    return JSONResponse({'status': 'alive'})
+
+async def readyz(request):
+    statut = dict(loader.status(), input_formats=['image', f'{MEDIA_TYPE};v={TENSOR_VERSION}'])
+    return JSONResponse(statut, status_code=200 if loader.ready() else 503)
+
+async def predict(request):
+    global _en_attente
+
+    model = loader.model
+    if model is None:
+        return _pas_pret()
+
+    # Rejet immédiat si la file est pleine, avant même de recevoir l'image
+    if _en_attente >= MAX_PENDING:
+        return _busy()
+
+    try:
+        tenseur = request.headers.get('content-type', '').split(';')[0].strip() == MEDIA_TYPE
+        if tenseur:
+            img_bytes = await asyncio.wait_for(request.body(), UPLOAD_TIMEOUT)
+        else:
+            form = await asyncio.wait_for(request.form(), UPLOAD_TIMEOUT)
+            if 'file' not in form or isinstance(form['file'], str):
+                return JSONResponse({'error': 'No file provided'}, status_code=400)
+            img_bytes = await asyncio.wait_for(form['file'].read(), UPLOAD_TIMEOUT)
+    except asyncio.TimeoutError:
+        return JSONResponse({'error': 'Upload timed out'}, status_code=408)
+
+    key = cache_key(img_bytes, model.version)
+    cached = prediction_cache.get(key)
+    if cached is not None:
+        return JSONResponse(cached)
+
+    # La file a pu se remplir pendant la réception
+    if _en_attente >= MAX_PENDING:
+        return _busy()
+
+    loop = asyncio.get_running_loop()
+    _en_attente += 1
+    future = loop.run_in_executor(executor, _predire, img_bytes, tenseur)
+
+    def _liberer(_):
+        global _en_attente
+        _en_attente -= 1
+
+    # La place n'est libérée qu'à la fin réelle du travail, même après un délai dépassé
+    future.add_done_callback(_liberer)
+    try:
+        result = await asyncio.wait_for(asyncio.shield(future), INFERENCE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return JSONResponse({'error': 'Prediction timed out'}, status_code=504)
+    except TensorFormatError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+    prediction_cache.put(key, result)
+    return JSONResponse(result)
+
+async def async_stats(request):
+    return JSONResponse({
+        'pending': _en_attente,
+        'max_pending': MAX_PENDING,
+        'inference_workers': INFERENCE_WORKERS,
+        'model': loader.status(),
+        'batching': batcher.stats(),
+        'cache': prediction_cache.stats(),
+    })
+
+app = Starlette(routes=[
+    Route('/', index),
+    Route('/healthz', healthz),
+    Route('/readyz', readyz),
+    Route('/predict', predict, methods=['POST']),
+    Route('/stats/async', async_stats),
+])
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5050)
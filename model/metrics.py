@@ -0,0 +1,146 @@
+# Instrumentation du chemin /predict, exposée au format texte Prometheus sur /metrics.
+#
+# Tout est préalloué au chargement du module : observer une valeur ne fait qu'une
+# recherche dichotomique et trois incréments sous verrou, sans allocation par requête.
+
+import bisect
+import threading
+
+from class_names import class_names
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# Étapes mesurées d'une requête /predict
+STAGES = ("upload_read", "decode", "resize", "normalize", "inference", "json_encode")
+
+def _echapper(valeur):
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt(nombre):
+    return repr(float(nombre)) if isinstance(nombre, float) else str(nombre)
+
+# -----------------------------------
+# 1. Types de métriques
+# -----------------------------------
+
+class HistogramFamily:
+    """Histogrammes à seaux fixes, un par valeur d'étiquette (ou un seul sans étiquette)."""
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, label=None, values=("",)):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = {v: [[0] * (len(self.buckets) + 1), 0.0, 0] for v in values}
+        self._verrou = threading.Lock()
+
+    def observe(self, value, label_value=""):
+        serie = self._series[label_value]
+        i = bisect.bisect_left(self.buckets, value)
+        with self._verrou:
+            serie[0][i] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def render(self, lignes):
+        lignes.append(f"# HELP {self.name} {self.help}")
+        lignes.append(f"# TYPE {self.name} histogram")
+        with self._verrou:
+            copie = [(v, list(s[0]), s[1], s[2]) for v, s in self._series.items()]
+        for valeur, comptes, somme, total in copie:
+            prefixe = f'{self.label}="{_echapper(valeur)}",' if self.label else ""
+            cumul = 0
+            for borne, n in zip(self.buckets, comptes):
+                cumul += n
+                lignes.append(f'{self.name}_bucket{{{prefixe}le="{_fmt(borne)}"}} {cumul}')
+            lignes.append(f'{self.name}_bucket{{{prefixe}le="+Inf"}} {total}')
+            etiquettes = f"{{{prefixe.rstrip(',')}}}" if self.label else ""
+            lignes.append(f"{self.name}_sum{etiquettes} {_fmt(somme)}")
+            lignes.append(f"{self.name}_count{etiquettes} {total}")
+
+
+class CounterFamily:
+    def __init__(self, name, help, label=None, values=("",)):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._valeurs = dict.fromkeys(values, 0)
+        self._verrou = threading.Lock()
+
+    def inc(self, label_value="", n=1):
+        with self._verrou:
+            self._valeurs[label_value] += n
+
+    def render(self, lignes):
+        lignes.append(f"# HELP {self.name} {self.help}")
+        lignes.append(f"# TYPE {self.name} counter")
+        with self._verrou:
+            copie = list(self._valeurs.items())
+        for valeur, n in copie:
+            etiquettes = f'{{{self.label}="{_echapper(valeur)}"}}' if self.label else ""
+            lignes.append(f"{self.name}{etiquettes} {n}")
+
+
+class Gauge:
+    """Valeur fixée par set(), ou lue à chaque export via `fonction`."""
+
+    def __init__(self, name, help, fonction=None):
+        self.name = name
+        self.help = help
+        self.fonction = fonction
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, lignes):
+        valeur = self.fonction() if self.fonction is not None else self.value
+        lignes.append(f"# HELP {self.name} {self.help}")
+        lignes.append(f"# TYPE {self.name} gauge")
+        lignes.append(f"{self.name} {_fmt(valeur)}")
+
+# -----------------------------------
+# 2. Métriques de l'API
+# -----------------------------------
+
+STAGE_SECONDS = HistogramFamily(
+    "smartfarm_predict_stage_seconds", "Durée de chaque étape de /predict", label="stage", values=STAGES)
+REQUEST_SECONDS = HistogramFamily(
+    "smartfarm_predict_request_seconds", "Durée totale d'une requête /predict")
+BATCH_SECONDS = HistogramFamily(
+    "smartfarm_model_batch_seconds", "Durée d'un appel au modèle (un lot)")
+BATCH_SIZE = HistogramFamily(
+    "smartfarm_model_batch_size", "Nombre d'images par appel au modèle", buckets=BATCH_SIZE_BUCKETS)
+PREDICTIONS = CounterFamily(
+    "smartfarm_predictions_total", "Prédictions au-dessus du seuil, par classe", label="class", values=class_names)
+UNKNOWN = CounterFamily(
+    "smartfarm_unknown_predictions_total", "Prédictions sous le seuil de confiance (résultat 'unknown')")
+ERRORS = CounterFamily(
+    "smartfarm_errors_total", "Requêtes en erreur, par type", label="kind",
+    values=("no_file", "bad_request", "decode", "inference"))
+
+# Les jauges liées à l'état du serveur (chargement du modèle, file, cache) sont ajoutées par main.py
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, BATCH_SECONDS, BATCH_SIZE, PREDICTIONS, UNKNOWN, ERRORS]
+
+def register_gauge(name, help, fonction):
+    REGISTRY.append(Gauge(name, help, fonction))
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+
+def observe_batch(size, seconds):
+    BATCH_SIZE.observe(size)
+    BATCH_SECONDS.observe(seconds)
+
+def count_prediction(result):
+    if result['result'] == 'unknown':
+        UNKNOWN.inc()
+    else:
+        PREDICTIONS.inc(result['result'])
+
+def render():
+    lignes = []
+    for metrique in REGISTRY:
+        metrique.render(lignes)
+    return "\n".join(lignes) + "\n"
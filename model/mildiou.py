@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import numpy as np
 import pandas as pd
 
 # === 1. Calcul de l'IPI ===
@@ -26,6 +27,28 @@ def interpret_ipi(ipi):
     else:
         return ("100%", "Très élevé")
 
+# === 2b. Versions vectorisées (colonnes entières, sans apply ligne par ligne) ===
+IPI_SEUILS = [50, 100, 150]
+IPI_RISQUES = np.array(["25%", "50%", "75%", "100%"], dtype=object)
+IPI_INTERPRETATIONS = np.array(["Faible", "Modéré", "Élevé", "Très élevé"], dtype=object)
+
+def calculate_ipi_vec(tavg, tmin, rh_avg, rain_48h):
+    tavg, tmin = np.asarray(tavg, dtype=float), np.asarray(tmin, dtype=float)
+    rh_avg, rain_48h = np.asarray(rh_avg, dtype=float), np.asarray(rain_48h, dtype=float)
+    valide = ~(np.isnan(tavg) | np.isnan(tmin) | np.isnan(rh_avg) | np.isnan(rain_48h))
+    valide &= ~((tmin <= 7) | (tavg < 9) | (tavg > 25))
+    valide &= ~((rain_48h <= 0.2) & (rh_avg <= 80))
+    # NaN joue le rôle du None de calculate_ipi
+    return np.where(valide, tavg + tmin + rh_avg + rain_48h, np.nan)
+
+def interpret_ipi_vec(ipi):
+    ipi = np.asarray(ipi, dtype=float)
+    niveau = np.digitize(np.nan_to_num(ipi, nan=0.0), IPI_SEUILS)
+    absent = np.isnan(ipi)
+    risque = np.where(absent, "0%", IPI_RISQUES[niveau])
+    interpretation = np.where(absent, "Aucun risque", IPI_INTERPRETATIONS[niveau])
+    return risque, interpretation
+
 # === 3. Modèle principal ===
 def run_ipi_model(filepath, sheet=0):
     df = pd.read_excel(filepath, sheet_name=sheet)
@@ -47,14 +70,12 @@ def run_ipi_model(filepath, sheet=0):
     }).reset_index()
 
     # Calcul IPI
-    grouped['IPI'] = grouped.apply(lambda row: calculate_ipi(
-        row['Temperature_Avg'], row['Temperature_Min'], row['RH_Avg'], row['Rainfall']
-    ), axis=1)
+    grouped['IPI'] = calculate_ipi_vec(
+        grouped['Temperature_Avg'], grouped['Temperature_Min'], grouped['RH_Avg'], grouped['Rainfall']
+    )
 
     # Interprétation du risque
-    grouped[['Risque (%)', 'Interprétation']] = grouped['IPI'].apply(
-        lambda x: pd.Series(interpret_ipi(x))
-    )
+    grouped['Risque (%)'], grouped['Interprétation'] = interpret_ipi_vec(grouped['IPI'])
 
     return grouped
 
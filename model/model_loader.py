@@ -0,0 +1,90 @@
+import time
+import threading
+import numpy as np
+
+from inference import load_backend
+
+
+class ModelLoader:
+    """Charge le backend d'inférence dans un thread d'arrière-plan, puis le préchauffe.
+
+    L'API répond tout de suite (vivacité) ; `ready()` ne devient vrai qu'une fois
+    le modèle chargé et un lot factice passé à chaque taille de `warmup_batch_sizes`,
+    pour que la première vraie requête ne paie ni l'import de TensorFlow ni le traçage.
+    """
+
+    def __init__(self, backend=None, model_path=None, num_threads=None, warmup_batch_sizes=(1,),
+                 input_shape=(224, 224, 3)):
+        self.backend = backend
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.warmup_batch_sizes = tuple(sorted(set(warmup_batch_sizes)))
+        self.input_shape = tuple(input_shape)
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        # Création du chargeur -> modèle prêt (chargement + préchauffage + attente éventuelle du thread)
+        self.startup_seconds = None
+        self._termine = threading.Event()
+        self._thread = None
+        self._debut = time.perf_counter()
+
+    # === Démarrage ===
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._charger, name="model-loader", daemon=True)
+            self._thread.start()
+        return self
+
+    def _charger(self):
+        try:
+            debut = time.perf_counter()
+            model = load_backend(self.backend, self.model_path, self.num_threads, self.warmup_batch_sizes)
+            self.load_seconds = time.perf_counter() - debut
+
+            debut = time.perf_counter()
+            for taille in self.warmup_batch_sizes:
+                model.predict(np.zeros((taille,) + self.input_shape, dtype=np.float32))
+            self.warmup_seconds = time.perf_counter() - debut
+
+            self.startup_seconds = time.perf_counter() - self._debut
+            self.model = model
+            print(f"📦 Modèle {model.name} chargé en {self.load_seconds:.2f} s, préchauffé en "
+                  f"{self.warmup_seconds:.2f} s (lots {', '.join(map(str, self.warmup_batch_sizes))}) ; "
+                  f"prêt {self.startup_seconds:.2f} s après le démarrage")
+        except Exception as e:
+            self.error = e
+            print(f"❌ Erreur de chargement du modèle : {e}")
+        finally:
+            self._termine.set()
+
+    # === Côté appelant ===
+    def ready(self):
+        return self.model is not None
+
+    def wait(self, timeout=None):
+        """Attend la fin du chargement et renvoie le modèle (lève l'erreur de chargement s'il y en a eu une)."""
+        if self._thread is None:
+            self.start()
+        if not self._termine.wait(timeout):
+            raise TimeoutError("Délai dépassé en attendant le chargement du modèle")
+        if self.error is not None:
+            raise self.error
+        return self.model
+
+    def predict(self, x):
+        return self.wait().predict(x)
+
+    def status(self):
+        etat = "ready" if self.ready() else ("failed" if self.error is not None else "loading")
+        return {
+            "status": etat,
+            "error": str(self.error) if self.error is not None else None,
+            "backend": self.model.name if self.model is not None else self.backend,
+            "model_version": self.model.version if self.model is not None else None,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "warmup_batch_sizes": list(self.warmup_batch_sizes),
+            "startup_seconds": self.startup_seconds,
+        }
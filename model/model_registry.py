@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Registre des modèles spécialistes (un modèle par maladie, voir test_model_ia.py), servis à côté
+# du classifieur MobileNet principal.
+#
+# - chaque modèle est identifié par (nom, version) ; la version est l'empreinte du fichier ;
+# - un modèle n'est chargé qu'à sa première utilisation, puis reste en mémoire ;
+# - au-delà du budget mémoire, les modèles les moins récemment utilisés sont déchargés.
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from inference import load_backend, model_version, interpret_prediction
+
+# === Configuration (variables d'environnement) ===
+# SMARTFARM_MODELS_DIR       : dossier des modèles spécialistes
+# SMARTFARM_MODELS_MEMORY_MB : budget mémoire des modèles spécialistes chargés
+# SMARTFARM_EXTRA_MODELS     : modèles supplémentaires, "nom=chemin,nom2=chemin2"
+MODELS_DIR = os.environ.get("SMARTFARM_MODELS_DIR", "models")
+MEMORY_BUDGET_MB = float(os.environ.get("SMARTFARM_MODELS_MEMORY_MB", 1024))
+
+# Modèles .h5 de test_model_ia.py (les dossiers SavedModel ne sont pas lisibles par Keras 3)
+SPECIALIST_MODELS = {
+    "mildiw": "mildiw/mildiw.h5",
+    "mited": "mited/tomato-disease-detection-model.h5",
+    "alternaria": "alternaria mite/alternaeia.h5",
+    "bacterial": "bacterial floudering/bacterial floudering.h5",
+    "blossom_end_rot": "bloss end rot/blossom end rot.h5",
+    "excesnit": "exces nitrogen/exces nitrogen.h5",
+}
+
+# Classes de sortie des modèles spécialistes
+SPECIALIST_CLASS_NAMES = [
+    "Mildiou", "oidium", "alternariose", "sunburn",
+    "helicoverpa", "fruit_saine", "feuil_saine", "excesnit",
+    "blossom_end_rot", "tuta", "bacterial", "mited",
+    "virosis", "black mold"
+]
+
+
+class ModelSpec:
+    """Description d'un modèle enregistré ; la version (empreinte du fichier) est calculée à la demande."""
+
+    def __init__(self, name, path, backend=None, labels=None, version=None):
+        self.name = name
+        self.path = path
+        self.backend = backend or _backend_du_fichier(path)
+        self.labels = labels
+        self._version = version
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = model_version(self.path)
+        return self._version
+
+    def memory_bytes(self):
+        """Estimation de l'empreinte mémoire une fois chargé : taille des poids sur disque."""
+        if os.path.isdir(self.path):
+            return sum(os.path.getsize(os.path.join(d, f)) for d, _, fichiers in os.walk(self.path) for f in fichiers)
+        return os.path.getsize(self.path)
+
+
+def _backend_du_fichier(path):
+    extension = os.path.splitext(path)[1].lower()
+    return {".tflite": "tflite", ".onnx": "onnx"}.get(extension, "keras")
+
+
+def interpret_output(probs, labels=None):
+    """Résultat d'un modèle spécialiste : sortie sigmoïde (1 valeur) ou softmax (N classes)."""
+    probs = np.asarray(probs).ravel()
+    if probs.shape[0] == 1:
+        p = float(probs[0])
+        return {'result': 'positive' if p >= 0.5 else 'negative', 'confidence': max(p, 1.0 - p)}
+    if labels is None or len(labels) != probs.shape[0]:
+        labels = [str(i) for i in range(probs.shape[0])]
+    return interpret_prediction(probs, labels)
+
+
+class ModelRegistry:
+    """Modèles chargés à la demande, gardés en mémoire jusqu'à `memory_budget_bytes` (LRU)."""
+
+    def __init__(self, memory_budget_bytes=MEMORY_BUDGET_MB * 1024 * 1024, num_threads=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.num_threads = num_threads
+        self._specs = {}                 # nom -> [ModelSpec], la dernière version enregistrée en dernier
+        self._charges = OrderedDict()    # (nom, version) -> (backend, octets), du moins au plus récent
+        self._chargements = {}           # (nom, version) -> verrou de chargement
+        self._verrou = threading.Lock()
+
+        # Statistiques (protégées par _verrou)
+        self._hits = 0
+        self._loads = 0
+        self._evictions = 0
+
+    # === Enregistrement ===
+    def register(self, name, path, backend=None, labels=None, version=None):
+        spec = ModelSpec(name, path, backend, labels, version)
+        with self._verrou:
+            self._specs.setdefault(name, []).append(spec)
+        return spec
+
+    def __contains__(self, name):
+        return name in self._specs
+
+    def names(self):
+        return sorted(self._specs)
+
+    def spec(self, name, version=None):
+        """Spec d'un modèle (dernière version enregistrée par défaut) ; KeyError si inconnu."""
+        specs = self._specs[name]
+        if version is None:
+            return specs[-1]
+        for spec in specs:
+            if spec.version == version:
+                return spec
+        raise KeyError(f"{name}@{version}")
+
+    # === Chargement / éviction ===
+    def get(self, name, version=None):
+        spec = self.spec(name, version)
+        cle = (name, spec.version)
+        with self._verrou:
+            if cle in self._charges:
+                self._charges.move_to_end(cle)
+                self._hits += 1
+                return self._charges[cle][0]
+            verrou = self._chargements.setdefault(cle, threading.Lock())
+
+        # Un seul chargement par modèle, sans bloquer les modèles déjà en mémoire
+        with verrou:
+            with self._verrou:
+                if cle in self._charges:
+                    self._charges.move_to_end(cle)
+                    self._hits += 1
+                    return self._charges[cle][0]
+            backend = load_backend(spec.backend, spec.path, self.num_threads)
+            octets = spec.memory_bytes()
+            with self._verrou:
+                self._liberer(octets)
+                self._charges[cle] = (backend, octets)
+                self._loads += 1
+        return backend
+
+    def _liberer(self, octets):
+        # Appelé sous _verrou : décharge les moins récemment utilisés jusqu'à faire de la place
+        occupe = sum(o for _, o in self._charges.values())
+        while self._charges and occupe + octets > self.memory_budget_bytes:
+            _, (_, o) = self._charges.popitem(last=False)
+            occupe -= o
+            self._evictions += 1
+
+    def predict(self, name, x, version=None):
+        """Prédiction d'un modèle spécialiste sur un lot (N, 224, 224, 3) -> liste de résultats."""
+        spec = self.spec(name, version)
+        preds = np.asarray(self.get(name, version).predict(x))
+        return [interpret_output(ligne, spec.labels) for ligne in preds]
+
+    # === Métriques ===
+    def stats(self):
+        with self._verrou:
+            return {
+                "registered": {nom: [s.path for s in specs] for nom, specs in sorted(self._specs.items())},
+                "loaded": [f"{nom}@{version}" for nom, version in self._charges],
+                "loaded_bytes": sum(o for _, o in self._charges.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "hits": self._hits,
+                "loads": self._loads,
+                "evictions": self._evictions,
+            }
+
+
+def default_registry(models_dir=MODELS_DIR, extra=None, memory_budget_bytes=MEMORY_BUDGET_MB * 1024 * 1024):
+    """Registre des modèles spécialistes présents sur le disque (+ SMARTFARM_EXTRA_MODELS)."""
+    registry = ModelRegistry(memory_budget_bytes)
+    for nom, relatif in SPECIALIST_MODELS.items():
+        chemin = os.path.join(models_dir, relatif)
+        if os.path.exists(chemin):
+            registry.register(nom, chemin, labels=SPECIALIST_CLASS_NAMES)
+
+    extra = os.environ.get("SMARTFARM_EXTRA_MODELS", "") if extra is None else extra
+    for paire in filter(None, (p.strip() for p in extra.split(","))):
+        nom, chemin = paire.split("=", 1)
+        registry.register(nom.strip(), chemin.strip(), labels=SPECIALIST_CLASS_NAMES)
+    return registry
@@ -39,6 +39,16 @@ def calculate_daily_variables(T, RH, LW):
 
     return list(zip(tavg, RHavg, LWsum))
 
+# Version vectorisée : on découpe la série en jours complets de 24 valeurs
+# (reshape) puis on agrège sur l'axe des heures, sans boucle Python.
+def calculate_daily_variables_vec(T, RH, LW):
+    days = len(T) // 24
+    n = days * 24
+    T = np.asarray(T, dtype=float)[:n].reshape(days, 24)
+    RH = np.asarray(RH, dtype=float)[:n].reshape(days, 24)
+    LW = np.asarray(LW, dtype=float)[:n].reshape(days, 24)
+    return T.mean(axis=1), RH.mean(axis=1), LW.sum(axis=1)
+
 # -----------------------------------
 # 3. Classification du risque journalier
 # -----------------------------------
@@ -62,14 +72,26 @@ def classify_day_risk(daily_vars):
 
     return risk_percent
 
+# Même table de décision que classify_day_risk, évaluée en une fois avec np.select
+def classify_day_risk_vec(tavg, RHavg, LWsum):
+    tavg, RHavg, LWsum = np.asarray(tavg), np.asarray(RHavg), np.asarray(LWsum)
+    conditions = [
+        (tavg < 10) | (tavg > 35),
+        RHavg < 70,
+        LWsum < 4,
+        LWsum <= 8,
+        LWsum <= 12,
+    ]
+    return np.select(conditions, [0, 0, 10, 40, 70], default=100)
+
 # -----------------------------------
 # 4. Fonction principale d'exécution
 # -----------------------------------
 
 def run_oidium_model(filepath):
     T, RH, LW = read_excel_data(filepath)
-    variables = calculate_daily_variables(T, RH, LW)
-    risk_percent = classify_day_risk(variables)
+    tavg, RHavg, LWsum = calculate_daily_variables_vec(T, RH, LW)
+    risk_percent = classify_day_risk_vec(tavg, RHavg, LWsum)
 
     result = pd.DataFrame({
         "Date": pd.date_range(start='2024-01-01', periods=len(risk_percent)),
@@ -0,0 +1,166 @@
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(image_bytes, model_version):
+    """Clé = SHA-256 des octets reçus, préfixée par la version du modèle."""
+    h = hashlib.sha256()
+    h.update(str(model_version).encode("utf-8"))
+    h.update(b"\0")
+    h.update(image_bytes)
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """Cache des prédictions : LRU en mémoire (taille + TTL) et niveau disque SQLite optionnel.
+
+    Les valeurs sont des dictionnaires JSON ({result, confidence}). Le niveau
+    disque survit aux redémarrages ; une entrée trouvée sur disque est remontée
+    dans le LRU. Les écritures disque sont regroupées (toutes les `disk_batch`
+    entrées ou `disk_flush_seconds`) hors du verrou du LRU, et le disque est borné
+    à `disk_max_entries` lignes (expirées puis plus anciennes supprimées).
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600.0, disk_path=None,
+                 disk_max_entries=100_000, disk_batch=64, disk_flush_seconds=1.0, purge_every=1024):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self.disk_batch = disk_batch
+        self.disk_flush_seconds = disk_flush_seconds
+        self.purge_every = purge_every
+        self._lru = OrderedDict()  # clé -> (expiration, valeur)
+        self._verrou = threading.Lock()
+        # Connexion SQLite et écritures en attente : verrou séparé, les lectures du LRU n'attendent pas le disque
+        self._verrou_db = threading.Lock()
+        self._a_ecrire = []
+        self._dernier_ecrit = time.monotonic()
+        self._depuis_purge = 0
+        self._db = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS predictions_expires ON predictions (expires)")
+            self._db.commit()
+            self.purge_expired()
+            atexit.register(self.flush)
+
+    def get(self, key):
+        maintenant = time.time()
+        with self._verrou:
+            entree = self._lru.get(key)
+            if entree is not None:
+                expiration, valeur = entree
+                if expiration > maintenant:
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    return valeur
+                del self._lru[key]
+            if self._db is None:
+                self.misses += 1
+                return None
+
+        with self._verrou_db:
+            ligne = self._db.execute(
+                "SELECT value, expires FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+        with self._verrou:
+            if ligne is not None and ligne[1] > maintenant:
+                valeur = json.loads(ligne[0])
+                self._inserer(key, ligne[1], valeur)
+                self.disk_hits += 1
+                return valeur
+            self.misses += 1
+            return None
+
+    def put(self, key, valeur):
+        expiration = time.time() + self.ttl
+        with self._verrou:
+            self._inserer(key, expiration, valeur)
+        if self._db is None:
+            return
+        with self._verrou_db:
+            self._a_ecrire.append((key, json.dumps(valeur), expiration))
+            if (len(self._a_ecrire) < self.disk_batch
+                    and time.monotonic() - self._dernier_ecrit < self.disk_flush_seconds):
+                return
+            self._ecrire()
+
+    def _inserer(self, key, expiration, valeur):
+        self._lru[key] = (expiration, valeur)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def _ecrire(self):
+        # Appelé avec _verrou_db : une transaction pour toutes les entrées en attente
+        if self._a_ecrire:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO predictions (key, value, expires) VALUES (?, ?, ?)", self._a_ecrire
+            )
+            self._db.commit()
+            self._depuis_purge += len(self._a_ecrire)
+            self._a_ecrire = []
+        self._dernier_ecrit = time.monotonic()
+        if self._depuis_purge >= self.purge_every:
+            self._purger()
+
+    def _purger(self):
+        self._db.execute("DELETE FROM predictions WHERE expires <= ?", (time.time(),))
+        (lignes,) = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()
+        if lignes > self.disk_max_entries:
+            # Les entrées qui expirent le plus tôt sont les plus anciennes (TTL fixe)
+            self._db.execute(
+                "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY expires LIMIT ?)",
+                (lignes - self.disk_max_entries,),
+            )
+            self.disk_evictions += lignes - self.disk_max_entries
+        self._db.commit()
+        self._depuis_purge = 0
+
+    def flush(self):
+        """Écrit sur disque les entrées en attente."""
+        if self._db is not None:
+            with self._verrou_db:
+                self._ecrire()
+
+    def purge_expired(self):
+        """Supprime les entrées expirées du disque et le ramène à `disk_max_entries` lignes."""
+        if self._db is not None:
+            with self._verrou_db:
+                self._ecrire()
+                self._purger()
+
+    def stats(self):
+        with self._verrou:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "disk_pending": len(self._a_ecrire),
+                "hit_ratio": ((self.hits + self.disk_hits) / total) if total else 0.0,
+                "disk_tier": self._db is not None,
+            }
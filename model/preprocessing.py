@@ -0,0 +1,52 @@
+import io
+import time
+import numpy as np
+from PIL import Image, ImageOps
+
+def preprocess_image_from_bytes(image_bytes, target_size=(224, 224)):
+    img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    img = img.resize(target_size)
+    img_array = np.array(img) / 255.0
+    img_array = np.expand_dims(img_array, axis=0)
+    return img_array
+
+def decode_image_fast(image_bytes, target_size=(224, 224), observe=None):
+    """Décodage + redimensionnement de preprocess_image_fast, sans normalisation : uint8 (H, W, 3)."""
+    if observe is not None:
+        t0 = time.perf_counter()
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft('RGB', target_size)
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if observe is not None:
+        t1 = time.perf_counter()
+        observe('decode', t1 - t0)
+    if img.size != target_size:
+        img = img.resize(target_size, Image.BICUBIC)
+    if observe is not None:
+        observe('resize', time.perf_counter() - t1)
+    return np.asarray(img, dtype=np.uint8)
+
+def preprocess_image_fast(image_bytes, target_size=(224, 224), out=None, observe=None):
+    """Version rapide de preprocess_image_from_bytes pour les photos de téléphone.
+
+    - JPEG : décodage réduit dans le domaine DCT (Image.draft, 1/2 à 1/8) au plus
+      près de `target_size`, au lieu de décoder les 12-50 MP ;
+    - orientation EXIF appliquée (photos prises en portrait) ;
+    - écriture directe en float32 dans `out` (forme (1, H, W, 3) ou (H, W, 3),
+      par ex. une ligne d'un lot préalloué), sans copie float64 intermédiaire.
+
+    `observe(etape, secondes)`, si fourni, reçoit la durée des étapes
+    'decode', 'resize' et 'normalize' (voir metrics.py).
+    """
+    pixels = decode_image_fast(image_bytes, target_size, observe)
+    if observe is not None:
+        t2 = time.perf_counter()
+
+    if out is None:
+        out = np.empty((1, target_size[1], target_size[0], 3), dtype=np.float32)
+    np.divide(pixels, np.float32(255.0), out=out.reshape(pixels.shape))
+    if observe is not None:
+        observe('normalize', time.perf_counter() - t2)
+    return out
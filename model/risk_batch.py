@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Calcul des risques (oïdium, alternariose, mildiou) pour toutes les stations d'un coup :
+# un fichier capteur par station, traités en parallèle dans un pool de processus (risk_engine :
+# une lecture, un groupby, tous les modèles par fichier). L'identifiant de station est le nom du
+# fichier sans extension. Une station en erreur est signalée sans interrompre les autres.
+#
+#   python risk_batch.py D:/model/stations resultats.parquet [--workers 8] [--models mildiou oidium]
+#   python risk_batch.py "D:/model/stations/*.xlsx" resultats.csv
+
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from risk_engine import run_all_models
+
+EXTENSIONS = (".xlsx", ".xlsm", ".xls", ".csv", ".txt", ".parquet", ".pq")
+
+# -----------------------------------
+# 1. Fichiers des stations
+# -----------------------------------
+
+def list_station_files(source):
+    """Dossier (fichiers capteurs qu'il contient) ou motif glob -> {station: chemin}, trié par station."""
+    if os.path.isdir(source):
+        chemins = [os.path.join(source, n) for n in os.listdir(source)]
+    else:
+        chemins = glob.glob(source)
+    fichiers = {}
+    for chemin in sorted(chemins):
+        nom = os.path.basename(chemin)
+        if not nom.lower().endswith(EXTENSIONS) or nom.startswith(("~$", ".")):
+            continue  # fichiers de verrou Excel, fichiers cachés
+        station = os.path.splitext(nom)[0]
+        if station in fichiers:
+            raise ValueError(f"❌ Station {station} présente deux fois : {fichiers[station]} et {chemin}")
+        fichiers[station] = chemin
+    return fichiers
+
+# -----------------------------------
+# 2. Traitement parallèle
+# -----------------------------------
+
+def _traiter(args):
+    """Exécuté dans un processus du pool : (station, résultats ou None, erreur ou None, secondes)."""
+    station, chemin, sheet, models = args
+    debut = time.perf_counter()
+    try:
+        resultats = run_all_models(chemin, sheet=sheet, models=models)
+        return station, resultats, None, time.perf_counter() - debut
+    except Exception as e:
+        return station, None, f"{type(e).__name__}: {e}", time.perf_counter() - debut
+
+def run_stations(fichiers, workers=None, sheet=0, models=None):
+    """Évalue chaque station ; renvoie (table consolidée avec la colonne `station`, {station: erreur})."""
+    taches = [(station, chemin, sheet, models) for station, chemin in fichiers.items()]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(taches)))
+    # Plusieurs fichiers par envoi au pool quand il y a beaucoup de petites stations
+    paquet = max(1, len(taches) // (workers * 4))
+
+    tables, erreurs = [], {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for station, resultats, erreur, secondes in pool.map(_traiter, taches, chunksize=paquet):
+            if erreur is not None:
+                erreurs[station] = erreur
+                print(f"❌ Station {station} : {erreur}")
+                continue
+            resultats.insert(0, 'station', station)
+            tables.append(resultats)
+
+    consolide = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=['station'])
+    return consolide, erreurs
+
+def write_results(resultats, sortie):
+    ext = os.path.splitext(sortie)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        resultats.to_parquet(sortie, index=False)
+    elif ext in ('.xlsx', '.xlsm'):
+        resultats.to_excel(sortie, index=False)
+    else:
+        resultats.to_csv(sortie, index=False)
+
+# -----------------------------------
+# 3. Exécution directe
+# -----------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Risques maladies pour un ensemble de stations")
+    parser.add_argument("source", help="dossier de fichiers capteurs, ou motif glob")
+    parser.add_argument("output", help="sortie consolidée .csv, .parquet ou .xlsx")
+    parser.add_argument("--workers", type=int, help="processus (défaut : nombre de cœurs)")
+    parser.add_argument("--sheet", default=0, help="feuille Excel (indice ou nom)")
+    parser.add_argument("--models", nargs="+", help="modèles à évaluer (défaut : tous ceux applicables)")
+    args = parser.parse_args()
+
+    sheet = int(args.sheet) if str(args.sheet).isdigit() else args.sheet
+    fichiers = list_station_files(args.source)
+    if not fichiers:
+        print(f"❌ Aucun fichier capteur dans {args.source}")
+        sys.exit(1)
+
+    debut = time.perf_counter()
+    resultats, erreurs = run_stations(fichiers, args.workers, sheet, args.models)
+    duree = time.perf_counter() - debut
+    write_results(resultats, args.output)
+
+    print(f"✅ {len(fichiers) - len(erreurs)}/{len(fichiers)} stations, {len(resultats)} lignes -> {args.output}")
+    print(f"⏱️ {duree:.1f} s, {len(fichiers) / duree:.1f} fichiers/s")
+    if erreurs:
+        print(f"⚠️ {len(erreurs)} station(s) en erreur : {', '.join(sorted(erreurs))}")
+    sys.exit(1 if erreurs else 0)
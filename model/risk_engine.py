@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import pandas as pd
+
+from oidium import classify_day_risk_vec
+from alternariose import dew_severity_level_vec, severity_to_percent
+from mildiou import calculate_ipi_vec, interpret_ipi_vec
+
+# -----------------------------------
+# 1. Registre des modèles de maladies
+# -----------------------------------
+
+class DiseaseModel:
+    """Un modèle de risque : les agrégats journaliers dont il a besoin et sa fonction d'évaluation."""
+
+    def __init__(self, name, aggregates, evaluate, version="1", window_days=1):
+        self.name = name
+        self.aggregates = dict(aggregates)  # colonne capteur -> 'mean' | 'min' | 'sum'
+        self.evaluate = evaluate            # DataFrame journalier -> DataFrame de colonnes de résultat
+        self.version = version
+        self.window_days = window_days      # jours de données dont dépend le résultat d'un jour (lui compris)
+
+    def accepts(self, columns):
+        return set(self.aggregates) <= set(columns)
+
+DISEASE_MODELS = {}
+
+def register_model(name, aggregates, version="1", window_days=1):
+    """Décorateur : enregistre une fonction d'évaluation journalière sous `name`."""
+    for col, op in aggregates.items():
+        if op not in ('mean', 'min', 'sum'):
+            raise ValueError(f"❌ Agrégation inconnue pour {col} : {op}")
+        for autre in DISEASE_MODELS.values():
+            if autre.name != name and autre.aggregates.get(col, op) != op:
+                raise ValueError(f"❌ {col} est déjà agrégée en '{autre.aggregates[col]}' par {autre.name}")
+
+    def decorateur(fonction):
+        DISEASE_MODELS[name] = DiseaseModel(name, aggregates, fonction, version, window_days)
+        return fonction
+    return decorateur
+
+def all_aggregates(models=None):
+    """Union des agrégats journaliers des modèles demandés (tous par défaut)."""
+    union = {}
+    for model in _select_models(models):
+        union.update(model.aggregates)
+    return union
+
+def _select_models(models=None):
+    if models is None:
+        return list(DISEASE_MODELS.values())
+    inconnus = [m for m in models if m not in DISEASE_MODELS]
+    if inconnus:
+        raise ValueError(f"❌ Modèle(s) inconnu(s) : {', '.join(inconnus)}")
+    return [DISEASE_MODELS[m] for m in models]
+
+# -----------------------------------
+# 2. Modèles intégrés
+# -----------------------------------
+
+@register_model('oidium', {'temperature': 'mean', 'RelativeHumidity': 'mean', 'LeafWetness': 'sum'})
+def _eval_oidium(jours):
+    return pd.DataFrame({
+        'Oidium Risk (%)': classify_day_risk_vec(jours['temperature'], jours['RelativeHumidity'], jours['LeafWetness'])
+    }, index=jours.index)
+
+@register_model('alternariose', {'temperature': 'mean', 'LeafWetness': 'sum'})
+def _eval_alternariose(jours):
+    niveau = pd.Series(dew_severity_level_vec(jours['temperature'], jours['LeafWetness']), index=jours.index)
+    return pd.DataFrame({'DewSeverityLevel': niveau, 'DewSeverityPercent': niveau.map(severity_to_percent)})
+
+# rain_48h de calculate_ipi reçoit la pluie du jour (comme le calcul d'origine) : pas de dépendance à la veille
+@register_model('mildiou', {'Temperature_Avg': 'mean', 'Temperature_Min': 'min', 'RH_Avg': 'mean', 'Rainfall': 'sum'})
+def _eval_mildiou(jours):
+    ipi = calculate_ipi_vec(jours['Temperature_Avg'], jours['Temperature_Min'], jours['RH_Avg'], jours['Rainfall'])
+    risque, interpretation = interpret_ipi_vec(ipi)
+    return pd.DataFrame({'IPI': ipi, 'Risque (%)': risque, 'Interprétation': interpretation}, index=jours.index)
+
+# -----------------------------------
+# 3. Lecture unique + agrégation unique
+# -----------------------------------
+
+def load_sensor_data(filepath, sheet=0):
+    """Lit le fichier capteur une seule fois (Excel, CSV ou Parquet) et convertit `datetime`."""
+    ext = os.path.splitext(str(filepath))[1].lower()
+    if ext in ('.csv', '.txt'):
+        df = pd.read_csv(filepath)
+    elif ext in ('.parquet', '.pq'):
+        df = pd.read_parquet(filepath)
+    else:
+        df = pd.read_excel(filepath, sheet_name=sheet)
+
+    df.columns = [str(col).strip() for col in df.columns]
+    if 'datetime' not in df.columns:
+        raise ValueError("❌ Colonne manquante : datetime")
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    return df
+
+def compute_daily_aggregates(df, aggregates=None):
+    """Un seul groupby par jour pour l'union des agrégats disponibles dans `df`."""
+    aggregates = all_aggregates() if aggregates is None else aggregates
+    presentes = {col: op for col, op in aggregates.items() if col in df.columns}
+    jours = df.groupby(df['datetime'].dt.date).agg(presentes)
+    jours.index.name = 'Date'
+    return jours.reset_index()
+
+def evaluate_models(jours, models=None):
+    """Évalue les modèles enregistrés sur le DataFrame journalier partagé.
+
+    Sans liste explicite, les modèles dont les colonnes manquent sont ignorés ;
+    avec une liste, une colonne manquante lève une ValueError.
+    """
+    resultats = [jours]
+    for model in _select_models(models):
+        if not model.accepts(jours.columns):
+            if models is None:
+                continue
+            manquantes = sorted(set(model.aggregates) - set(jours.columns))
+            raise ValueError(f"❌ {model.name} : colonne(s) manquante(s) : {', '.join(manquantes)}")
+        resultats.append(model.evaluate(jours))
+    return pd.concat(resultats, axis=1)
+
+def run_all_models(filepath, sheet=0, models=None):
+    """Une lecture, un groupby, tous les modèles -> une table de résultats combinée."""
+    df = load_sensor_data(filepath, sheet=sheet)
+    jours = compute_daily_aggregates(df, all_aggregates(models))
+    return evaluate_models(jours, models)
+
+# -----------------------------------
+# 4. Exécution directe : python risk_engine.py capteurs.xlsx [sortie.xlsx]
+# -----------------------------------
+
+if __name__ == "__main__":
+    fichier = sys.argv[1] if len(sys.argv) > 1 else "D:/model/test1.xlsx"
+    resultats = run_all_models(fichier)
+    print(resultats)
+    if len(sys.argv) > 2:
+        resultats.to_excel(sys.argv[2], index=False)
+        print(f"✅ Résultats exportés dans {sys.argv[2]}")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Mise à jour incrémentale des risques d'une station à l'arrivée de nouvelles mesures horaires.
+#
+# Au lieu de relancer les modèles sur tout l'historique, chaque station garde ses agrégats
+# journaliers partiels (sommes, comptes, minima) : une nouvelle heure est ajoutée à son jour,
+# puis seuls les jours touchés sont réévalués (le jour de la mesure, et les jours suivants pour
+# un modèle déclaré avec window_days > 1).
+# Le coût d'un ajout ne dépend pas de la longueur de l'historique.
+#
+#   python risk_incremental.py capteurs.xlsx [--step 1]   -> rejoue le fichier heure par heure
+
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from risk_engine import DISEASE_MODELS, all_aggregates, evaluate_models
+from ingestion import DailyAggregator
+
+# -----------------------------------
+# 1. État d'une station
+# -----------------------------------
+
+def _cle_ligne(ligne):
+    # Comparaison des résultats d'un jour : NaN égal à NaN
+    return tuple(None if isinstance(v, float) and np.isnan(v) else v for v in ligne)
+
+class StationRiskState:
+    """Agrégats journaliers partiels et derniers résultats d'une station.
+
+    Les mesures peuvent arriver dans le désordre (un jour passé est simplement réévalué),
+    mais chaque mesure ne doit être envoyée qu'une fois.
+    """
+
+    def __init__(self, aggregates=None, models=None):
+        self.models = models
+        self._agregateur = DailyAggregator(aggregates or all_aggregates(models))
+        selection = DISEASE_MODELS.values() if models is None else [DISEASE_MODELS[m] for m in models]
+        self.window_days = max((m.window_days for m in selection), default=1)
+        self._partiels = {}   # jour (Timestamp) -> {colonne__sum|__count|__min: valeur}
+        self._resultats = {}  # jour -> ligne de résultats (tuple, pour la comparaison)
+        self.columns = None
+
+    def __len__(self):
+        return len(self._partiels)
+
+    def _ajouter(self, partiels):
+        for jour, valeurs in partiels.iterrows():
+            courant = self._partiels.setdefault(jour, {})
+            for col, v in valeurs.items():
+                if col not in courant:
+                    courant[col] = v
+                elif col.endswith('__min'):
+                    courant[col] = np.fmin(courant[col], v)
+                else:
+                    courant[col] += v
+
+    def _jours_touches(self, jours):
+        # Jour de la mesure + jours suivants dont la fenêtre le contient
+        touches = set()
+        for jour in jours:
+            for decalage in range(self.window_days):
+                suivant = jour + pd.Timedelta(days=decalage)
+                if suivant in self._partiels:
+                    touches.add(suivant)
+        return sorted(touches)
+
+    def _evaluer(self, jours):
+        # Les jours précédents de la fenêtre sont fournis aux modèles comme contexte
+        contexte = set(jours)
+        for jour in jours:
+            for decalage in range(1, self.window_days):
+                precedent = jour - pd.Timedelta(days=decalage)
+                if precedent in self._partiels:
+                    contexte.add(precedent)
+        contexte = sorted(contexte)
+        partiels = pd.DataFrame([self._partiels[j] for j in contexte], index=pd.DatetimeIndex(contexte))
+        resultats = evaluate_models(self._agregateur.finalize(partiels), self.models)
+        garder = pd.Series(contexte).isin(jours).to_numpy()
+        return resultats[garder].reset_index(drop=True)
+
+    def append(self, readings):
+        """Ajoute des mesures (DataFrame avec `datetime`) ; renvoie les lignes de résultats qui ont changé."""
+        partiels = self._agregateur.partials(readings)
+        if partiels.empty:
+            return pd.DataFrame(columns=self.columns)
+        partiels.index = pd.DatetimeIndex(partiels.index)
+        self._ajouter(partiels)
+
+        resultats = self._evaluer(self._jours_touches(partiels.index))
+        if self.columns is None or list(resultats.columns) != self.columns:
+            self.columns = list(resultats.columns)
+        changes = []
+        for i, ligne in enumerate(resultats.itertuples(index=False)):
+            jour = pd.Timestamp(ligne[0])
+            cle = _cle_ligne(ligne)
+            if self._resultats.get(jour) != cle:
+                self._resultats[jour] = cle
+                changes.append(i)
+        return resultats.iloc[changes].reset_index(drop=True)
+
+    def results(self):
+        """Tous les jours connus, triés (même contenu que run_all_models sur l'historique complet)."""
+        lignes = [self._resultats[j] for j in sorted(self._resultats)]
+        return pd.DataFrame(lignes, columns=self.columns)
+
+# -----------------------------------
+# 2. Ensemble des stations
+# -----------------------------------
+
+class IncrementalRiskEngine:
+    """Un état par station, créé à la première mesure reçue."""
+
+    def __init__(self, models=None):
+        self.models = models
+        self.stations = {}
+
+    def update(self, station, readings):
+        """Ajoute les mesures de `station` ; renvoie les lignes de résultats modifiées (colonne `station`)."""
+        etat = self.stations.get(station)
+        if etat is None:
+            etat = self.stations[station] = StationRiskState(models=self.models)
+        changes = etat.append(readings)
+        changes.insert(0, 'station', station)
+        return changes
+
+    def results(self, station):
+        return self.stations[station].results()
+
+# -----------------------------------
+# 3. Rejeu d'un fichier heure par heure (contrôle et mesure)
+# -----------------------------------
+
+if __name__ == "__main__":
+    from risk_engine import load_sensor_data, run_all_models
+
+    parser = argparse.ArgumentParser(description="Rejoue un fichier capteur mesure par mesure")
+    parser.add_argument("fichier", nargs="?", default="D:/model/test1.xlsx")
+    parser.add_argument("--step", type=int, default=1, help="mesures ajoutées à chaque mise à jour")
+    args = parser.parse_args()
+
+    df = load_sensor_data(args.fichier)
+    etat = StationRiskState()
+    durees = []
+    for debut in range(0, len(df), args.step):
+        t = time.perf_counter()
+        etat.append(df.iloc[debut:debut + args.step])
+        durees.append(time.perf_counter() - t)
+
+    # Contrôle : même résultat que le calcul complet
+    reference = run_all_models(args.fichier)
+    try:
+        pd.testing.assert_frame_equal(etat.results(), reference, check_dtype=False)  # écarts d'arrondi tolérés
+        identique = True
+    except AssertionError as e:
+        print(f"❌ {e}")
+        identique = False
+    quart = max(1, len(durees) // 4)
+    print(f"✅ {len(df)} mesures, {len(etat)} jours ; identique au calcul complet : {identique}")
+    print(f"⏱️ Mise à jour : {np.median(durees)*1000:.2f} ms (médiane), "
+          f"premier quart {np.median(durees[:quart])*1000:.2f} ms, dernier quart {np.median(durees[-quart:])*1000:.2f} ms")
+    t = time.perf_counter()
+    run_all_models(args.fichier)
+    print(f"⏱️ Recalcul complet (lecture comprise) : {(time.perf_counter() - t)*1000:.0f} ms")
+    sys.exit(0 if identique else 1)
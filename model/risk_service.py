@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Évaluation des risques (oïdium, alternariose, mildiou) pour l'API (routes /risk de main.py).
+#
+# Les mesures arrivent dans la requête (JSON, CSV, fichier : calcul complet à chaque fois) ou sont
+# lues dans le fichier de la station (SMARTFARM_STATIONS_DIR/<station>.csv|.xlsx|.parquet). Pour les
+# stations, chaque jour est mémorisé par (station, jour, versions des modèles, empreinte des mesures
+# du jour) : un tableau de bord qui interroge l'API chaque minute ne recalcule que les jours dont
+# les mesures ont changé.
+#
+#   python risk_service.py bench capteurs.xlsx [--polls 60]   -> latence avec / sans mémorisation
+
+import io
+import os
+import sys
+import json
+import hashlib
+import time
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from risk_engine import DISEASE_MODELS, all_aggregates, compute_daily_aggregates, evaluate_models, load_sensor_data
+from risk_batch import list_station_files
+from prediction_cache import PredictionCache
+
+# === Configuration (variables d'environnement) ===
+# SMARTFARM_STATIONS_DIR     : dossier des fichiers capteurs, un par station (nom de fichier = station)
+# SMARTFARM_RISK_CACHE_SIZE  : nombre de jours (station, jour) mémorisés
+# SMARTFARM_RISK_CACHE_TTL   : durée de vie d'un jour mémorisé (s)
+# SMARTFARM_RISK_STATIONS_LOADED : fichiers de stations gardés en mémoire (les moins récemment lus sont libérés)
+STATIONS_DIR = os.environ.get("SMARTFARM_STATIONS_DIR", "stations")
+RISK_CACHE_SIZE = int(os.environ.get("SMARTFARM_RISK_CACHE_SIZE", 100_000))
+RISK_CACHE_TTL = float(os.environ.get("SMARTFARM_RISK_CACHE_TTL", 7 * 24 * 3600))
+RISK_STATIONS_LOADED = int(os.environ.get("SMARTFARM_RISK_STATIONS_LOADED", 64))
+
+class UnknownStation(KeyError):
+    """Aucun fichier capteur pour cette station dans STATIONS_DIR (404)."""
+
+# -----------------------------------
+# 1. Lecture des mesures envoyées
+# -----------------------------------
+
+def parse_readings(data, content_type="", filename=""):
+    """Corps JSON ({"readings": [...]} ou liste), CSV, ou fichier Excel / Parquet -> DataFrame."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    ext = os.path.splitext(filename or "")[1].lower()
+    if content_type == "application/json" or ext == ".json":
+        contenu = json.loads(data)
+        lignes = contenu.get("readings") if isinstance(contenu, dict) else contenu
+        if not isinstance(lignes, list):
+            raise ValueError("❌ JSON attendu : liste de mesures ou {\"readings\": [...]}")
+        df = pd.DataFrame(lignes)
+    elif ext in (".xlsx", ".xlsm", ".xls"):
+        df = pd.read_excel(io.BytesIO(data))
+    elif ext in (".parquet", ".pq"):
+        df = pd.read_parquet(io.BytesIO(data))
+    else:
+        df = pd.read_csv(io.BytesIO(data))
+
+    df.columns = [str(col).strip() for col in df.columns]
+    if 'datetime' not in df.columns:
+        raise ValueError("❌ Colonne manquante : datetime")
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    return df
+
+# -----------------------------------
+# 2. Évaluation, avec mémorisation par jour pour les fichiers des stations
+# -----------------------------------
+
+def _json(valeur):
+    if isinstance(valeur, np.generic):
+        valeur = valeur.item()
+    if isinstance(valeur, float) and np.isnan(valeur):
+        return None
+    if hasattr(valeur, "isoformat"):
+        return valeur.isoformat()
+    return valeur
+
+def _lignes(resultats):
+    return [{col: _json(v) for col, v in enregistrement.items()}
+            for enregistrement in resultats.to_dict(orient="records")]
+
+def models_version(models=None):
+    """Versions des modèles évalués, intégrées à la clé de mémorisation."""
+    noms = sorted(DISEASE_MODELS) if models is None else list(models)
+    inconnus = [m for m in noms if m not in DISEASE_MODELS]
+    if inconnus:
+        raise ValueError(f"❌ Modèle(s) inconnu(s) : {', '.join(inconnus)}")
+    return ",".join(f"{m}@{DISEASE_MODELS[m].version}" for m in noms)
+
+def check_columns(columns, models=None):
+    """Lève une ValueError nommant les colonnes manquantes (modèles demandés), ou si aucun modèle ne s'applique."""
+    if models is not None:
+        for nom in models:
+            modele = DISEASE_MODELS[nom]
+            if not modele.accepts(columns):
+                manquantes = sorted(set(modele.aggregates) - set(columns))
+                raise ValueError(f"❌ {nom} : colonne(s) manquante(s) : {', '.join(manquantes)}")
+    elif not any(modele.accepts(columns) for modele in DISEASE_MODELS.values()):
+        raise ValueError("❌ Aucun modèle applicable : colonnes "
+                         + " / ".join(", ".join(sorted(m.aggregates)) for m in DISEASE_MODELS.values()))
+
+def day_digests(df):
+    """Empreinte des mesures de chaque jour : (jours datetime64[D] par mesure, {jour: empreinte})."""
+    # Mesures sans date ignorées, comme par le groupby journalier
+    df = df[df['datetime'].notna()].sort_values('datetime', kind='stable')
+    jours = df['datetime'].to_numpy().astype('datetime64[D]')
+    lignes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    debuts = np.flatnonzero(np.r_[True, jours[1:] != jours[:-1]])
+    empreintes = {
+        jour: hashlib.sha1(bloc.tobytes()).hexdigest()[:16]
+        for jour, bloc in zip(jours[debuts], np.split(lignes, debuts[1:]))
+    }
+    return df, jours, empreintes
+
+class RiskService:
+    """Risques par jour pour des mesures envoyées, ou pour le fichier d'une station.
+
+    Seuls les fichiers des stations (côté serveur) sont mémorisés : un jour est réutilisé tant
+    que ses mesures (et celles de sa fenêtre) ont la même empreinte et les modèles la même version,
+    si bien qu'une mesure corrigée ou arrivée en retard fait recalculer son jour.
+    """
+
+    def __init__(self, cache=None, stations_dir=STATIONS_DIR, max_stations=RISK_STATIONS_LOADED):
+        self.cache = cache or PredictionCache(RISK_CACHE_SIZE, RISK_CACHE_TTL)
+        self.stations_dir = stations_dir
+        self.max_stations = max_stations
+        # LRU station -> (chemin, mtime, taille, DataFrame trié, jours, empreintes) ; une station
+        # libérée est relue au besoin, ses jours restent dans self.cache
+        self._fichiers = OrderedDict()
+        self._verrou = threading.Lock()
+        self.days_computed = 0
+        self.days_cached = 0
+
+    def _compter(self, calcules, memorises):
+        with self._verrou:
+            self.days_computed += calcules
+            self.days_cached += memorises
+
+    def assess(self, df, models=None):
+        """Mesures envoyées par le client -> dictionnaire JSON des résultats par jour (rien n'est mémorisé)."""
+        version = models_version(models)
+        check_columns(df.columns, models)
+        lignes = _lignes(evaluate_models(compute_daily_aggregates(df, all_aggregates(models)), models))
+        self._compter(len(lignes), 0)
+        return {"station": None, "models": version, "days": lignes,
+                "computed_days": len(lignes), "cached_days": 0}
+
+    def _station(self, station):
+        chemin = list_station_files(self.stations_dir).get(station) if os.path.isdir(self.stations_dir) else None
+        if chemin is None:
+            raise UnknownStation(station)
+        st = os.stat(chemin)
+        with self._verrou:
+            connu = self._fichiers.get(station)
+            if connu is not None:
+                self._fichiers.move_to_end(station)
+        if connu is not None and connu[:3] == (chemin, st.st_mtime_ns, st.st_size):
+            return connu[3:]
+        df, jours, empreintes = day_digests(load_sensor_data(chemin))
+        with self._verrou:
+            self._fichiers[station] = (chemin, st.st_mtime_ns, st.st_size, df, jours, empreintes)
+            self._fichiers.move_to_end(station)
+            while len(self._fichiers) > self.max_stations:
+                self._fichiers.popitem(last=False)
+        return df, jours, empreintes
+
+    def station_readings(self, station):
+        """Mesures du fichier de la station, relu seulement s'il a changé (date ou taille)."""
+        return self._station(station)[0]
+
+    def assess_station(self, station, models=None):
+        """Résultats par jour du fichier de la station ; seuls les jours dont les mesures ont changé
+        (ou absents du cache) passent par les modèles."""
+        version = models_version(models)
+        df, jours_mesures, empreintes = self._station(station)
+        check_columns(df.columns, models)
+        selection = DISEASE_MODELS.values() if models is None else [DISEASE_MODELS[m] for m in models]
+        fenetre = max(m.window_days for m in selection)
+
+        lignes, cles = {}, {}
+        for jour in empreintes:
+            fenetre_jours = "".join(empreintes.get(jour - np.timedelta64(d, 'D'), "-") for d in range(fenetre))
+            cles[jour] = f"risk\0{station}\0{jour}\0{version}\0{fenetre_jours}"
+            ligne = self.cache.get(cles[jour])
+            if ligne is not None:
+                lignes[jour] = ligne
+        a_calculer = [j for j in empreintes if j not in lignes]
+
+        if a_calculer:
+            # Jours précédents nécessaires aux modèles à fenêtre (window_days > 1)
+            contexte = set(a_calculer)
+            for jour in a_calculer:
+                contexte.update(jour - np.timedelta64(d, 'D') for d in range(1, fenetre))
+            sous_ensemble = df[np.isin(jours_mesures, list(contexte))]
+            resultats = evaluate_models(compute_daily_aggregates(sous_ensemble, all_aggregates(models)), models)
+            a_garder = set(a_calculer)
+            for ligne in _lignes(resultats):
+                jour = np.datetime64(ligne['Date'], 'D')
+                if jour in a_garder:
+                    lignes[jour] = ligne
+                    self.cache.put(cles[jour], ligne)
+
+        self._compter(len(a_calculer), len(empreintes) - len(a_calculer))
+        return {
+            "station": station,
+            "models": version,
+            "days": [lignes[j] for j in empreintes if j in lignes],
+            "computed_days": len(a_calculer),
+            "cached_days": len(empreintes) - len(a_calculer),
+        }
+
+    def stats(self):
+        with self._verrou:
+            calcules, memorises = self.days_computed, self.days_cached
+        total = calcules + memorises
+        return {
+            "days_computed": calcules,
+            "days_cached": memorises,
+            "cached_fraction": (memorises / total) if total else 0.0,
+            "stations_loaded": len(self._fichiers),
+            "max_stations_loaded": self.max_stations,
+            "cache": self.cache.stats(),
+        }
+
+# -----------------------------------
+# 3. Benchmark : interrogations répétées d'un tableau de bord
+# -----------------------------------
+
+def benchmark(filepath, polls=60):
+    """Même fichier interrogé `polls` fois : mesures envoyées (POST) puis fichier de station (GET)."""
+    df = load_sensor_data(filepath)
+    service = RiskService(stations_dir=os.path.dirname(os.path.abspath(filepath)))
+    station = os.path.splitext(os.path.basename(filepath))[0]
+
+    def _latences(interroger):
+        durees = []
+        for _ in range(polls):
+            debut = time.perf_counter()
+            json.dumps(interroger())
+            durees.append(time.perf_counter() - debut)
+        return durees
+
+    sans = _latences(lambda: service.assess(df))
+    avec = _latences(lambda: service.assess_station(station))
+    return {
+        "readings": len(df),
+        "days": df['datetime'].dt.normalize().nunique(),
+        "no_memo_ms": float(np.median(sans) * 1000),
+        "memo_first_ms": avec[0] * 1000,
+        "memo_repeat_ms": float(np.median(avec[1:]) * 1000) if polls > 1 else None,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Service de risques : benchmark d'interrogations répétées")
+    sous = parser.add_subparsers(dest="commande", required=True)
+    p = sous.add_parser("bench")
+    p.add_argument("fichier", nargs="?", default="D:/model/test1.xlsx")
+    p.add_argument("--polls", type=int, default=60)
+    args = parser.parse_args()
+
+    r = benchmark(args.fichier, args.polls)
+    print(f"📊 {r['readings']} mesures, {r['days']} jours, {args.polls} interrogations")
+    print(f"⏱️ Sans mémorisation : {r['no_memo_ms']:.1f} ms par requête (médiane)")
+    print(f"⏱️ Avec mémorisation : {r['memo_first_ms']:.1f} ms à la première, "
+          f"{r['memo_repeat_ms']:.1f} ms ensuite (médiane)")
+    sys.exit(0)
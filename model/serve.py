@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Serveur de production pré-forké (Linux) :
+#   python serve.py [--workers 16] [--port 5050]
+#
+# - le maître ouvre le port et construit le modèle une seule fois (interpréteur TFLite ou session
+#   ONNX Runtime, préchauffés) ; les workers forkés en héritent et partagent ses poids en
+#   copie-sur-écriture. Le backend keras fait exception : TensorFlow se bloque dans un processus
+#   forké une fois initialisé dans le parent, chaque worker recharge donc le .h5 (préférer tflite) ;
+# - chaque worker limite ses threads de calcul à cœurs / workers pour éviter la sursouscription ;
+# - SIGHUP : relit le modèle et démarre une nouvelle génération de workers ; chaque worker
+#   signale au maître (tube) qu'il a préchauffé son modèle, et les anciens ne sont arrêtés
+#   proprement (requêtes en cours terminées) qu'une fois toute la nouvelle génération prête.
+#   Si un nouveau worker échoue, la nouvelle génération est abandonnée et l'ancienne continue ;
+# - un worker qui meurt est relancé avec un délai croissant s'il meurt avant d'être prêt ;
+# - SIGTERM / SIGINT : arrêt propre de tous les workers.
+
+import os
+import sys
+import time
+import signal
+import socket
+import select
+import argparse
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from inference import preload_backend, resolve_backend
+
+# Délai laissé aux workers pour finir leurs requêtes avant SIGKILL
+GRACEFUL_TIMEOUT = float(os.environ.get("SMARTFARM_GRACEFUL_TIMEOUT", 30))
+# Délai maximal avant de relancer un worker qui échoue à démarrer (doublé à chaque échec)
+RESPAWN_MAX_DELAY = float(os.environ.get("SMARTFARM_RESPAWN_MAX_DELAY", 30))
+
+# -----------------------------------
+# 1. Côté worker
+# -----------------------------------
+
+def _limiter_threads(threads_calcul):
+    # Variables lues par TensorFlow / OpenMP / onnxruntime au moment de leur initialisation
+    os.environ["SMARTFARM_NUM_THREADS"] = str(threads_calcul)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads_calcul)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["OMP_NUM_THREADS"] = str(threads_calcul)
+
+def run_worker(listen_fd, host, port, threads_calcul, pret_fd):
+    # Gestionnaires du maître hérités du fork : SIGTERM doit tuer un worker encore en démarrage
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    _limiter_threads(threads_calcul)
+
+    from werkzeug.serving import make_server
+    from main import app, loader  # reprend le backend construit par le maître (sauf keras)
+
+    # N'accepter des connexions qu'une fois le modèle préchauffé, puis le signaler au maître
+    try:
+        loader.wait()
+    except Exception:
+        os._exit(1)
+
+    server = make_server(host, port, app, threaded=True, fd=listen_fd)
+    os.write(pret_fd, b"1")
+    os.close(pret_fd)
+    # Attendre les threads de requêtes en cours à la fermeture au lieu de les abandonner
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def _arret(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _arret)
+
+    server.serve_forever()
+    server.server_close()
+    os._exit(0)
+
+# -----------------------------------
+# 2. Côté maître
+# -----------------------------------
+
+class Master:
+    def __init__(self, host, port, workers, threads_calcul):
+        self.host = host
+        self.port = port
+        self.nb_workers = workers
+        self.threads_calcul = threads_calcul
+        self.generation = 0      # génération qui sert
+        self.nouvelle = None     # génération en cours de démarrage (SIGHUP)
+        self._numero = 0
+        self.workers = {}        # pid -> génération
+        self._tubes = {}         # descripteur de lecture -> pid (signal « prêt »)
+        self._prets = set()
+        self._echecs = 0         # workers morts avant d'être prêts, d'affilée
+        self._relances = []      # échéances (monotonic) des workers à relancer
+        self._recharger = False
+        self._arreter = False
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(1024)
+        self.sock.set_inheritable(True)
+
+    def charger_modele(self):
+        debut = time.perf_counter()
+        backend, model_path = resolve_backend()
+        if backend == "keras":
+            print(f"📦 Backend keras : chaque worker charge {model_path} (pas de partage avant le fork)")
+            return
+        modele = preload_backend(backend, model_path, self.threads_calcul)
+        # Tampons d'activation alloués avant le fork, eux aussi hérités
+        modele.predict(np.zeros((1, 224, 224, 3), dtype=np.float32))
+        print(f"📦 Modèle {backend} chargé dans le maître : {model_path} ({time.perf_counter() - debut:.2f} s)")
+
+    def lancer_worker(self, generation):
+        lecture, ecriture = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(lecture)
+                for fd in self._tubes:
+                    os.close(fd)
+                run_worker(self.sock.fileno(), self.host, self.port, self.threads_calcul, ecriture)
+            finally:
+                os._exit(1)
+        os.close(ecriture)
+        self.workers[pid] = generation
+        self._tubes[lecture] = pid
+        return pid
+
+    def lancer_generation(self):
+        self._numero += 1
+        for _ in range(self.nb_workers):
+            self.lancer_worker(self._numero)
+        print(f"🚀 Génération {self._numero} : {self.nb_workers} workers "
+              f"({self.threads_calcul} thread(s) de calcul chacun) sur {self.host}:{self.port}")
+        return self._numero
+
+    def arreter_generations(self, avant=None, seule=None):
+        for pid, gen in list(self.workers.items()):
+            if (avant is not None and gen < avant) or gen == seule:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def recharger(self):
+        # L'ancienne génération sert jusqu'à ce que toute la nouvelle soit prête (voir surveiller)
+        print("🔄 Rechargement du modèle...")
+        if self.nouvelle is not None:
+            self.arreter_generations(seule=self.nouvelle)
+        try:
+            self.charger_modele()
+        except Exception as e:
+            print(f"❌ Rechargement abandonné, l'ancien modèle reste en service : {e}")
+            self.nouvelle = None
+            return
+        self.nouvelle = self.lancer_generation()
+
+    def _lire_prets(self):
+        if not self._tubes:
+            return
+        lisibles, _, _ = select.select(list(self._tubes), [], [], 0)
+        for fd in lisibles:
+            pid = self._tubes.pop(fd)
+            if os.read(fd, 1) and pid in self.workers:  # rien lu : mort avant d'être prêt
+                self._prets.add(pid)
+                self._echecs = 0
+            os.close(fd)
+
+        if self.nouvelle is not None:
+            prets = [p for p, g in self.workers.items() if g == self.nouvelle and p in self._prets]
+            if len(prets) == self.nb_workers:
+                print(f"✅ Génération {self.nouvelle} prête, arrêt de la génération {self.generation}")
+                self.generation, self.nouvelle = self.nouvelle, None
+                self.arreter_generations(avant=self.generation)
+
+    def surveiller(self):
+        self._lire_prets()
+        while True:
+            try:
+                pid, statut = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            gen = self.workers.pop(pid, None)
+            pret = pid in self._prets
+            self._prets.discard(pid)
+            if self._arreter:
+                continue
+            if gen is not None and gen == self.nouvelle:
+                print(f"❌ Worker {pid} de la génération {gen} terminé avant d'être prêt (statut {statut}) : "
+                      f"rechargement abandonné, la génération {self.generation} reste en service")
+                self.arreter_generations(seule=self.nouvelle)
+                self.nouvelle = None
+            elif gen == self.generation:
+                if not pret:
+                    self._echecs += 1
+                delai = min(RESPAWN_MAX_DELAY, 0.5 * 2 ** (self._echecs - 1)) if self._echecs else 0.0
+                print(f"⚠️ Worker {pid} terminé (statut {statut}), redémarrage dans {delai:.1f} s")
+                self._relances.append(time.monotonic() + delai)
+
+        if self._arreter:
+            return
+        maintenant = time.monotonic()
+        for echeance in [e for e in self._relances if e <= maintenant]:
+            self._relances.remove(echeance)
+            self.lancer_worker(self.generation)
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda *a: setattr(self, "_recharger", True))
+        signal.signal(signal.SIGTERM, lambda *a: setattr(self, "_arreter", True))
+        signal.signal(signal.SIGINT, lambda *a: setattr(self, "_arreter", True))
+
+        self.charger_modele()
+        self.generation = self.lancer_generation()
+        while not self._arreter:
+            if self._recharger:
+                self._recharger = False
+                self.recharger()
+            self.surveiller()
+            time.sleep(0.2)
+
+        print("🛑 Arrêt des workers...")
+        self.arreter_generations(avant=self._numero + 1)
+        echeance = time.monotonic() + GRACEFUL_TIMEOUT
+        while self.workers and time.monotonic() < echeance:
+            self.surveiller()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.sock.close()
+
+if __name__ == "__main__":
+    coeurs = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Serveur pré-forké de l'API de détection")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5050)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SMARTFARM_WORKERS", coeurs)))
+    parser.add_argument("--threads", type=int, default=0,
+                        help="threads de calcul par worker (défaut : cœurs / workers)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("❌ serve.py nécessite os.fork (Linux/macOS) ; sous Windows, lancer main.py")
+        sys.exit(1)
+
+    threads_calcul = args.threads or max(1, coeurs // args.workers)
+    Master(args.host, args.port, args.workers, threads_calcul).run()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Format compact d'envoi pour /predict : l'image déjà redimensionnée côté client en 224x224 RGB
+# uint8 (150 Ko brut, moins avec zlib), au lieu de la photo d'origine de plusieurs Mo.
+#
+# En-tête de 14 octets (petit-boutiste), suivi des pixels ligne par ligne (H, W, C) :
+#   magic      3s   b"SFT"
+#   version    B    1
+#   hauteur    H
+#   largeur    H
+#   canaux     B    3
+#   encodage   B    0 = brut, 1 = zlib
+#   taille     I    octets de la charge utile qui suit
+#
+# Envoi : corps de requête avec Content-Type: application/x-smartfarm-tensor, ou part `file`
+# multipart habituelle dont le contenu commence par l'en-tête (détecté par le magic).
+#
+#   python tensor_format.py encode photo.jpg photo.sft [--zlib]
+#   python tensor_format.py bench [dossier_images]   -> octets envoyés et CPU serveur, JPEG vs tenseur
+
+import os
+import sys
+import time
+import zlib
+import struct
+import argparse
+import numpy as np
+
+MEDIA_TYPE = "application/x-smartfarm-tensor"
+MAGIC = b"SFT"
+VERSION = 1
+INPUT_SHAPE = (224, 224, 3)
+
+ENCODING_RAW = 0
+ENCODING_ZLIB = 1
+
+_ENTETE = struct.Struct("<3sBHHBBI")
+
+class TensorFormatError(ValueError):
+    """Envoi au format tenseur invalide (en-tête, forme ou taille) : erreur du client (400)."""
+
+def is_tensor(data):
+    return data[:3] == MAGIC
+
+def encode_tensor(pixels, compress=False, level=6):
+    """uint8 (H, W, C) -> octets au format SFT1."""
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    if pixels.ndim != 3:
+        raise TensorFormatError(f"Forme attendue (H, W, C), reçue {pixels.shape}")
+    charge = pixels.tobytes()
+    encodage = ENCODING_RAW
+    if compress:
+        charge = zlib.compress(charge, level)
+        encodage = ENCODING_ZLIB
+    h, w, c = pixels.shape
+    return _ENTETE.pack(MAGIC, VERSION, h, w, c, encodage, len(charge)) + charge
+
+def decode_tensor(data, expected_shape=INPUT_SHAPE):
+    """Octets SFT1 -> uint8 (H, W, C), sans copie pour l'encodage brut.
+
+    Lève TensorFormatError si l'en-tête, la forme ou la taille ne correspondent pas
+    (la décompression est bornée à la taille attendue).
+    """
+    if len(data) < _ENTETE.size:
+        raise TensorFormatError("En-tête tronqué")
+    magic, version, h, w, c, encodage, taille = _ENTETE.unpack_from(data)
+    if magic != MAGIC:
+        raise TensorFormatError("Magic SFT absent")
+    if version != VERSION:
+        raise TensorFormatError(f"Version {version} non supportée (attendue : {VERSION})")
+    if expected_shape is not None and (h, w, c) != tuple(expected_shape):
+        raise TensorFormatError(f"Forme {(h, w, c)} refusée (attendue : {tuple(expected_shape)})")
+    if len(data) - _ENTETE.size != taille:
+        raise TensorFormatError(f"Taille de charge {len(data) - _ENTETE.size} au lieu de {taille}")
+
+    attendu = h * w * c
+    charge = memoryview(data)[_ENTETE.size:]
+    if encodage == ENCODING_ZLIB:
+        decompresseur = zlib.decompressobj()
+        try:
+            charge = decompresseur.decompress(charge, attendu)
+        except zlib.error as e:
+            raise TensorFormatError(f"Charge zlib invalide : {e}")
+        if decompresseur.unconsumed_tail or not decompresseur.eof:
+            raise TensorFormatError("Charge zlib plus longue que la forme annoncée")
+    elif encodage != ENCODING_RAW:
+        raise TensorFormatError(f"Encodage {encodage} inconnu")
+    if len(charge) != attendu:
+        raise TensorFormatError(f"{len(charge)} octets de pixels au lieu de {attendu}")
+    return np.frombuffer(charge, dtype=np.uint8).reshape(h, w, c)
+
+def tensor_to_input(data, out=None, observe=None):
+    """Octets SFT1 -> entrée du modèle float32 (1, 224, 224, 3), comme preprocess_image_fast."""
+    t = time.perf_counter()
+    pixels = decode_tensor(data)
+    if observe is not None:
+        t2 = time.perf_counter()
+        observe('decode', t2 - t)
+        t = t2
+    if out is None:
+        out = np.empty((1,) + INPUT_SHAPE, dtype=np.float32)
+    np.divide(pixels, np.float32(255.0), out=out.reshape(pixels.shape))
+    if observe is not None:
+        observe('normalize', time.perf_counter() - t)
+    return out
+
+def encode_image_bytes(image_bytes, compress=False):
+    """Conversion côté client (référence pour l'application) : photo -> SFT1 224x224."""
+    from preprocessing import decode_image_fast
+
+    return encode_tensor(decode_image_fast(image_bytes, INPUT_SHAPE[:2]), compress)
+
+# -----------------------------------
+# Benchmark : octets sur le réseau et CPU serveur par requête
+# -----------------------------------
+
+def _cpu_par_requete(fonction, data, repetitions):
+    debut = time.process_time()
+    for _ in range(repetitions):
+        fonction(data)
+    return (time.process_time() - debut) / repetitions
+
+def benchmark(image_dir, repetitions=20):
+    from inference import _lister_images
+    from preprocessing import preprocess_image_fast
+
+    formats = {"jpeg": [0, 0.0], "tensor": [0, 0.0], "tensor+zlib": [0, 0.0]}
+    images = 0
+    for chemin in _lister_images(image_dir):
+        with open(chemin, "rb") as f:
+            data = f.read()
+        try:
+            envois = {
+                "jpeg": (data, preprocess_image_fast),
+                "tensor": (encode_image_bytes(data), tensor_to_input),
+                "tensor+zlib": (encode_image_bytes(data, compress=True), tensor_to_input),
+            }
+        except Exception as e:
+            print(f"⚠️ Image ignorée {os.path.basename(chemin)} : {e}")
+            continue
+        images += 1
+        for nom, (envoi, fonction) in envois.items():
+            formats[nom][0] += len(envoi)
+            formats[nom][1] += _cpu_par_requete(fonction, envoi, repetitions)
+    return {nom: {"bytes": total / max(images, 1), "cpu_seconds": cpu / max(images, 1)}
+            for nom, (total, cpu) in formats.items()}, images
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Format tenseur compact pour /predict")
+    sous = parser.add_subparsers(dest="commande", required=True)
+
+    p = sous.add_parser("encode")
+    p.add_argument("source")
+    p.add_argument("destination")
+    p.add_argument("--zlib", action="store_true")
+
+    p = sous.add_parser("bench")
+    p.add_argument("images", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "images"))
+    p.add_argument("--repetitions", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.commande == "encode":
+        with open(args.source, "rb") as f:
+            data = encode_image_bytes(f.read(), args.zlib)
+        with open(args.destination, "wb") as f:
+            f.write(data)
+        print(f"✅ {args.destination} : {len(data)/1024:.1f} Ko (source {os.path.getsize(args.source)/1024:.1f} Ko)")
+        sys.exit(0)
+
+    resultats, images = benchmark(args.images, args.repetitions)
+    print(f"📷 {images} images")
+    print(f"{'format':<14}{'octets/requête':>16}{'CPU serveur':>14}")
+    for nom, r in resultats.items():
+        print(f"{nom:<14}{r['bytes']/1024:>13.1f} Ko{r['cpu_seconds']*1000:>11.2f} ms")
@@ -1,10 +1,13 @@
 import os
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.models import Model, load_model
 from tensorflow.keras.layers import Dense, Dropout, GlobalAveragePooling2D, Input
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
 from tensorflow.keras.applications import MobileNetV2
+from data_pipeline import make_datasets
+from dataset_cache import build_dataset_cache, open_dataset_cache, cache_to_datasets, list_dataset_files
+from training import configure_training, save_float32, ThroughputLogger, ResumableCheckpoint
+from feature_cache import split_head, build_feature_cache, open_feature_cache, train_head
 
 # === CONFIGURATION ===
 DATA_DIR = 'D:/Plant_leave_diseases_dataset_without_augmentation'
@@ -12,6 +15,26 @@ MODEL_SAVE_PATH = 'D:/model/models/plant_disease_model_mobilenet.h5'  # Changé
 CLASS_NAMES_PATH = 'D:/model/class_names.py'
 IMG_HEIGHT, IMG_WIDTH = 224, 224
 BATCH_SIZE = 32
+# Cache des images décodées (tf.data) : None = aucun, "" = en mémoire, chemin = fichiers de cache sur disque
+DATA_CACHE = None
+# Cache memmap des images déjà redimensionnées (dataset_cache.py), mis à jour à chaque lancement ; None = lecture des JPEG
+DATASET_CACHE_DIR = None
+# Dossier de fragments TFRecord (python data_pipeline.py export-tfrecords ...) à lire à la place des images
+TFRECORD_DIR = None
+# Étape 1 sur caractéristiques MobileNetV2 pré-calculées (feature_cache.py) ; None = entraînement image par image
+BOTTLENECK_CACHE_DIR = None
+BOTTLENECK_VARIANTS = 5     # variantes par image d'entraînement (1 originale + 4 augmentées)
+
+# === MODE ENTRAÎNEMENT (training.py) ===
+INTER_OP_THREADS = 0        # 0 = valeur par défaut de TensorFlow
+INTRA_OP_THREADS = 0
+MIXED_PRECISION = None      # None = float32, "bfloat16", "auto" = bfloat16 si le CPU le supporte
+CHECKPOINT_DIR = 'D:/model/checkpoints'  # points de reprise complets (un sous-dossier par étape)
+
+PRECISION = configure_training(INTER_OP_THREADS, INTRA_OP_THREADS, MIXED_PRECISION)
+# En précision mixte, les points de sauvegarde d'entraînement gardent les politiques bfloat16 ;
+# MODEL_SAVE_PATH (servi par main.py et exporté) reçoit toujours une copie float32
+TRAIN_MODEL_PATH = MODEL_SAVE_PATH if PRECISION == "float32" else os.path.splitext(MODEL_SAVE_PATH)[0] + ".bf16.h5"
 
 # === VÉRIFICATIONS INITIALES ===
 assert os.path.exists(DATA_DIR), f"Le dossier de données {DATA_DIR} n'existe pas"
@@ -19,42 +42,31 @@ os.makedirs(os.path.dirname(MODEL_SAVE_PATH), exist_ok=True)
 os.makedirs(os.path.dirname(CLASS_NAMES_PATH), exist_ok=True)
 
 # === 1. Prétraitement et Data Augmentation ===
+# Pipeline tf.data (data_pipeline.py) : même découpage 80/20 et mêmes augmentations que
+# l'ancien ImageDataGenerator, avec décodage parallèle et augmentation par lot
 try:
-    datagen = ImageDataGenerator(
-        rescale=1./255,
-        validation_split=0.2,
-        shear_range=0.2,
-        zoom_range=0.2,
-        rotation_range=20,
-        width_shift_range=0.1,
-        height_shift_range=0.1,
-        horizontal_flip=True
-    )
-
-    train_generator = datagen.flow_from_directory(
-        DATA_DIR,
-        target_size=(IMG_HEIGHT, IMG_WIDTH),
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        subset='training',
-        shuffle=True
-    )
-
-    val_generator = datagen.flow_from_directory(
-        DATA_DIR,
-        target_size=(IMG_HEIGHT, IMG_WIDTH),
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        subset='validation',
-        shuffle=False
-    )
+    if DATASET_CACHE_DIR:
+        resume = build_dataset_cache(DATA_DIR, DATASET_CACHE_DIR, image_size=(IMG_HEIGHT, IMG_WIDTH), validation_split=0.2)
+        print(f"📦 Cache du jeu de données : {resume['decoded']} images décodées, {resume['reused']} reprises")
+        dataset_cache = open_dataset_cache(DATASET_CACHE_DIR)
+        class_names = dataset_cache.class_names
+        train_generator, val_generator = cache_to_datasets(dataset_cache, batch_size=BATCH_SIZE)
+    else:
+        train_generator, val_generator, class_names = make_datasets(
+            DATA_DIR,
+            batch_size=BATCH_SIZE,
+            image_size=(IMG_HEIGHT, IMG_WIDTH),
+            validation_split=0.2,
+            cache=DATA_CACHE,
+            tfrecord_dir=TFRECORD_DIR
+        )
+    # Nombre réel d'images d'entraînement par époque (débit exact malgré le dernier lot incomplet)
+    n_train = dataset_cache.n_train if DATASET_CACHE_DIR else len(list_dataset_files(DATA_DIR, 0.2)[0])
 except Exception as e:
     raise RuntimeError(f"Erreur lors du chargement des données: {str(e)}")
 
 # === 2. Sauvegarde des noms de classes ===
 try:
-    index_to_class = {v: k for k, v in train_generator.class_indices.items()}
-    class_names = [index_to_class[i] for i in range(len(index_to_class))]
     print("✅ Classes détectées :", class_names)
 
     with open(CLASS_NAMES_PATH, 'w') as f:
@@ -82,7 +94,8 @@ def build_model(num_classes):
         x = GlobalAveragePooling2D()(x)
         x = Dense(256, activation='relu')(x)
         x = Dropout(0.5)(x)
-        outputs = Dense(num_classes, activation='softmax')(x)
+        # Sortie en float32 même en précision mixte (softmax stable)
+        outputs = Dense(num_classes, activation='softmax', dtype='float32')(x)
         
         model = Model(inputs, outputs, name='disease_classifier')
         
@@ -91,7 +104,7 @@ def build_model(num_classes):
         raise RuntimeError(f"Erreur lors de la construction du modèle: {str(e)}")
 
 try:
-    model, mobilenet_base = build_model(train_generator.num_classes)
+    model, mobilenet_base = build_model(len(class_names))
     model.compile(optimizer='adam', 
                  loss='categorical_crossentropy', 
                  metrics=['accuracy'])
@@ -102,7 +115,7 @@ except Exception as e:
 callbacks = [
     EarlyStopping(patience=8, monitor='val_accuracy', restore_best_weights=True, verbose=1),
     ModelCheckpoint(
-        filepath=MODEL_SAVE_PATH,
+        filepath=TRAIN_MODEL_PATH,
         monitor='val_accuracy',
         save_best_only=True,
         save_weights_only=False,
@@ -114,14 +127,55 @@ callbacks = [
 
 # === 5. Entraînement initial ===
 print("\n🔁 Étape 1 : Entraînement des couches supérieures")
+# Étape 1 sur caractéristiques pré-calculées : seule la tête est entraînée (et reprise). Pas de
+# ModelCheckpoint, qui sauvegarderait la tête seule : EarlyStopping restaure ses meilleurs poids et
+# le modèle complet est sauvegardé en fin d'étape
+callbacks_1 = callbacks
+if BOTTLENECK_CACHE_DIR:
+    callbacks_1 = [
+        EarlyStopping(patience=8, monitor='val_accuracy', restore_best_weights=True, verbose=1),
+        ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=4, min_lr=1e-6, verbose=1)
+    ]
 try:
-    history = model.fit(
-        train_generator,
-        validation_data=val_generator,
-        epochs=10,
-        callbacks=callbacks,
-        verbose=1
-    )
+    reprise_1 = ResumableCheckpoint(
+        os.path.join(CHECKPOINT_DIR, 'phase1_head' if BOTTLENECK_CACHE_DIR else 'phase1'), callbacks_1)
+    if reprise_1.finished:
+        print("⏭️ Étape 1 déjà terminée lors d'un lancement précédent")
+    elif BOTTLENECK_CACHE_DIR:
+        # La base est gelée : ses sorties sont calculées une fois, seule la tête est entraînée
+        extracteur, tete = split_head(model)
+        resume = build_feature_cache(
+            BOTTLENECK_CACHE_DIR, extracteur,
+            data_dir=DATA_DIR,
+            dataset_cache=dataset_cache if DATASET_CACHE_DIR else None,
+            image_size=(IMG_HEIGHT, IMG_WIDTH),
+            variants=BOTTLENECK_VARIANTS
+        )
+        print(f"📦 Caractéristiques {'réutilisées' if resume['reused'] else 'calculées'} en {resume['seconds']:.1f} s")
+        history = train_head(
+            tete, open_feature_cache(BOTTLENECK_CACHE_DIR),
+            epochs=10,
+            batch_size=256,
+            callbacks=callbacks_1 + [ThroughputLogger(256, n_train)],
+            checkpoint=reprise_1
+        )
+        # La tête partage ses couches avec le modèle complet, sauvegardé pour l'étape 2
+        model.save(TRAIN_MODEL_PATH)
+        reprise_1.mark_finished()
+        if TRAIN_MODEL_PATH != MODEL_SAVE_PATH:
+            save_float32(model, MODEL_SAVE_PATH)
+    else:
+        history = model.fit(
+            train_generator,
+            validation_data=val_generator,
+            epochs=10,
+            initial_epoch=reprise_1.restore(model),
+            callbacks=callbacks + [ThroughputLogger(BATCH_SIZE, n_train), reprise_1],
+            verbose=1
+        )
+        reprise_1.mark_finished()
+        if TRAIN_MODEL_PATH != MODEL_SAVE_PATH:
+            save_float32(model, MODEL_SAVE_PATH)
 except Exception as e:
     raise RuntimeError(f"Erreur lors de l'entraînement initial: {str(e)}")
 
@@ -129,11 +183,11 @@ except Exception as e:
 print("\n🔥 Étape 2 : Fine-tuning des couches profondes")
 try:
     # Vérification explicite du fichier modèle
-    if not os.path.exists(MODEL_SAVE_PATH):
-        raise FileNotFoundError(f"Fichier modèle introuvable: {MODEL_SAVE_PATH}")
+    if not os.path.exists(TRAIN_MODEL_PATH):
+        raise FileNotFoundError(f"Fichier modèle introuvable: {TRAIN_MODEL_PATH}")
     
     # Chargement avec vérification
-    model = load_model(MODEL_SAVE_PATH)
+    model = load_model(TRAIN_MODEL_PATH)
     print("✅ Modèle chargé avec succès")
     
     # Vérification de la présence de MobileNetV2
@@ -162,19 +216,25 @@ try:
         metrics=['accuracy']
     )
     
-    # Entraînement
-    history_fine = model.fit(
-        train_generator,
-        validation_data=val_generator,
-        epochs=20,
-        callbacks=callbacks,
-        verbose=1
-    )
-    
-    # Sauvegarde finale
-    model.save(MODEL_SAVE_PATH)
-    print(f"\n✅ Modèle final sauvegardé avec succès à: {MODEL_SAVE_PATH}")
-    print(f"Taille du fichier: {os.path.getsize(MODEL_SAVE_PATH)/1024/1024:.2f} MB")
+    # Entraînement (reprend à la dernière époque sauvegardée si l'étape a été interrompue)
+    reprise_2 = ResumableCheckpoint(os.path.join(CHECKPOINT_DIR, 'phase2'), callbacks)
+    if reprise_2.finished:
+        print("⏭️ Étape 2 déjà terminée lors d'un lancement précédent : modèle final inchangé")
+    else:
+        history_fine = model.fit(
+            train_generator,
+            validation_data=val_generator,
+            epochs=20,
+            initial_epoch=reprise_2.restore(model),
+            callbacks=callbacks + [ThroughputLogger(BATCH_SIZE, n_train), reprise_2],
+            verbose=1
+        )
+        reprise_2.mark_finished()
+
+        # Sauvegarde finale (float32, même après un entraînement en précision mixte)
+        save_float32(model, MODEL_SAVE_PATH)
+        print(f"\n✅ Modèle final sauvegardé avec succès à: {MODEL_SAVE_PATH}")
+        print(f"Taille du fichier: {os.path.getsize(MODEL_SAVE_PATH)/1024/1024:.2f} MB")
 
 except Exception as e:
     print(f"\n❌ ERREUR CRITIQUE lors du fine-tuning: {str(e)}")
@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_classify import CsvWriter, ParquetWriter, _colonnes
+
+COLONNES = _colonnes(2)
+
+def _lignes(debut, n, version):
+    return [[f"img/{i:04d}.jpg", "Mildiou", 0.9, "oidium", 0.05, version] for i in range(debut, debut + n)]
+
+def test_csv_reprise():
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "resultats.csv")
+        with CsvWriter(chemin, COLONNES) as ecr:
+            ecr.write(_lignes(0, 5, "v1"))
+        with CsvWriter(chemin, COLONNES) as ecr:
+            ecr.write(_lignes(5, 3, "v2"))
+        ecrivain = CsvWriter(chemin, COLONNES)
+        assert ecrivain.done("v1") == {f"img/{i:04d}.jpg" for i in range(5)}
+        assert len(ecrivain.done("v2")) == 3
+
+def test_parquet_fragments_et_reprise():
+    pytest.importorskip("pyarrow")
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "resultats.parquet")
+        # 10 lignes par fragment : 25 lignes -> 2 fragments pleins + 1 écrit à la fermeture
+        with ParquetWriter(chemin, COLONNES, rows_per_part=10) as ecr:
+            for debut in range(0, 25, 5):
+                ecr.write(_lignes(debut, 5, "v1"))
+        fragments = sorted(os.listdir(chemin))
+        assert fragments == ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+
+        # Reprise : les nouveaux fragments suivent les anciens
+        with ParquetWriter(chemin, COLONNES, rows_per_part=10) as ecr:
+            ecr.write(_lignes(25, 4, "v2"))
+        assert len(os.listdir(chemin)) == 4
+
+        ecrivain = ParquetWriter(chemin, COLONNES)
+        assert ecrivain.done("v1") == {f"img/{i:04d}.jpg" for i in range(25)}
+        assert len(ecrivain.done("v2")) == 4
+
+        df = pd.read_parquet(chemin)
+        assert list(df.columns) == COLONNES
+        assert len(df) == 29
+        assert np.allclose(df["confidence_1"], 0.9)
+
+if __name__ == "__main__":
+    for nom, fonction in list(globals().items()):
+        if nom.startswith("test_") and callable(fonction):
+            try:
+                fonction()
+                print(f"✅ {nom}")
+            except pytest.skip.Exception as e:
+                print(f"⚠️ {nom} ignoré : {e}")
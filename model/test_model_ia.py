@@ -6,13 +6,16 @@ from tensorflow.keras.preprocessing import image
 import numpy as np
 
 sys.path.append(r"D:/model")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-class_names = [
-    "Mildiou", "oidium", "alternariose", "sunburn",
-    "helicoverpa", "fruit_saine", "feuil_saine", "excesnit",
-    "blossom_end_rot", "tuta", "bacterial", "mited",
-    "virosis", "black mold"
-]
+from model_registry import ModelRegistry, SPECIALIST_CLASS_NAMES as class_names
+from dataset_cache import open_dataset_cache
+
+# Cache memmap du jeu de validation (python dataset_cache.py build ...) ; None = pas d'évaluation globale
+DATASET_CACHE_DIR = None
+
+# Chaque modèle est chargé une seule fois, puis réutilisé pour toutes les images
+registry = ModelRegistry()
 
 def preprocess_image(img_path, target_size=(224, 224)):
     img = image.load_img(img_path, target_size=target_size)
@@ -21,23 +24,60 @@ def preprocess_image(img_path, target_size=(224, 224)):
     img_array /= 255.0
     return img_array
 
-def load_model_smart(model_path):
-    """Charge un modèle .h5 ou SavedModel (si compatible Keras 3)"""
+def check_model_format(model_path):
     if os.path.isfile(model_path) and model_path.endswith('.h5'):
-        return load_model(model_path, compile=False)
+        return
     elif os.path.isdir(model_path) and os.path.exists(os.path.join(model_path, "saved_model.pb")):
         raise ValueError("⚠️ Ce modèle est au format SavedModel non supporté par `load_model()` dans Keras 3.")
     else:
         raise ValueError(f"❌ Format de modèle non supporté ou fichier absent : {model_path}")
 
+def load_model_smart(model_path):
+    """Charge un modèle .h5 ou SavedModel (si compatible Keras 3)"""
+    check_model_format(model_path)
+    return load_model(model_path, compile=False)
+
 def test_model_prediction(model_path, img_path):
-    model = load_model_smart(model_path)
+    if model_path not in registry:
+        check_model_format(model_path)
+        registry.register(model_path, model_path, backend="keras", labels=class_names)
     img_prepared = preprocess_image(img_path)
-    preds = model.predict(img_prepared)
+    preds = registry.get(model_path).predict(img_prepared)
     predicted_index = np.argmax(preds)
     model_name = os.path.basename(os.path.dirname(model_path)) if os.path.isfile(model_path) else os.path.basename(model_path)
     print(f"[Modèle: {model_name}] Image: {os.path.basename(img_path)} -> Classe prédite : {class_names[predicted_index]} ({preds[0][predicted_index]*100:.2f}%)")
 
+def evaluate_model_on_cache(model_path, cache_dir, subset="val", batch_size=64, labels=None):
+    """Précision top-1 d'un modèle sur le cache memmap (classes comparées par leur nom).
+
+    `labels` : noms des sorties du modèle (par défaut ceux de son enregistrement). Lève une
+    ValueError si aucun ne correspond aux classes du cache : la précision serait toujours nulle.
+    """
+    if model_path not in registry:
+        check_model_format(model_path)
+        registry.register(model_path, model_path, backend="keras", labels=class_names)
+    labels = list(labels or registry.spec(model_path).labels or class_names)
+    model = registry.get(model_path)
+    cache = open_dataset_cache(cache_dir)
+    communes = set(labels) & set(cache.class_names)
+    if not communes:
+        raise ValueError(f"❌ Aucune classe commune entre le modèle ({', '.join(labels[:5])}, ...) "
+                         f"et le cache ({', '.join(cache.class_names[:5])}, ...)")
+
+    corrects = total = 0
+    for images, etiquettes in cache.batches(subset, batch_size):
+        probs = model.predict(images)
+        if probs.shape[1] != len(labels):
+            raise ValueError(f"❌ {probs.shape[1]} sorties pour {len(labels)} noms de classes")
+        predits = [labels[i] for i in np.argmax(probs, axis=1)]
+        corrects += sum(p == cache.class_names[l] for p, l in zip(predits, etiquettes))
+        total += len(etiquettes)
+    if len(communes) < len(cache.class_names):
+        print(f"⚠️ {len(cache.class_names) - len(communes)} classe(s) du cache inconnue(s) du modèle, comptées fausses")
+    model_name = os.path.basename(os.path.dirname(model_path))
+    print(f"[Modèle: {model_name}] {subset} : {corrects}/{total} corrects ({corrects / max(total, 1) * 100:.2f}%)")
+    return corrects / max(total, 1)
+
 if __name__ == "__main__":
     models_paths = [
         "D:/model/models/mildiw/mildiw.h5",
@@ -68,3 +108,8 @@ if __name__ == "__main__":
                 test_model_prediction(model_path, img_path)
             except Exception as e:
                 print(f"❌ Erreur avec [{model_path}] sur image [{img_path}]\n    ➜ {e}")
+        if DATASET_CACHE_DIR:
+            try:
+                evaluate_model_on_cache(model_path, DATASET_CACHE_DIR)
+            except Exception as e:
+                print(f"❌ Erreur d'évaluation de [{model_path}]\n    ➜ {e}")
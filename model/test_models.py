@@ -1,11 +1,99 @@
+import os
 import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
 sys.path.append(r"D:/model")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from oidium import run_oidium_model
 from alternariose import run_dew_model
 from mildiou import run_ipi_model  # adapte le nom si besoin
+from risk_engine import run_all_models
+from risk_batch import list_station_files, run_stations, write_results
+from ingestion import stream_daily_risk
+
+# === Données capteurs synthétiques (pytest) ===
+def _capteurs(jours=12, seed=0):
+    # Mesures horaires à partir de minuit : jours calendaires = blocs de 24 lignes, le découpage
+    # de run_oidium_model (changement documenté de risk_engine) donne alors les mêmes jours
+    rng = np.random.default_rng(seed)
+    n = 24 * jours
+
+    def _par_jour(bas, haut, bruit):
+        # Niveau tiré par jour (sinon les moyennes journalières se ressemblent toutes) + bruit horaire
+        return np.repeat(rng.uniform(bas, haut, jours), 24) + rng.uniform(-bruit, bruit, n)
+
+    temperature = _par_jour(8, 30, 3)
+    return pd.DataFrame({
+        'datetime': pd.date_range('2024-05-01', periods=n, freq='h'),
+        'temperature': temperature,
+        'RelativeHumidity': _par_jour(50, 100, 5),
+        'LeafWetness': (rng.uniform(0, 1, n) < np.repeat(rng.uniform(0, 1, jours), 24)).astype(float),
+        'Temperature_Avg': temperature,
+        'Temperature_Min': temperature - rng.uniform(0, 5, n),
+        'RH_Avg': _par_jour(60, 100, 5),
+        'Rainfall': rng.choice([0.0, 0.0, 0.5, 3.0], n) * np.repeat(rng.integers(0, 2, jours), 24),
+    })
+
+def _ecrire_excel(df, chemin):
+    # Feuille "Sheet1" : celle que lisent run_oidium_model et run_dew_model
+    df.to_excel(chemin, sheet_name="Sheet1", index=False)
+
+def test_moteur_egal_aux_modeles():
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "capteurs.xlsx")
+        _ecrire_excel(_capteurs(), chemin)
+        risques = run_all_models(chemin)
+
+        oidium = run_oidium_model(chemin)
+        assert list(risques['Oidium Risk (%)']) == list(oidium['Oidium Risk (%)'])
+
+        alt = run_dew_model(chemin)
+        assert list(risques['DewSeverityLevel']) == list(alt['DewSeverityLevel'])
+        assert list(risques['DewSeverityPercent']) == list(alt['DewSeverityPercent'])
+
+        mildiou = run_ipi_model(chemin)
+        assert list(risques['Date']) == list(mildiou['Date'])
+        np.testing.assert_allclose(risques['IPI'].astype(float), mildiou['IPI'].astype(float))
+        assert list(risques['Risque (%)']) == list(mildiou['Risque (%)'])
+        assert list(risques['Interprétation']) == list(mildiou['Interprétation'])
 
-def test_all():
+def test_stations_egales_au_moteur():
+    with tempfile.TemporaryDirectory() as dossier:
+        _ecrire_excel(_capteurs(seed=1), os.path.join(dossier, "S01.xlsx"))
+        _capteurs(jours=5, seed=2).to_csv(os.path.join(dossier, "S02.csv"), index=False)
+        _capteurs(seed=3).drop(columns=['datetime']).to_csv(os.path.join(dossier, "S03.csv"), index=False)
+        fichiers = list_station_files(dossier)
+
+        consolide, erreurs = run_stations(fichiers, workers=2)
+        assert list(erreurs) == ['S03']  # sans colonne datetime : signalée, les autres sont traitées
+        assert sorted(consolide['station'].unique()) == ['S01', 'S02']
+        for station in ('S01', 'S02'):
+            attendu = run_all_models(fichiers[station])
+            obtenu = consolide[consolide['station'] == station].drop(columns='station').reset_index(drop=True)
+            pd.testing.assert_frame_equal(obtenu, attendu, check_dtype=False)  # concat : types unifiés entre stations
+
+def test_flux_egal_au_moteur():
+    # Début en cours de journée et quelques mesures manquantes : jours partiels et comptes différents
+    df = _capteurs(seed=4).iloc[5:].reset_index(drop=True)
+    df.loc[[30, 31, 100], 'temperature'] = np.nan
+    df.loc[[50, 200], 'RH_Avg'] = np.nan
+    with tempfile.TemporaryDirectory() as dossier:
+        for ext in ('.xlsx', '.csv'):
+            chemin = os.path.join(dossier, "capteurs" + ext)
+            if ext == '.xlsx':
+                _ecrire_excel(df, chemin)
+            else:
+                df.to_csv(chemin, index=False)
+            attendu = run_all_models(chemin)
+            for taille in (1, 7, 100, 50000):
+                obtenu = pd.concat(list(stream_daily_risk(chemin, chunksize=taille)), ignore_index=True)
+                pd.testing.assert_frame_equal(obtenu, attendu, check_dtype=False, obj=f"{ext}, blocs de {taille}")
+
+# === Exécution directe sur les fichiers de D:/model (résultats exportés) ===
+def run_all():
     excel_path = "D:/model/test1.xlsx"
 
     # Test Oidium
@@ -26,6 +114,32 @@ def test_all():
     print(df_mildiou.head())
     df_mildiou.to_excel("D:/model/resultats_mildiou.xlsx", index=False)
 
+def run_engine():
+    excel_path = "D:/model/test1.xlsx"
+
+    # Une seule lecture et un seul groupby pour les trois modèles
+    df_risques = run_all_models(excel_path)
+    print("Tous les modèles:")
+    print(df_risques.head())
+    df_risques.to_excel("D:/model/resultats_risques.xlsx", index=False)
+
+def run_all_stations():
+    stations_dir = "D:/model/stations"  # un fichier capteur par station
+
+    # Toutes les stations en parallèle, une table consolidée (colonne station)
+    df_stations, erreurs = run_stations(list_station_files(stations_dir))
+    print("Stations:")
+    print(df_stations.head())
+    if erreurs:
+        print("Stations en erreur:", erreurs)
+    write_results(df_stations, "D:/model/resultats_stations.xlsx")
+
 if __name__ == "__main__":
-    test_all()
+    test_moteur_egal_aux_modeles()
+    test_stations_egales_au_moteur()
+    test_flux_egal_au_moteur()
+    print("✅ Moteur, stations et lecture par blocs équivalents aux modèles séparés.")
+    run_all()
+    run_engine()
+    run_all_stations()
     print("✅ Tests terminés, résultats exportés.")
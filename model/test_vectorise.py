@@ -0,0 +1,112 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from oidium import calculate_daily_variables, classify_day_risk, calculate_daily_variables_vec, classify_day_risk_vec
+from alternariose import dew_severity_level, dew_severity_level_vec
+from mildiou import calculate_ipi, interpret_ipi, calculate_ipi_vec, interpret_ipi_vec
+
+EXCEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test1.xlsx")
+
+rng = np.random.default_rng(0)
+
+def _grille(valeurs_bornes, n_aleatoires, bas, haut):
+    # Valeurs limites exactes (les seuils des modèles) + tirages aléatoires + NaN
+    return np.concatenate([valeurs_bornes, rng.uniform(bas, haut, n_aleatoires), [np.nan]])
+
+# === Oïdium ===
+def test_oidium_daily_variables():
+    n = 24 * 50 + 7  # jour incomplet en fin de série, ignoré par les deux versions
+    T, RH, LW = rng.uniform(0, 40, n), rng.uniform(40, 100, n), rng.integers(0, 2, n).astype(float)
+    attendu = np.array(calculate_daily_variables(T, RH, LW))
+    tavg, rhavg, lwsum = calculate_daily_variables_vec(T, RH, LW)
+    assert np.allclose(attendu, np.column_stack([tavg, rhavg, lwsum]))
+
+def test_oidium_classify():
+    t = _grille([9.99, 10, 35, 35.01], 200, 0, 45)
+    rh = _grille([69.99, 70], 200, 40, 100)
+    lw = _grille([3.99, 4, 8, 8.01, 12, 12.01], 200, 0, 24)
+    tt, rr, ll = [a.ravel() for a in np.meshgrid(t, rh, lw, indexing="ij")]
+    attendu = classify_day_risk(list(zip(tt, rr, ll)))
+    assert list(classify_day_risk_vec(tt, rr, ll)) == attendu
+
+# === Alternariose ===
+def test_dew_severity_level():
+    t = _grille([12.9, 13, 17, 17.5, 18, 20, 20.5, 21, 25, 25.5, 26, 29, 29.1], 300, 10, 32)
+    lw = _grille([2, 3, 5, 6, 8, 12, 15, 20, 22, 22.5], 300, 0, 30)
+    tt, ll = [a.ravel() for a in np.meshgrid(t, lw, indexing="ij")]
+    attendu = [dew_severity_level(a, b) for a, b in zip(tt, ll)]
+    assert list(dew_severity_level_vec(tt, ll)) == attendu
+
+# === Mildiou ===
+def test_ipi():
+    tavg = _grille([8.99, 9, 25, 25.01], 12, 0, 30)
+    tmin = _grille([7, 7.01], 12, 0, 20)
+    rh = _grille([80, 80.01], 12, 40, 100)
+    rain = _grille([0.2, 0.21], 12, 0, 150)
+    a, b, c, d = [x.ravel() for x in np.meshgrid(tavg, tmin, rh, rain, indexing="ij")]
+    ipi_vec = calculate_ipi_vec(a, b, c, d)
+    for i in range(len(a)):
+        attendu = calculate_ipi(a[i], b[i], c[i], d[i])
+        if attendu is None:
+            assert np.isnan(ipi_vec[i])
+        else:
+            assert ipi_vec[i] == attendu
+
+def test_interpret_ipi():
+    ipi = np.array([np.nan, 0, 49.99, 50, 99.99, 100, 149.99, 150, 400])
+    risque, interpretation = interpret_ipi_vec(ipi)
+    for i, x in enumerate(ipi):
+        attendu = interpret_ipi(None if np.isnan(x) else x)
+        assert (risque[i], interpretation[i]) == attendu
+
+# === Bout en bout sur le fichier de test ===
+def test_run_models_sur_excel():
+    if not os.path.exists(EXCEL_PATH):
+        pytest.skip(f"{EXCEL_PATH} absent")
+    from oidium import run_oidium_model
+    from alternariose import run_dew_model
+    from mildiou import run_ipi_model
+
+    df = pd.read_excel(EXCEL_PATH)
+    attendu = classify_day_risk(calculate_daily_variables(
+        df['temperature'].values, df['RelativeHumidity'].values, df['LeafWetness'].values))
+    assert list(run_oidium_model(EXCEL_PATH)["Oidium Risk (%)"]) == attendu
+
+    df_alt = run_dew_model(EXCEL_PATH)
+    attendu = [dew_severity_level(t, lw) for t, lw in zip(df_alt['AvgTemp'], df_alt['LeafWetnessHours'])]
+    assert list(df_alt['DewSeverityLevel']) == attendu
+
+    df_mil = run_ipi_model(EXCEL_PATH)
+    for _, row in df_mil.iterrows():
+        ipi = calculate_ipi(row['Temperature_Avg'], row['Temperature_Min'], row['RH_Avg'], row['Rainfall'])
+        assert (row['Risque (%)'], row['Interprétation']) == interpret_ipi(ipi)
+
+def test_risque_incremental_sur_excel():
+    if not os.path.exists(EXCEL_PATH):
+        pytest.skip(f"{EXCEL_PATH} absent")
+    from risk_engine import load_sensor_data, run_all_models
+    from risk_incremental import StationRiskState
+
+    # Mesures ajoutées par paquets de 7 h, dans le désordre pour un paquet sur dix
+    df = load_sensor_data(EXCEL_PATH)
+    paquets = [df.iloc[i:i + 7] for i in range(0, len(df), 7)]
+    paquets[::10] = paquets[::10][::-1]
+    etat = StationRiskState()
+    for paquet in paquets:
+        etat.append(paquet)
+    pd.testing.assert_frame_equal(etat.results(), run_all_models(EXCEL_PATH), check_dtype=False)
+
+if __name__ == "__main__":
+    for nom, fonction in list(globals().items()):
+        if nom.startswith("test_") and callable(fonction):
+            try:
+                fonction()
+                print(f"✅ {nom}")
+            except pytest.skip.Exception as e:
+                print(f"⚠️ {nom} ignoré : {e}")
+    print("✅ Versions vectorisées équivalentes aux fonctions scalaires.")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Outils du mode entraînement de test.py :
+# - threads inter / intra-op et précision mixte bfloat16 (CPU qui la supportent) ;
+# - points de reprise complets : poids, état de l'optimiseur (dont le learning rate réduit par
+#   ReduceLROnPlateau), époque, et état interne des callbacks (EarlyStopping, ReduceLROnPlateau,
+#   ModelCheckpoint) ; un entraînement interrompu reprend à l'époque suivante ;
+# - débit en images/s à chaque époque.
+
+import os
+import json
+import time
+import numpy as np
+import tensorflow as tf
+
+# -----------------------------------
+# 1. Threads et précision mixte
+# -----------------------------------
+
+def cpu_supports_bfloat16():
+    """Vrai si le processeur a des instructions bfloat16 natives (AVX512_BF16 ou AMX, Linux)."""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            drapeaux = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in drapeaux or "amx_bf16" in drapeaux
+
+def configure_training(inter_op_threads=0, intra_op_threads=0, mixed_precision=None):
+    """À appeler avant toute opération TensorFlow.
+
+    `mixed_precision` : None (float32), "bfloat16", ou "auto" (bfloat16 seulement si le CPU le supporte).
+    Renvoie la politique de précision appliquée.
+    """
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+
+    politique = "float32"
+    if mixed_precision == "bfloat16" or (mixed_precision == "auto" and cpu_supports_bfloat16()):
+        politique = "mixed_bfloat16"
+    tf.keras.mixed_precision.set_global_policy(politique)
+    print(f"⚙️ Threads inter/intra-op : {inter_op_threads or 'défaut'}/{intra_op_threads or 'défaut'}, "
+          f"précision : {politique}")
+    return politique
+
+def _politique_float32(config):
+    # Politiques "mixed_*" (dictionnaires DTypePolicy de Keras 3, ou noms) remplacées par float32
+    if isinstance(config, dict):
+        nom = config.get("config", {}).get("name") if config.get("class_name") == "DTypePolicy" else None
+        if nom is not None and nom.startswith("mixed_"):
+            return dict(config, config=dict(config["config"], name="float32"))
+        return {cle: _politique_float32(valeur) for cle, valeur in config.items()}
+    if isinstance(config, list):
+        return [_politique_float32(valeur) for valeur in config]
+    if isinstance(config, str) and config.startswith("mixed_"):
+        return "float32"
+    return config
+
+def save_float32(model, path):
+    """Sauvegarde `model` en float32 : un modèle entraîné en précision mixte est reconstruit avec
+    des politiques float32 (les poids, déjà en float32, sont recopiés) pour que le service
+    (main.py, export TFLite / ONNX) ne calcule pas en bfloat16."""
+    if not any(layer.dtype_policy.name.startswith("mixed_") for layer in model._flatten_layers()):
+        model.save(path)
+        return model
+    copie = model.__class__.from_config(_politique_float32(model.get_config()))
+    copie.set_weights(model.get_weights())
+    copie.save(path)
+    return copie
+
+# -----------------------------------
+# 2. Débit par époque
+# -----------------------------------
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """Affiche (et ajoute à l'historique) le débit d'entraînement de chaque époque en images/s.
+
+    `num_samples` : images par époque ; sans lui, le dernier lot incomplet est compté plein.
+    """
+
+    def __init__(self, batch_size, num_samples=None):
+        super().__init__()
+        self.batch_size = batch_size
+        self.num_samples = num_samples
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._lots = 0
+        self._debut = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._lots += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        duree = time.perf_counter() - self._debut
+        images = self._lots * self.batch_size
+        if self.num_samples:
+            images = min(images, self.num_samples)
+        debit = images / duree if duree else 0.0
+        if logs is not None:
+            logs["images_per_sec"] = debit
+        print(f"⏱️ Époque {epoch + 1} : {debit:.1f} images/s ({images} images en {duree:.1f} s)")
+
+# -----------------------------------
+# 3. Points de reprise complets
+# -----------------------------------
+
+# Attributs d'état des callbacks Keras remis à zéro dans on_train_begin
+_ETAT_CALLBACKS = ("wait", "best", "best_epoch", "stopped_epoch", "cooldown_counter")
+
+def _json(valeur):
+    if isinstance(valeur, (np.floating, np.integer)):
+        return valeur.item()
+    return valeur
+
+class ResumableCheckpoint(tf.keras.callbacks.Callback):
+    """Sauvegarde à chaque fin d'époque de tout ce qu'il faut pour reprendre l'entraînement.
+
+    À placer en dernier dans la liste des callbacks : l'état des autres callbacks est restauré
+    dans on_train_begin, après leur propre remise à zéro.
+    """
+
+    def __init__(self, directory, callbacks=(), max_to_keep=2):
+        super().__init__()
+        self.directory = directory
+        self.suivis = list(callbacks)
+        self.max_to_keep = max_to_keep
+        self._epoque = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self._etat = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def _chemin_etat(self):
+        return os.path.join(self.directory, "state.json")
+
+    @property
+    def finished(self):
+        """Vrai si la phase a été marquée terminée (par mark_finished) lors d'un lancement précédent."""
+        return self._lire_etat().get("finished", False)
+
+    def _lire_etat(self):
+        if not os.path.exists(self._chemin_etat):
+            return {}
+        with open(self._chemin_etat, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _manager(self, model):
+        checkpoint = tf.train.Checkpoint(model=model, optimizer=model.optimizer, epoch=self._epoque)
+        return checkpoint, tf.train.CheckpointManager(checkpoint, self.directory, max_to_keep=self.max_to_keep)
+
+    def restore(self, model):
+        """Restaure poids + optimiseur + époque si un point de reprise existe ; renvoie l'époque initiale."""
+        # Les variables de l'optimiseur doivent exister pour recevoir l'état sauvegardé
+        model.optimizer.build(model.trainable_variables)
+        checkpoint, manager = self._manager(model)
+        if manager.latest_checkpoint is None:
+            return 0
+        checkpoint.restore(manager.latest_checkpoint).expect_partial()
+        self._etat = self._lire_etat()
+        epoque = int(self._epoque.numpy())
+        print(f"🔄 Reprise depuis {manager.latest_checkpoint} (époque {epoque})")
+        return epoque
+
+    def mark_finished(self):
+        etat = self._lire_etat()
+        etat["finished"] = True
+        with open(self._chemin_etat, "w", encoding="utf-8") as f:
+            json.dump(etat, f)
+
+    def on_train_begin(self, logs=None):
+        self._sauvegarde = self._manager(self.model)[1]
+        if not self._etat:
+            return
+        for cb, etat in zip(self.suivis, self._etat.get("callbacks", [])):
+            for attribut, valeur in etat.items():
+                setattr(cb, attribut, valeur)
+        # Meilleurs poids gardés en mémoire par EarlyStopping(restore_best_weights=True)
+        chemin = os.path.join(self.directory, "best_weights.npz")
+        for cb in self.suivis:
+            if hasattr(cb, "best_weights") and os.path.exists(chemin):
+                with np.load(chemin) as poids:
+                    cb.best_weights = [poids[f"arr_{i}"] for i in range(len(poids.files))]
+        self._etat = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        self._epoque.assign(epoch + 1)
+
+        for cb in self.suivis:
+            if getattr(cb, "best_weights", None) is not None:
+                np.savez(os.path.join(self.directory, "best_weights.npz"), *cb.best_weights)
+
+        etat = {
+            "epoch": epoch + 1,
+            "finished": False,
+            "callbacks": [{a: _json(getattr(cb, a)) for a in _ETAT_CALLBACKS if hasattr(cb, a)} for cb in self.suivis],
+        }
+        self._sauvegarde.save(checkpoint_number=epoch + 1)
+        with open(self._chemin_etat, "w", encoding="utf-8") as f:
+            json.dump(etat, f)